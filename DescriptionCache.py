@@ -0,0 +1,89 @@
+import hashlib
+import os
+import pickle
+import random
+import threading
+from pathlib import Path
+
+from promg import DatasetDescriptions, SemanticHeader
+
+# bump when the pickled layout changes (e.g. after a promg upgrade), this invalidates every cached description
+CACHE_FORMAT_VERSION = 1
+
+
+class DescriptionCache:
+    """
+    Memoizes the parsed semantic header and dataset descriptions, keyed by the path, modification time and size of
+    their JSON file, so the steps of a run share one instance instead of re-reading and re-validating the JSON.
+    With a cache directory the parsed objects are also pickled to disk, which speeds up the start of later runs.
+    """
+
+    def __init__(self, cache_directory=None):
+        self.cache_directory = cache_directory
+        self.descriptions = {}
+        self.lock = threading.Lock()
+
+    def get_semantic_header(self, config) -> SemanticHeader:
+        return self.get_description(config.semantic_header_path,
+                                    lambda: SemanticHeader.create_semantic_header(config=config))
+
+    def get_dataset_descriptions(self, config) -> DatasetDescriptions:
+        dataset_descriptions = self.get_description(config.dataset_description_path,
+                                                    lambda: DatasetDescriptions(config=config))
+        # DatasetDescriptions seeds the random samples of the event tables when it is constructed, keep doing so
+        random.seed(1)
+        return dataset_descriptions
+
+    def get_description(self, path, parse):
+        path = Path(path).resolve()
+        stat = path.stat()
+        key = (str(path), stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if key not in self.descriptions:
+                self.descriptions[key] = self.load_from_disk(key, parse)
+            return self.descriptions[key]
+
+    def load_from_disk(self, key, parse):
+        if self.cache_directory is None:
+            return parse()
+        cache_path = Path(self.cache_directory, f"{get_cache_key(key)}.pkl")
+        if cache_path.exists():
+            try:
+                with open(cache_path, "rb") as f:
+                    return pickle.load(f)
+            except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+                # written by another promg version or truncated, parse the JSON again
+                pass
+        description = parse()
+        os.makedirs(self.cache_directory, exist_ok=True)
+        temporary_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary_path, "wb") as f:
+            pickle.dump(description, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, cache_path)
+        return description
+
+    def clear(self):
+        with self.lock:
+            self.descriptions = {}
+
+
+def get_cache_key(key) -> str:
+    return hashlib.sha256(repr((CACHE_FORMAT_VERSION,) + key).encode("utf-8")).hexdigest()
+
+
+_description_cache = DescriptionCache()
+
+
+def set_description_cache_directory(cache_directory):
+    """
+    Pickle the parsed descriptions to cache_directory, None only memoizes them in this process
+    """
+    _description_cache.cache_directory = cache_directory
+
+
+def get_semantic_header(config) -> SemanticHeader:
+    return _description_cache.get_semantic_header(config)
+
+
+def get_dataset_descriptions(config) -> DatasetDescriptions:
+    return _description_cache.get_dataset_descriptions(config)
@@ -0,0 +1,52 @@
+from modules.local_graph.local_graph import LocalGraph, load_local_graph
+from modules.local_graph.local_queries import get_local_query
+
+
+class LocalRecord(dict):
+    """
+    Record of a local query, with the data() accessor of a neo4j.Record
+    """
+
+    def data(self):
+        return dict(self)
+
+
+class LocalGraphConnection:
+    """
+    Stand-in for DatabaseConnection backed by an in-process LocalGraph instead of a Neo4j server. The queries are
+    not interpreted: every query function of the query libraries of this repository has a native implementation on
+    the tables of the graph (modules/local_graph/local_queries.py), which exec_query runs with the same keyword
+    arguments. The graph is built from the event tables of the dataset description, hence the import, transform and
+    task identification queries of promg are not available on this connection.
+    """
+
+    # the tables of the graph are modified in place, hence write queries cannot run on concurrent threads
+    supports_concurrency = False
+
+    def __init__(self, graph: LocalGraph, verbose: bool = False, batch_size: int = 100000):
+        self.graph = graph
+        self.db_name = "local"
+        self.driver = None
+        self.verbose = verbose
+        self.batch_size = batch_size
+
+    @staticmethod
+    def set_up_connection(config, dataset_name):
+        return LocalGraphConnection(graph=load_local_graph(config, dataset_name=dataset_name),
+                                    verbose=config.verbose, batch_size=config.batch_size)
+
+    def exec_query(self, function, **kwargs):
+        implementation = get_local_query(function)
+        if self.verbose:
+            print(function.__qualname__)
+        records = implementation(self.graph, **kwargs)
+        # return like DatabaseConnection._exec_query, None for an empty result
+        return records if records else None
+
+    def stream_records(self, function, fetch_size: int = 1000, **kwargs):
+        # the records are already in memory, fetch_size does not apply
+        for record in self.exec_query(function, **kwargs) or []:
+            yield LocalRecord(record)
+
+    def close_connection(self):
+        pass
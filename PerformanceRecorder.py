@@ -1,34 +1,176 @@
-import pandas as pd
+import json
+import os
+import sys
+import threading
 import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    # peak RSS is only available on Unix
+    import resource
+except ImportError:
+    resource = None
+
+RECORD_COLUMNS = ['action', 'category', 'start', 'end', 'duration', 'cpu_time', 'peak_rss_delta', 'rows', 'depth',
+                  'thread']
+
+
+def get_peak_rss():
+    """
+    @return: peak resident set size of the process in bytes, None if it cannot be determined
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+class Span:
+    """
+    A running span of a PerformanceRecorder, rows can be set while the span is open
+    """
+
+    def __init__(self, action, category, depth):
+        self.action = action
+        self.category = category
+        self.depth = depth
+        self.rows = None
+        self.start_ns = time.perf_counter_ns()
+        self.cpu_start_ns = time.process_time_ns()
+        self.peak_rss_start = get_peak_rss()
+
+
+class _NoSpan:
+    """
+    Span returned when no recorder is active, setting rows on it has no effect
+    """
+    rows = None
+
+
+_NO_SPAN = _NoSpan()
 
 
 class PerformanceRecorder:
+    """
+    Append-only recorder of (nested) spans with monotonic wall time, CPU time, peak RSS growth and row counts.
+    Records are kept as tuples and only turned into a DataFrame when exported, such that recording is O(1).
+    """
 
     def __init__(self, data_set, description):
-        self.performance_table = pd.DataFrame(columns=['action', 'start', 'end', 'duration'])
-        self.start = time.time()
-        self.last = time.time()
+        self.records = []
+        # anchor the monotonic clock to the wall clock once, to report absolute start and end times
+        self.origin_ns = time.perf_counter_ns()
+        self.origin_time = time.time()
+        self.start_ns = self.origin_ns
+        self.last_ns = self.origin_ns
+        self.local = threading.local()
         self.path_to_performance_file = f'perf/{description}_{data_set}.csv'
+        self.path_to_trace_file = f'perf/{description}_{data_set}.trace.json'
         print(f"START {description}...")
 
+    def get_stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def to_time(self, ns):
+        return self.origin_time + (ns - self.origin_ns) / 1e9
+
+    def append_record(self, action, category, start_ns, end_ns, cpu_time_ns=None, peak_rss_delta=None, rows=None,
+                      depth=0):
+        self.records.append((action, category, start_ns, end_ns, cpu_time_ns, peak_rss_delta, rows, depth,
+                             threading.get_ident()))
+
+    @contextmanager
+    def span(self, action, category="step"):
+        """
+        Record the enclosed block as a span, nested in the span that is open on the same thread
+        """
+        stack = self.get_stack()
+        span = Span(action, category, depth=len(stack))
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            stack.pop()
+            end_ns = time.perf_counter_ns()
+            peak_rss_end = get_peak_rss()
+            self.append_record(action, category, span.start_ns, end_ns,
+                               cpu_time_ns=time.process_time_ns() - span.cpu_start_ns,
+                               peak_rss_delta=peak_rss_end - span.peak_rss_start if peak_rss_end is not None else None,
+                               rows=span.rows, depth=span.depth)
+
     def start_recording(self):
-        self.last = time.time()
+        self.last_ns = time.perf_counter_ns()
 
     def record_performance(self, action):
-        current_time = time.time()
-        self.performance_table = pd.concat([self.performance_table, pd.DataFrame(
-            [{'action': action, 'start': self.last, 'end': current_time, 'duration': (current_time - self.last)}])],
-                                           ignore_index=True)
-        print(action + ' done -  took ' + str(current_time - self.last) + ' seconds')
-        self.last = current_time
+        current_ns = time.perf_counter_ns()
+        self.append_record(action, "action", self.last_ns, current_ns, depth=len(self.get_stack()))
+        print(action + ' done -  took ' + str((current_ns - self.last_ns) / 1e9) + ' seconds')
+        self.last_ns = current_ns
 
     def record_total_performance(self):
-        current_time = time.time()
-        self.performance_table = pd.concat([self.performance_table, pd.DataFrame(
-            [{'action': 'total', 'start': self.last, 'end': current_time, 'duration': (current_time - self.last)}])],
-                                           ignore_index=True)
-        print('total' + ' done -  took ' + str(current_time - self.start) + ' seconds\n')
-        self.last = current_time
+        current_ns = time.perf_counter_ns()
+        self.append_record('total', "action", self.last_ns, current_ns)
+        print('total' + ' done -  took ' + str((current_ns - self.start_ns) / 1e9) + ' seconds\n')
+        self.last_ns = current_ns
+
+    @property
+    def performance_table(self):
+        rows = [(action, category, self.to_time(start_ns), self.to_time(end_ns), (end_ns - start_ns) / 1e9,
+                 cpu_time_ns / 1e9 if cpu_time_ns is not None else None, peak_rss_delta, rows, depth, thread)
+                for action, category, start_ns, end_ns, cpu_time_ns, peak_rss_delta, rows, depth, thread
+                in self.records]
+        return pd.DataFrame(rows, columns=RECORD_COLUMNS)
 
     def save_to_file(self):
+        os.makedirs(os.path.dirname(self.path_to_performance_file), exist_ok=True)
         self.performance_table.to_csv(self.path_to_performance_file)
+
+    def save_chrome_trace(self):
+        """
+        Write the records as Chrome trace events, to be opened in chrome://tracing or Perfetto as a timeline
+        """
+        pid = os.getpid()
+        trace_events = []
+        for action, category, start_ns, end_ns, cpu_time_ns, peak_rss_delta, rows, depth, thread in self.records:
+            args = {key: value for key, value in
+                    [("cpu_time_ms", cpu_time_ns / 1e6 if cpu_time_ns is not None else None),
+                     ("peak_rss_delta", peak_rss_delta), ("rows", rows)] if value is not None}
+            trace_events.append({"name": action, "cat": category, "ph": "X", "pid": pid, "tid": thread,
+                                 "ts": (start_ns - self.origin_ns) / 1e3, "dur": (end_ns - start_ns) / 1e3,
+                                 "args": args})
+        os.makedirs(os.path.dirname(self.path_to_trace_file), exist_ok=True)
+        with open(self.path_to_trace_file, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+
+
+_active_recorder = None
+
+
+def set_active_recorder(recorder):
+    """
+    Make recorder the target of record_span, None disables recording
+    """
+    global _active_recorder
+    _active_recorder = recorder
+
+
+def get_active_recorder():
+    return _active_recorder
+
+
+@contextmanager
+def record_span(action, category="step"):
+    """
+    Record the enclosed block as a span of the active recorder, without an active recorder this costs only a
+    function call
+    """
+    if _active_recorder is None:
+        yield _NO_SPAN
+    else:
+        with _active_recorder.span(action, category) as span:
+            yield span
@@ -0,0 +1,176 @@
+import os
+import re
+import time
+
+import pandas as pd
+from promg import DatabaseConnection
+
+from queries.query_stream import build_query
+
+# statements that cannot be profiled, these are executed without PROFILE
+UNPROFILABLE_QUERY = re.compile(r"^\s*(SHOW|ALTER|START|STOP|(CREATE|DROP)\s+(\w+\s+)?(INDEX|CONSTRAINT|DATABASE))\b",
+                                re.IGNORECASE)
+# statements that run their inner statements in batches of their own, PROFILE only shows the procedure call of these
+APOC_BATCHED_QUERY = re.compile(r"\bapoc\.periodic\.(iterate|commit)\b", re.IGNORECASE)
+
+
+def get_profiled_query(query):
+    return query if UNPROFILABLE_QUERY.match(query) else f"PROFILE {query}"
+
+
+def get_profile_totals(profile):
+    """
+    Sum the db hits and page cache hits and misses over all operators of a profiled plan
+    """
+    totals = {"db_hits": profile.get("dbHits", 0),
+              "page_cache_hits": profile.get("pageCacheHits", 0),
+              "page_cache_misses": profile.get("pageCacheMisses", 0)}
+    for child in profile.get("children", []):
+        for key, value in get_profile_totals(child).items():
+            totals[key] += value
+    return totals
+
+
+def format_operator_tree(profile, depth=0):
+    """
+    @return: the operators of a profiled plan as indented lines with their db hits and rows
+    """
+    operator = profile["operatorType"].split("@")[0]
+    details = profile.get("args", profile.get("arguments", {})).get("Details")
+    description = f"{operator} {details}" if details else operator
+    lines = [f"{'  ' * depth}{description} (db hits: {profile.get('dbHits', 0)}, rows: {profile.get('rows', 0)})"]
+    for child in profile.get("children", []):
+        lines.extend(format_operator_tree(child, depth + 1))
+    return lines
+
+
+class ProfilingDatabaseConnection(DatabaseConnection):
+    """
+    Database connection that runs every query of exec_query, and the streamed and managed write queries of
+    queries/query_stream.py, with PROFILE and records what the database did per query function: db hits, rows, page
+    cache hits and misses and the operator tree. Queries batched by apoc.periodic.iterate or apoc.periodic.commit
+    cannot be broken down, their profile only covers the procedure call and is marked as such in the report.
+    """
+
+    def __init__(self, uri: str, db_name: str, user: str, password: str, verbose: bool = False,
+                 batch_size: int = 100000):
+        super().__init__(uri=uri, db_name=db_name, user=user, password=password, verbose=verbose,
+                         batch_size=batch_size)
+        self.query_name = None
+        self.profiles = []
+
+    @staticmethod
+    def set_up_connection(config):
+        return ProfilingDatabaseConnection(db_name=config.user, uri=config.uri, user=config.user,
+                                           password=config.password, verbose=config.verbose,
+                                           batch_size=config.batch_size)
+
+    def exec_query(self, function, **kwargs):
+        self.query_name = function.__name__
+        try:
+            return super().exec_query(function, **kwargs)
+        finally:
+            self.query_name = None
+
+    def _exec_query(self, query: str, database: str = None, **kwargs):
+        if UNPROFILABLE_QUERY.match(query):
+            return super()._exec_query(query, database, **kwargs)
+
+        def run_query(tx, _query, **_kwargs):
+            result = tx.run(f"PROFILE {_query}", _kwargs)
+            records = result.data()
+            return records, result.consume().profile
+
+        if self.verbose:
+            print(query)
+        if database is None:
+            database = self.db_name
+
+        start = time.perf_counter()
+        with self.driver.session(database=database) as session:
+            records, profile = session.execute_write(run_query, query, **kwargs)
+        self.record_profile(self.query_name, query, time.perf_counter() - start, len(records), profile)
+        # return like DatabaseConnection._exec_query, None for an empty result
+        return records if records else None
+
+    def stream_records(self, function, fetch_size: int = 1000, **kwargs):
+        """
+        Stream the records of a profiled read query, see query_stream.stream_query; the profile is only available
+        once all records are consumed, hence the recorded duration includes the time spent by the consumer
+        """
+        query, parameters, database = build_query(self, function, **kwargs)
+        profiled_query = get_profiled_query(query)
+        rows = 0
+        start = time.perf_counter()
+        with self.driver.session(database=database, fetch_size=fetch_size) as session:
+            result = session.run(profiled_query, parameters)
+            for record in result:
+                rows += 1
+                yield record
+            profile = result.consume().profile
+        self.record_profile(function.__name__, query, time.perf_counter() - start, rows, profile)
+
+    def run_write_query(self, function, **kwargs):
+        """
+        Run a write query with PROFILE in a managed transaction, see query_stream.run_write_query
+        """
+        query, parameters, database = build_query(self, function, **kwargs)
+        profiled_query = get_profiled_query(query)
+
+        def run_query(tx):
+            result = tx.run(profiled_query, parameters)
+            records = result.data()
+            return records, result.consume().profile
+
+        start = time.perf_counter()
+        with self.driver.session(database=database) as session:
+            records, profile = session.execute_write(run_query)
+        self.record_profile(function.__name__, query, time.perf_counter() - start, len(records), profile)
+        return records
+
+    def record_profile(self, query_name, query, duration, rows, profile):
+        if profile is None:
+            return
+        self.profiles.append({"query_name": query_name, "duration": duration, "rows": rows,
+                              "apoc_batched": bool(APOC_BATCHED_QUERY.search(query)),
+                              **get_profile_totals(profile),
+                              "operator_tree": "\n".join(format_operator_tree(profile))})
+
+    def get_report(self):
+        """
+        @return: DataFrame with the profiled totals per query function, ranked by db hits
+        """
+        df_profiles = pd.DataFrame(self.profiles, columns=["query_name", "duration", "rows", "apoc_batched",
+                                                           "db_hits", "page_cache_hits", "page_cache_misses",
+                                                           "operator_tree"])
+        df_report = df_profiles.groupby("query_name").agg(
+            calls=("duration", "count"), apoc_batched=("apoc_batched", "any"), duration=("duration", "sum"),
+            rows=("rows", "sum"),
+            db_hits=("db_hits", "sum"), max_db_hits=("db_hits", "max"), page_cache_hits=("page_cache_hits", "sum"),
+            page_cache_misses=("page_cache_misses", "sum"))
+        page_cache_accesses = df_report["page_cache_hits"] + df_report["page_cache_misses"]
+        df_report["page_cache_hit_ratio"] = df_report["page_cache_hits"] / page_cache_accesses.where(
+            page_cache_accesses > 0)
+        return df_report.sort_values(["db_hits", "duration"], ascending=False)
+
+    def save_report(self, description):
+        """
+        Write the ranked report to perf/ together with the operator tree of the most expensive call of every query
+        """
+        os.makedirs("perf", exist_ok=True)
+        df_report = self.get_report()
+        df_report.to_csv(f"perf/query_profile_{description}.csv")
+
+        df_profiles = pd.DataFrame(self.profiles, columns=["query_name", "db_hits", "operator_tree"])
+        with open(f"perf/query_plans_{description}.txt", "w", encoding="utf-8") as f:
+            for query_name, row in df_report.iterrows():
+                most_expensive = df_profiles[df_profiles["query_name"] == query_name].nlargest(1, "db_hits")
+                f.write(f"{query_name}: {int(row['calls'])} calls, {int(row['db_hits'])} db hits, "
+                        f"{row['duration']:.3f} seconds\n")
+                if row["apoc_batched"]:
+                    f.write("batched by APOC: the db hits of the inner statements are not included\n")
+                f.write(most_expensive["operator_tree"].iloc[0] + "\n\n")
+        print(df_report.drop(columns=["max_db_hits"]).head(20).to_string())
+        apoc_batched = df_report.index[df_report["apoc_batched"]].tolist()
+        if apoc_batched:
+            print(f"Not broken down, batched by APOC (only the procedure call is profiled): {', '.join(apoc_batched)}")
@@ -9,6 +9,22 @@ class AnalysisConfiguration:
         self.dataset_name = config["dataset_name"]
         self.intermediate_output_directory = config["intermediate_output_directory"]
         self.final_output_directory = config["final_output_directory"]
+        self.intermediate_format = config["intermediate_format"]
+        self.graph_backend = config["graph_backend"]
+        self.profile_queries = config["profile_queries"]
+        self.event_graph_directory = config["event_graph_directory"]
+        self.description_cache_directory = config["description_cache_directory"]
 
         self.case_edges = config['case_edges']
-        self.edge_min_freq = config['edge_min_freq']
\ No newline at end of file
+        self.edge_min_freq = config['edge_min_freq']
+        self.extraction_mode = config['extraction_mode']
+        self.extraction_workers = config['extraction_workers']
+        self.streaming_chunk_size = config['streaming_chunk_size']
+        self.spill_instances = config['spill_instances']
+        self.aggregation_mode = config['aggregation_mode']
+        self.aggregation_workers = config['aggregation_workers']
+        self.statistics_backend = config['statistics_backend']
+        self.columnar_ingestion = config['columnar_ingestion']
+
+        self.actor_behavior_mode = config['actor_behavior_mode']
+        self.handover_backend = config['handover_backend']
\ No newline at end of file
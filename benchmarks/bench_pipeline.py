@@ -0,0 +1,280 @@
+import argparse
+import os
+import subprocess
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_log import get_synthetic_events, write_synthetic_dataset
+from modules.decomposition_actor_behavior.actor_behavior_engine import ColumnarActorBehaviorEngine
+from modules.decomposition_actor_behavior.decomposition_actor_behavior import aggregate_actor_behavior, \
+    aggregate_actor_behavior_all_edges, partition_instances_per_df
+from modules.decomposition_actor_behavior.intermediate_store import get_edge_names
+from modules.decomposition_actor_behavior.running_aggregates import ActorBehaviorAggregates
+from modules.decomposition_actor_behavior.statistics_backend import DEFAULT_QUANTILE_AGG_FUNCS
+
+RESULT_COLUMNS = ["commit", "date", "dataset", "scale_factor", "nr_events", "stage", "variant", "seconds", "rows"]
+PANDAS_AGG_FUNCS = ["mean", "median", "min", "max", "std", "count"]
+
+
+def get_git_commit():
+    """
+    @return: short hash of the checked out commit, suffixed with +dirty if tracked files were changed
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        changes = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                                 text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}+dirty" if changes else commit
+
+
+def time_stage(function, repeat=1):
+    """
+    @return: the fastest wall time of repeat calls of function in seconds, and the result of the last call
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def get_event_graph(events):
+    """
+    Derive the graph that the columnar actor behavior engine loads from the database from a synthetic log: the case
+    and resource df-edges, and the task instances, i.e. the maximal sequences of events that directly follow each
+    other in both their case and their resource
+    @param events: events of a synthetic log ordered by case and timestamp, the position of an event is its id
+    @return: ColumnarActorBehaviorEngine on the derived graph
+    """
+    event_ids = np.arange(len(events))
+    cases = events["case_number"].to_numpy()
+    resources = pd.factorize(events["resourceId"])[0]
+    timestamps = events["timestamp"].to_numpy().astype("datetime64[ns]").astype(np.int64)
+
+    same_case = cases[1:] == cases[:-1]
+    case_df = pd.DataFrame({"df_id": np.arange(same_case.sum()), "e1": event_ids[:-1][same_case],
+                            "e2": event_ids[1:][same_case], "actor_behavior": None})
+
+    resource_order = np.lexsort((event_ids, timestamps, resources))
+    same_resource = resources[resource_order[1:]] == resources[resource_order[:-1]]
+    resource_df = pd.DataFrame({"e1": resource_order[:-1][same_resource], "e2": resource_order[1:][same_resource]})
+
+    # an event continues the task instance of its resource predecessor if that is also its case predecessor
+    continues_task = same_resource & (resource_order[1:] == resource_order[:-1] + 1) & \
+        (cases[resource_order[1:]] == cases[resource_order[:-1]])
+    is_first_event = np.concatenate([[True], ~continues_task])
+    task_instances = np.empty(len(events), dtype=np.int64)
+    task_instances[resource_order] = np.cumsum(is_first_event) - 1
+    task_instance_events = pd.DataFrame({"task_instance": task_instances, "event": event_ids})
+    task_instance_intervals = pd.DataFrame({"task_instance": task_instances, "time": timestamps}) \
+        .groupby("task_instance")["time"].agg(start_time="min", end_time="max").reset_index() \
+        .astype({"start_time": "Int64", "end_time": "Int64"})
+
+    # the task instances of a resource are consecutive in the resource order
+    task_instance_resources = resources[resource_order[is_first_event]]
+    same_resource_task = task_instance_resources[1:] == task_instance_resources[:-1]
+    task_instance_ids = np.arange(len(task_instance_resources))
+    df_ti = pd.DataFrame({"task_instance1": task_instance_ids[:-1][same_resource_task],
+                          "task_instance2": task_instance_ids[1:][same_resource_task]})
+
+    return ColumnarActorBehaviorEngine(case_df=case_df, resource_df=resource_df,
+                                       event_resources=pd.DataFrame({"event": event_ids, "resource": resources}),
+                                       task_instance_events=task_instance_events,
+                                       task_instance_intervals=task_instance_intervals, df_ti=df_ti)
+
+
+def get_key_columns(dataset_name):
+    if dataset_name == "BPIC15":
+        return ["activity1", "activity2"]
+    return ["activity1", "lifecycle1", "activity2", "lifecycle2"]
+
+
+def get_df_instances(dataset_name, events, classification, time_unit="hours"):
+    """
+    @return: the instances of all case df-edges in the column layout of the batched extraction queries, and the case
+    edges ordered by decreasing frequency
+    """
+    e1 = classification["e1"].to_numpy()
+    e2 = classification["e2"].to_numpy()
+    timestamps = events["timestamp"].to_numpy()
+    activities = events["activity"].to_numpy()
+    df_instances = pd.DataFrame({"activity1": activities[e1], "activity2": activities[e2]})
+    if dataset_name == "BPIC15":
+        df_instances["startTime"] = timestamps[e1]
+        df_instances["completeTime"] = timestamps[e2]
+    else:
+        lifecycles = events["lifecycle"].to_numpy()
+        df_instances.insert(1, "lifecycle1", lifecycles[e1])
+        df_instances["lifecycle2"] = lifecycles[e2]
+        df_instances["time"] = timestamps[e1]
+    df_instances[f"duration_{time_unit}"] = (timestamps[e2] - timestamps[e1]) / pd.Timedelta(1, unit=time_unit[0])
+    df_instances["actor_behavior"] = classification["actor_behavior"].to_numpy()
+
+    edge_keys = df_instances.value_counts(get_key_columns(dataset_name), sort=True).index.tolist()
+    if dataset_name == "BPIC15":
+        case_edges = [list(edge_key) for edge_key in edge_keys]
+    else:
+        case_edges = [((activity1, lifecycle1), (activity2, lifecycle2))
+                      for activity1, lifecycle1, activity2, lifecycle2 in edge_keys]
+    return df_instances, case_edges
+
+
+def aggregate_streaming(list_df_instances, agg_func, time_unit="hours", chunk_size=10000):
+    duration_col = f"duration_{time_unit}"
+    actor_behavior_agg = []
+    for df_instances_per_edge in list_df_instances:
+        aggregates = ActorBehaviorAggregates()
+        for start in range(0, len(df_instances_per_edge), chunk_size):
+            df_chunk = df_instances_per_edge.iloc[start:start + chunk_size]
+            df_chunk = df_chunk[df_chunk[duration_col].fillna(0) > 0]
+            aggregates.update(df_chunk["actor_behavior"].to_numpy(dtype=object),
+                              df_chunk[duration_col].to_numpy(dtype=np.float64))
+        actor_behavior_agg.append(aggregates.to_frame(agg_func, duration_col))
+    return actor_behavior_agg
+
+
+def benchmark_offline(dataset_name, scale_factor, repeat=3, seed=0):
+    """
+    Time the in-memory paths of the pipeline on a synthetic log, without a database: deriving the task instances,
+    classifying actor behavior with the columnar engine, extracting the case df-edge instances and aggregating them
+    with every aggregation mode and statistics backend
+    @return: list of (stage, variant, seconds, rows)
+    """
+    timings = []
+    seconds, events = time_stage(lambda: get_synthetic_events(dataset_name, scale_factor, seed=seed))
+    timings.append(("generate_log", "synthetic", seconds, len(events)))
+
+    seconds, engine = time_stage(lambda: get_event_graph(events), repeat)
+    timings.append(("build_tasks", "offline", seconds, len(engine.task_instance_intervals)))
+
+    seconds, classification = time_stage(engine.classify, repeat)
+    timings.append(("add_actor_behavior", "columnar", seconds, int(classification["actor_behavior"].notna().sum())))
+
+    def extract():
+        df_instances, case_edges = get_df_instances(dataset_name, events, classification)
+        partitions = partition_instances_per_df(df_instances, get_key_columns(dataset_name),
+                                                [tuple(np.ravel(case_edge)) for case_edge in case_edges])
+        return list(partitions.values()), case_edges
+
+    seconds, (list_df_instances, case_edges) = time_stage(extract, repeat)
+    timings.append(("extract_decomposed_performance", "instances", seconds, len(classification)))
+    edge_names = [get_edge_names(case_edge) for case_edge in case_edges]
+
+    aggregations = {
+        "per_edge_pandas": lambda: [aggregate_actor_behavior(df_instances_per_edge, ["actor_behavior"],
+                                                             PANDAS_AGG_FUNCS, "hours")
+                                    for df_instances_per_edge in list_df_instances],
+        "streaming": lambda: aggregate_streaming(list_df_instances, DEFAULT_QUANTILE_AGG_FUNCS)
+    }
+    for statistics_backend in ["pandas", "exact", "approximate"]:
+        agg_funcs = PANDAS_AGG_FUNCS if statistics_backend == "pandas" else DEFAULT_QUANTILE_AGG_FUNCS
+        aggregations[f"grouped_{statistics_backend}"] = \
+            lambda agg_funcs=agg_funcs, statistics_backend=statistics_backend: aggregate_actor_behavior_all_edges(
+                list_df_instances, edge_names, agg_funcs, "hours", statistics_backend=statistics_backend)
+    for variant, aggregate in aggregations.items():
+        seconds, df_agg = time_stage(aggregate, repeat)
+        nr_rows = sum(len(df) for df in df_agg) if isinstance(df_agg, list) else len(df_agg)
+        timings.append(("extract_decomposed_performance", f"aggregate_{variant}", seconds, nr_rows))
+    return len(events), timings
+
+
+def benchmark_database(dataset_name, scale_factor, data_directory="benchmarks/data", seed=0):
+    """
+    Time the stages of main_functionalities on a synthetic log, using the database of config.yaml. The database is
+    cleared first.
+    @return: list of (stage, variant, seconds, rows)
+    """
+    # imported here, such that the offline benchmark does not apply the promg patches of main or need a database
+    import main  # noqa: F401
+    from promg import Configuration, DatabaseConnection, Performance
+    from analysis_configuration import AnalysisConfiguration
+    from main_functionalities import clear_db, load_data, transform_data, build_tasks, add_actor_behavior, \
+        extract_decomposed_performance
+
+    events = get_synthetic_events(dataset_name, scale_factor, seed=seed)
+    config = Configuration.init_conf_with_config_file()
+    config.semantic_header_path = f"json_files/{dataset_name}.json"
+    config.dataset_description_path = write_synthetic_dataset(
+        dataset_name, events, os.path.join(data_directory, f"{dataset_name}_sf{scale_factor:g}"), seed=seed)
+    config.use_sample = False
+    config.use_preprocessed_files = False
+    analysis_config = AnalysisConfiguration()
+    analysis_config.dataset_name = dataset_name
+
+    db_connection = DatabaseConnection.set_up_connection(config=config)
+    Performance.set_up_performance(config=config)
+    clear_db(db_connection)
+    stages = {
+        "load_data": lambda: load_data(db_connection=db_connection, config=config),
+        "transform_data": lambda: transform_data(db_connection=db_connection, config=config),
+        "build_tasks": lambda: build_tasks(db_connection=db_connection, config=config),
+        "add_actor_behavior": lambda: add_actor_behavior(db_connection=db_connection, config=config,
+                                                         analysis_config=analysis_config),
+        "extract_decomposed_performance": lambda: extract_decomposed_performance(
+            db_connection=db_connection, config=config, analysis_config=analysis_config)
+    }
+    timings = []
+    for stage, run_stage in stages.items():
+        seconds, _ = time_stage(run_stage)
+        variant = analysis_config.actor_behavior_mode if stage == "add_actor_behavior" else \
+            analysis_config.extraction_mode if stage == "extract_decomposed_performance" else "database"
+        timings.append((stage, variant, seconds, None))
+    db_connection.close_connection()
+    return len(events), timings
+
+
+def benchmark_pipeline(dataset_name="BPIC15", scale_factors=(1, 2, 4), repeat=3, database=False,
+                       results_path="benchmarks/results/pipeline.csv"):
+    """
+    Time the pipeline stages at every scale factor and append the timings, tagged with the current commit, to the
+    results table at results_path
+    @return: the timings of this run
+    """
+    commit = get_git_commit()
+    date = datetime.now().isoformat(timespec="seconds")
+    rows = []
+    for scale_factor in scale_factors:
+        benchmarks = [benchmark_offline(dataset_name, scale_factor, repeat)]
+        if database:
+            benchmarks.append(benchmark_database(dataset_name, scale_factor))
+        for nr_events, timings in benchmarks:
+            rows.extend([commit, date, dataset_name, scale_factor, nr_events, stage, variant, seconds, nr_rows]
+                        for stage, variant, seconds, nr_rows in timings)
+
+    df_results = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    df_results.to_csv(results_path, mode="a", header=not os.path.exists(results_path), index=False)
+    return df_results
+
+
+def compare_commits(results_path="benchmarks/results/pipeline.csv", dataset_name=None):
+    """
+    @return: the fastest time of every stage per commit, with one column per commit in the order they were run
+    """
+    df_results = pd.read_csv(results_path)
+    if dataset_name is not None:
+        df_results = df_results[df_results["dataset"] == dataset_name]
+    commits = df_results.sort_values("date")["commit"].unique()
+    return df_results.pivot_table(index=["dataset", "scale_factor", "stage", "variant"], columns="commit",
+                                  values="seconds", aggfunc="min", sort=False)[commits]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the pipeline stages on synthetic BPIC-shaped logs")
+    parser.add_argument("--dataset", default="BPIC15", choices=["BPIC15", "BPIC17"])
+    parser.add_argument("--scale-factors", type=float, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--database", action="store_true",
+                        help="also time the stages on the database of config.yaml, which is cleared")
+    args = parser.parse_args()
+
+    print(benchmark_pipeline(args.dataset, args.scale_factors, args.repeat, args.database).to_string(index=False))
+    print(compare_commits(dataset_name=args.dataset).to_string())
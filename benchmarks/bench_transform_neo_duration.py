@@ -0,0 +1,66 @@
+import random
+import time
+
+import numpy as np
+import pandas as pd
+from neo4j.time import Duration
+
+from queries import query_result_parser as qp
+
+
+def transform_neo_duration_iterrows(dataframe, column, unit='seconds'):
+    """
+    Row-by-row conversion that query_result_parser.transform_neo_duration used before it was vectorized, kept as
+    the baseline of this benchmark
+    """
+    for index, row in dataframe.iterrows():
+        duration = row[column]
+        duration_seconds = duration.hours_minutes_seconds_nanoseconds[0] * 3600 + \
+                           duration.hours_minutes_seconds_nanoseconds[1] * 60 + \
+                           duration.hours_minutes_seconds_nanoseconds[2]
+        if unit == 'seconds':
+            duration_unit = duration_seconds
+        elif unit == 'minutes':
+            duration_unit = duration_seconds / 60
+        elif unit == 'hours':
+            duration_unit = duration_seconds / 60 / 60
+        elif unit == 'days':
+            duration_unit = duration_seconds / 60 / 60 / 24
+        dataframe.loc[index, f'{column}_{unit}'] = duration_unit
+    dataframe.drop(columns=[column], inplace=True)
+    return dataframe
+
+
+def create_durations(nr_rows, seed=1):
+    # durations as returned by duration.inSeconds, i.e. without months and days
+    rng = random.Random(seed)
+    return pd.DataFrame({"duration": [Duration(seconds=rng.randrange(0, 60 * 60 * 24 * 30)) for _ in range(nr_rows)]})
+
+
+def time_function(function, dataframe, unit, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        dataframe_copy = dataframe.copy()
+        start = time.perf_counter()
+        result = function(dataframe_copy, "duration", unit=unit)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def benchmark_transform_neo_duration(sizes=(1000, 10000, 100000), unit='hours', repeat=3):
+    rows = []
+    for nr_rows in sizes:
+        dataframe = create_durations(nr_rows)
+        vectorized_time, vectorized = time_function(qp.transform_neo_duration, dataframe, unit, repeat)
+        # the row-by-row baseline is too slow to repeat on the larger sizes
+        iterrows_time, iterrows = time_function(transform_neo_duration_iterrows, dataframe, unit,
+                                                repeat if nr_rows <= 10000 else 1)
+        assert np.allclose(vectorized[f"duration_{unit}"], iterrows[f"duration_{unit}"])
+        rows.append({"rows": nr_rows, "iterrows_seconds": iterrows_time, "vectorized_seconds": vectorized_time,
+                     "speedup": iterrows_time / vectorized_time})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    print(benchmark_transform_neo_duration().to_string(index=False))
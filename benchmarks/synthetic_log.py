@@ -0,0 +1,269 @@
+import heapq
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# sizes of a log at scale factor 1, cases and resources grow linearly with the scale factor such that the workload
+# per resource stays the same
+BASE_NR_CASES = 500
+BASE_NR_RESOURCES = 20
+
+# activity origins of BPIC17, every activity of a synthetic BPIC17 log is assigned one of them round-robin
+BPIC17_ORIGINS = [("A_", "Application"), ("W_", "Workflow"), ("O_", "Offer")]
+
+
+def generate_events(nr_cases: int = BASE_NR_CASES, nr_resources: int = BASE_NR_RESOURCES, nr_activities: int = 20,
+                    mean_case_length: float = 12, mean_task_length: float = 2, interleaving: float = 0.5,
+                    utilization: float = 0.8, mean_activity_duration: float = 900, mean_case_waiting: float = 3600,
+                    start: str = "2016-01-01", seed: int = 0) -> pd.DataFrame:
+    """
+    Simulate cases that are executed in tasks by a shared pool of resources. Every case follows a random process
+    model and is split into tasks of consecutive activities, a task is executed by one resource.
+    @param mean_task_length: mean number of consecutive activities of a case that one resource executes as a task
+    @param interleaving: fraction of its previous task during which a resource may already start its next task, 0
+    executes the tasks of a resource strictly one after the other, 1 lets them overlap completely
+    @param utilization: fraction of the capacity of the resources that is needed by the arriving cases
+    @param mean_activity_duration: mean duration of an activity in seconds
+    @param mean_case_waiting: mean time in seconds between two tasks of a case
+    @return: DataFrame with one row per activity execution: case, activity, resource, start_time and end_time,
+    ordered by case and end_time
+    """
+    rng = np.random.default_rng(seed)
+
+    # a random process model in which every activity has a few likely successors
+    transitions = rng.dirichlet(np.full(nr_activities, 0.2), size=nr_activities)
+    cumulative_transitions = transitions.cumsum(axis=1)
+    case_lengths = 1 + rng.poisson(mean_case_length - 1, size=nr_cases)
+    event_case = np.repeat(np.arange(nr_cases), case_lengths)
+    activities = np.empty(len(event_case), dtype=np.int64)
+    case_starts = np.concatenate([[0], case_lengths.cumsum()[:-1]])
+    activities[case_starts] = 0
+    draws = rng.random(len(event_case))
+    for position in range(1, case_lengths.max()):
+        events = case_starts[case_lengths > position] + position
+        previous_activities = activities[events - 1]
+        activities[events] = np.minimum((cumulative_transitions[previous_activities] < draws[events, None]).sum(axis=1),
+                                        nr_activities - 1)
+
+    # split every case into tasks of consecutive activities
+    task_lengths = []
+    for case_length in case_lengths:
+        lengths = 1 + rng.poisson(mean_task_length - 1, size=case_length)
+        lengths = lengths[:np.searchsorted(lengths.cumsum(), case_length) + 1]
+        lengths[-1] -= lengths.sum() - case_length
+        task_lengths.append(lengths)
+    nr_tasks_per_case = np.array([len(lengths) for lengths in task_lengths])
+    task_lengths = np.concatenate(task_lengths)
+    nr_tasks = len(task_lengths)
+    task_first_event = np.concatenate([[0], task_lengths.cumsum()[:-1]])
+    case_first_task = np.concatenate([[0], nr_tasks_per_case.cumsum()[:-1]])
+
+    # a skewed workload, some resources execute many more tasks than others
+    resource_weights = 1 / np.arange(1, nr_resources + 1)
+    task_resources = rng.choice(nr_resources, size=nr_tasks, p=resource_weights / resource_weights.sum())
+
+    durations = rng.exponential(mean_activity_duration, size=len(event_case))
+    end_offsets = durations.cumsum()
+    end_offsets -= np.repeat(end_offsets[task_first_event] - durations[task_first_event], task_lengths)
+    task_durations = end_offsets[task_first_event + task_lengths - 1]
+
+    # arrivals such that the resources are busy for the given fraction of the time
+    mean_interarrival = mean_case_length * mean_activity_duration / (nr_resources * utilization)
+    arrivals = rng.exponential(mean_interarrival, size=nr_cases).cumsum()
+    waiting = rng.exponential(mean_case_waiting, size=nr_tasks)
+
+    task_starts = np.empty(nr_tasks)
+    busy_until = np.zeros(nr_resources)
+    last_task_duration = np.zeros(nr_resources)
+    # execute the tasks in the order in which they become ready, over all cases
+    ready_tasks = [(arrival, case_first_task[case]) for case, arrival in enumerate(arrivals)]
+    heapq.heapify(ready_tasks)
+    task_case = np.repeat(np.arange(nr_cases), nr_tasks_per_case)
+    last_task_of_case = case_first_task + nr_tasks_per_case - 1
+    while ready_tasks:
+        ready, task = heapq.heappop(ready_tasks)
+        resource = task_resources[task]
+        task_start = max(ready, busy_until[resource] - interleaving * last_task_duration[resource])
+        task_end = task_start + task_durations[task]
+        task_starts[task] = task_start
+        busy_until[resource] = max(busy_until[resource], task_end)
+        last_task_duration[resource] = task_durations[task]
+        if task != last_task_of_case[task_case[task]]:
+            heapq.heappush(ready_tasks, (task_end + waiting[task], task + 1))
+
+    event_task_starts = np.repeat(task_starts, task_lengths)
+    origin = pd.Timestamp(start).value
+    events = pd.DataFrame({
+        "case": event_case,
+        "activity": activities,
+        "resource": np.repeat(task_resources, task_lengths),
+        "start_time": pd.to_datetime(origin + ((event_task_starts + end_offsets - durations) * 1e9).astype(np.int64)),
+        "end_time": pd.to_datetime(origin + ((event_task_starts + end_offsets) * 1e9).astype(np.int64))
+    })
+    return events.sort_values(["case", "end_time"], kind="stable", ignore_index=True)
+
+
+def format_timestamps(timestamps: pd.Series, datetime_format: str) -> pd.Series:
+    """
+    Format timestamps as the strings of a dataset description datetime_object format, e.g. y/M/d H:m:s.nX. The
+    timezone (X) is left out, as the import appends the timezone_offset of the description to the string.
+    """
+    strftime_format = re.sub(r"[yMdHmsn]", lambda letter: {"y": "%Y", "M": "%m", "d": "%d", "H": "%H", "m": "%M",
+                                                           "s": "%S", "n": "%f"}[letter.group(0)],
+                             datetime_format.replace("X", ""))
+    formatted = timestamps.dt.strftime(strftime_format)
+    # milliseconds, like the BPIC logs
+    return formatted.str.replace(r"(\.\d{3})\d{3}", r"\1", regex=True) if "%f" in strftime_format else formatted
+
+
+def get_event_attributes(dataset_name: str, events: pd.DataFrame) -> pd.DataFrame:
+    """
+    Expand the activity executions to the events of a dataset, with the values of the attributes that the semantic
+    header uses to construct the graph
+    @return: DataFrame with one row per event and one column per attribute name of the dataset description
+    """
+    if dataset_name == "BPIC15":
+        return pd.DataFrame({
+            "caseId": (events["case"] + 2000000).astype(str),
+            "code": events["activity"].map(lambda activity: f"01_HOOFD_{10 * (activity + 1):03d}"),
+            "activity": events["activity"].map(lambda activity: f"activity {activity + 1:02d}"),
+            "activityDutch": events["activity"].map(lambda activity: f"activiteit {activity + 1:02d}"),
+            "startTime": events["start_time"],
+            "timestamp": events["end_time"],
+            "resourceId": (events["resource"] + 560000).astype(str),
+            "case_number": events["case"]
+        })
+
+    # BPIC17 workflow items record when they start and complete, the other activities only when they complete
+    origins = events["activity"] % len(BPIC17_ORIGINS)
+    is_workflow = (origins == 1).to_numpy()
+    started = events[is_workflow].assign(lifecycle="start", timestamp=events.loc[is_workflow, "start_time"])
+    completed = events.assign(lifecycle="complete", timestamp=events["end_time"])
+    events = pd.concat([started, completed]).sort_values(["case", "timestamp"], kind="stable", ignore_index=True)
+
+    origins = events["activity"] % len(BPIC17_ORIGINS)
+    prefixes = np.array([prefix for prefix, _ in BPIC17_ORIGINS], dtype=object)[origins]
+    event_origins = np.array([event_origin for _, event_origin in BPIC17_ORIGINS], dtype=object)[origins]
+    case_ids = "Application_" + (events["case"] + 1000000).astype(str)
+    event_ids = pd.Series([f"{event_origin}State_{index}" for index, event_origin in enumerate(event_origins)])
+    is_offer = event_origins == "Offer"
+    # the first offer event of a case creates the offer, the later offer events change its state
+    is_created_offer = is_offer & (pd.Series(is_offer).groupby(events["case"]).cumsum() == 1).to_numpy()
+    offer_ids = "Offer_" + (events["case"] + 1000000).astype(str)
+    event_ids[is_created_offer] = offer_ids[is_created_offer]
+    return pd.DataFrame({
+        "activity": prefixes + events["activity"].map(lambda activity: f"Activity {activity + 1:02d}"),
+        "lifecycle": events["lifecycle"],
+        "timestamp": events["timestamp"],
+        "case": case_ids,
+        "resourceId": "User_" + (events["resource"] + 1).astype(str),
+        "eventId": event_ids,
+        "offerId": offer_ids.where(is_offer & ~is_created_offer),
+        "eventOrigin": event_origins,
+        "action": np.where(events["lifecycle"] == "start", "Obtained", "statechange"),
+        "case_number": events["case"]
+    })
+
+
+def get_case_attribute(attribute, case_numbers, case_start, rng):
+    """
+    Random values of an attribute that is not used to construct the graph, constant per case like the case
+    attributes of the BPIC logs
+    """
+    nr_cases = len(case_start)
+    column = attribute["columns"][0]
+    dtype = column.get("dtype")
+    if "datetime_object" in attribute:
+        values = format_timestamps(case_start + pd.to_timedelta(rng.integers(0, 30, size=nr_cases), unit="D"),
+                                   attribute["datetime_object"]["format"])
+    elif dtype == "boolean":
+        values = pd.Series(rng.choice(["True", "False"], size=nr_cases))
+    elif dtype == "float":
+        values = pd.Series(rng.lognormal(9, 1, size=nr_cases).round(2))
+    elif dtype == "Int64":
+        values = pd.Series(rng.integers(1, 120, size=nr_cases), dtype="Int64")
+    else:
+        values = pd.Series([f"{attribute['name']} {value}" for value in rng.integers(1, 6, size=nr_cases)])
+    if attribute["optional"]:
+        values = values.where(rng.random(nr_cases) > 0.2)
+    return values.to_numpy()[case_numbers]
+
+
+def get_records(dataset_description: dict, event_attributes: pd.DataFrame, rng) -> pd.DataFrame:
+    """
+    @return: the events as the records of a CSV file of the dataset description, with its column names and formats
+    """
+    case_numbers = event_attributes["case_number"].to_numpy()
+    case_start = event_attributes.groupby("case_number")["timestamp"].min()
+    case_numbers = case_start.index.get_indexer(case_numbers)
+    case_start = case_start.reset_index(drop=True)
+
+    records = {}
+    for attribute in dataset_description["attributes"]:
+        column = attribute["columns"][0]["name"]
+        if attribute["name"] not in event_attributes.columns:
+            records[column] = get_case_attribute(attribute, case_numbers, case_start, rng)
+        elif "datetime_object" in attribute:
+            records[column] = format_timestamps(event_attributes[attribute["name"]],
+                                                attribute["datetime_object"]["format"]).to_numpy()
+        else:
+            records[column] = event_attributes[attribute["name"]].to_numpy()
+    records = pd.DataFrame(records)
+
+    if dataset_description.get("true_values") is not None:
+        boolean_columns = [attribute["columns"][0]["name"] for attribute in dataset_description["attributes"]
+                           if attribute["columns"][0].get("dtype") == "boolean"]
+        records[boolean_columns] = records[boolean_columns].replace(
+            {"True": dataset_description["true_values"][0], "False": dataset_description["false_values"][0]})
+    return records
+
+
+def get_synthetic_events(dataset_name: str, scale_factor: float = 1, seed: int = 0, **parameters) -> pd.DataFrame:
+    """
+    @param parameters: parameters of generate_events, by default the number of cases and resources grow linearly
+    with the scale factor
+    @return: the events of a synthetic log of the dataset, see get_event_attributes
+    """
+    parameters.setdefault("nr_cases", int(BASE_NR_CASES * scale_factor))
+    parameters.setdefault("nr_resources", max(int(BASE_NR_RESOURCES * scale_factor), 1))
+    return get_event_attributes(dataset_name, generate_events(seed=seed, **parameters))
+
+
+def write_synthetic_dataset(dataset_name: str, event_attributes: pd.DataFrame, output_directory: str,
+                            seed: int = 0) -> str:
+    """
+    Write the events of a synthetic log as the CSV files of json_files/<dataset_name>_DS.json, together with a copy
+    of the dataset description that reads them from output_directory
+    @param output_directory: directory relative to the working directory, in which the files are written
+    @return: path of the dataset description of the synthetic log
+    """
+    rng = np.random.default_rng(seed)
+    with open(f"json_files/{dataset_name}_DS.json", encoding="utf-8") as f:
+        dataset_descriptions = json.load(f)
+
+    # distribute the cases over all files of all dataset descriptions
+    file_names = [file_name for dataset_description in dataset_descriptions
+                  for file_name in dataset_description.get("file_names", [dataset_description.get("file_name")])]
+    case_files = event_attributes["case_number"] % len(file_names)
+
+    os.makedirs(output_directory, exist_ok=True)
+    for dataset_description in dataset_descriptions:
+        dataset_description["file_directory"] = os.path.join(output_directory, "").replace("/", "\\")
+        samples = dataset_description.get("samples", [dataset_description.get("sample")])
+        for file_name in dataset_description.get("file_names", [dataset_description.get("file_name")]):
+            records = get_records(dataset_description, event_attributes[case_files == file_names.index(file_name)],
+                                  rng)
+            records.to_csv(os.path.join(output_directory, file_name), index=False)
+            # sample the first cases of the synthetic file instead of the cases of the original log
+            population_column = samples[0]["population_column"]
+            for sample in samples:
+                if sample.get("file_name", file_name) == file_name:
+                    sample["ids"] = records[population_column].drop_duplicates().head(20).tolist()
+
+    dataset_description_path = os.path.join(output_directory, f"{dataset_name}_DS.json")
+    with open(dataset_description_path, "w", encoding="utf-8") as f:
+        json.dump(dataset_descriptions, f, indent=2)
+    return dataset_description_path
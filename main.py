@@ -9,8 +9,12 @@ from promg.modules.data_importer import Importer as _PromgImporter
 from promg.data_managers.semantic_header import ConstructedNodes as _PromgConstructedNodes
 
 from main_functionalities import clear_db, load_data, transform_data, build_tasks, \
-    print_statistics, add_actor_behavior, extract_decomposed_performance
+    print_statistics, provision_indexes, add_actor_behavior, extract_decomposed_performance, export_event_graph
 from analysis_configuration import AnalysisConfiguration
+from DescriptionCache import set_description_cache_directory
+from PerformanceRecorder import PerformanceRecorder, record_span, set_active_recorder
+from ProfilingDatabaseConnection import ProfilingDatabaseConnection
+from LocalGraphConnection import LocalGraphConnection
 
 analysis_config = AnalysisConfiguration()
 
@@ -49,6 +53,9 @@ def _get_df_ti_label(self):
 if not hasattr(_PromgConstructedNodes, "get_df_ti_label"):
     _PromgConstructedNodes.get_df_ti_label = _get_df_ti_label
 
+# step for creating the indexes used by the actor behavior and extraction queries, and verifying their query plans
+step_provision_indexes = True
+
 # step for adding actor behavior to case df-edges in the graph
 step_add_actor_behavior = True
 
@@ -67,31 +74,69 @@ def main(config,
     @return: None
     """
     print("Started at =", datetime.now().strftime("%H:%M:%S"))
-
-    db_connection = DatabaseConnection.set_up_connection(config=config)
+    # the steps share the parsed semantic header and dataset description
+    set_description_cache_directory(analysis_config.description_cache_directory)
+
+    local_graph = analysis_config.graph_backend == "local"
+    if local_graph:
+        # the graph is built in memory from the event tables, hence the database steps do not apply
+        db_connection = LocalGraphConnection.set_up_connection(config=config,
+                                                               dataset_name=analysis_config.dataset_name)
+        step_clear_db = step_populate_graph = step_build_tasks = False
+    elif analysis_config.profile_queries:
+        db_connection = ProfilingDatabaseConnection.set_up_connection(config=config)
+    else:
+        db_connection = DatabaseConnection.set_up_connection(config=config)
     performance = Performance.set_up_performance(config=config)
+    # spans of the steps, queries and case df-edges, written as CSV and as a Chrome trace
+    recorder = PerformanceRecorder(data_set=analysis_config.dataset_name, description="main")
+    set_active_recorder(recorder)
 
     if step_clear_db:
-        clear_db(db_connection)
+        with record_span("clear_db"):
+            clear_db(db_connection)
 
     if step_populate_graph:
-        load_data(db_connection=db_connection,
-                  config=config)
-        transform_data(db_connection=db_connection,
-                       config=config)
+        with record_span("load_data"):
+            load_data(db_connection=db_connection,
+                      config=config)
+        with record_span("transform_data"):
+            transform_data(db_connection=db_connection,
+                           config=config)
 
     if step_build_tasks:
-        build_tasks(db_connection=db_connection, config=config)
+        with record_span("build_tasks"):
+            build_tasks(db_connection=db_connection, config=config)
+
+    if step_provision_indexes and not local_graph:
+        with record_span("provision_indexes"):
+            provision_indexes(db_connection=db_connection, config=config, analysis_config=analysis_config)
+
+    event_graph = None
+    if analysis_config.event_graph_directory:
+        with record_span("export_event_graph"):
+            event_graph = export_event_graph(db_connection=db_connection, config=config,
+                                             directory=analysis_config.event_graph_directory)
 
     if step_add_actor_behavior:
-        add_actor_behavior(db_connection=db_connection, config=config, analysis_config=analysis_config)
+        with record_span("add_actor_behavior"):
+            add_actor_behavior(db_connection=db_connection, config=config, analysis_config=analysis_config,
+                               event_graph=event_graph)
 
     if step_extract_decomposed_performance:
-        extract_decomposed_performance(db_connection=db_connection, config=config,
-                                       analysis_config=analysis_config)
+        with record_span("extract_decomposed_performance"):
+            extract_decomposed_performance(db_connection=db_connection, config=config,
+                                           analysis_config=analysis_config)
 
     performance.finish_and_save()
-    print_statistics(db_connection)
+    recorder.record_total_performance()
+    recorder.save_to_file()
+    recorder.save_chrome_trace()
+    set_active_recorder(None)
+    if not local_graph:
+        print_statistics(db_connection)
+    if analysis_config.profile_queries and not local_graph:
+        db_connection.save_report(description=analysis_config.dataset_name)
 
     db_connection.close_connection()
 
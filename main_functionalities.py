@@ -1,8 +1,10 @@
 from colorama import Fore
-from promg import OcedPg, SemanticHeader, DatasetDescriptions
+from promg import OcedPg
 from promg.modules.db_management import DBManagement
 from promg.modules.task_identification import TaskIdentification
 
+from DescriptionCache import get_dataset_descriptions, get_semantic_header
+from modules.compact_event_graph.compact_event_graph import CompactEventGraph
 from modules.decomposition_actor_behavior.decomposition_actor_behavior import DecompositionActorBehavior
 from modules.custom_modules.delay_analysis import PerformanceAnalyzeDelays
 from modules.custom_modules.df_interactions import InferDFInteractions
@@ -23,8 +25,8 @@ def load_data(db_connection, config):
     else:
         print(Fore.RED + '📝 Importing and creating files' + Fore.RESET)
 
-    semantic_header = SemanticHeader.create_semantic_header(config=config)
-    dataset_descriptions = DatasetDescriptions(config=config)
+    semantic_header = get_semantic_header(config=config)
+    dataset_descriptions = get_dataset_descriptions(config=config)
 
     oced_pg = OcedPg(database_connection=db_connection,
                      semantic_header=semantic_header,
@@ -38,8 +40,8 @@ def load_data(db_connection, config):
 
 def transform_data(db_connection,
                    config):
-    dataset_descriptions = DatasetDescriptions(config=config)
-    semantic_header = SemanticHeader.create_semantic_header(config=config)
+    dataset_descriptions = get_dataset_descriptions(config=config)
+    semantic_header = get_semantic_header(config=config)
 
     oced_pg = OcedPg(database_connection=db_connection,
                      semantic_header=semantic_header,
@@ -53,46 +55,46 @@ def transform_data(db_connection,
     oced_pg.create_df_edges()
 
 
-def delete_parallel_df(db_connection, config):
-    semantic_header = SemanticHeader.create_semantic_header(config=config)
+def delete_parallel_df(db_connection, config, event_graph=None, multi_pair: bool = False, workers: int = 1):
+    semantic_header = get_semantic_header(config=config)
     print(Fore.RED + 'Inferring DF over relations between objects.' + Fore.RESET)
     print("s", semantic_header)
-    infer_df_interactions = InferDFInteractions(db_connection=db_connection, semantic_header=semantic_header)
+    infer_df_interactions = InferDFInteractions(db_connection=db_connection, semantic_header=semantic_header,
+                                                event_graph=event_graph)
     
     if semantic_header.name == "BPIC15":
-        infer_df_interactions.delete_parallel_directly_follows_derived('Application', 'Application')
-        infer_df_interactions.delete_parallel_directly_follows_derived('Application', 'Resource')
-        infer_df_interactions.delete_parallel_directly_follows_derived('Application', 'MonitoringResource')
-        infer_df_interactions.delete_parallel_directly_follows_derived('Application', 'ResponsibleActor')
+        entity_pairs = [('Application', 'Application'), ('Application', 'Resource'),
+                        ('Application', 'MonitoringResource'), ('Application', 'ResponsibleActor')]
     else:
-        infer_df_interactions.delete_parallel_directly_follows_derived('CASE_AO', 'Application')
-        infer_df_interactions.delete_parallel_directly_follows_derived('CASE_AO', 'Offer')
-        infer_df_interactions.delete_parallel_directly_follows_derived('CASE_AW', 'Application')
-        infer_df_interactions.delete_parallel_directly_follows_derived('CASE_AW', 'Workflow')
-        infer_df_interactions.delete_parallel_directly_follows_derived('CASE_WO', 'Workflow')
-        infer_df_interactions.delete_parallel_directly_follows_derived('CASE_WO', 'Offer')
-
-def discover_model(db_connection, config):
-    semantic_header = SemanticHeader.create_semantic_header(config)
+        entity_pairs = [('CASE_AO', 'Application'), ('CASE_AO', 'Offer'), ('CASE_AW', 'Application'),
+                        ('CASE_AW', 'Workflow'), ('CASE_WO', 'Workflow'), ('CASE_WO', 'Offer')]
+    if multi_pair:
+        # one pass over the start events for all pairs, with the number of deleted df-relationships per pair
+        infer_df_interactions.delete_parallel_directly_follows_derived_pairs(entity_pairs, workers=workers)
+    else:
+        for entity_str, original_entity_str in entity_pairs:
+            infer_df_interactions.delete_parallel_directly_follows_derived(entity_str, original_entity_str)
+
+
+def discover_model(db_connection, config, event_graph=None, single_pass: bool = False):
+    semantic_header = get_semantic_header(config)
     print(Fore.RED + 'Discovering multi-object DFG.' + Fore.RESET)
-    dfg = DiscoverDFG(db_connection=db_connection, semantic_header=semantic_header)
+    dfg = DiscoverDFG(db_connection=db_connection, semantic_header=semantic_header, event_graph=event_graph)
     
     if semantic_header.name == "BPIC15":
-        dfg.discover_dfg_for_entity("Application", 25000, 0.0)
-        dfg.discover_dfg_for_entity("Resource", 25000, 0.0)
-        dfg.discover_dfg_for_entity("MonitoringResource", 25000, 0.0)
-        dfg.discover_dfg_for_entity("ResponsibleActor", 25000, 0.0)
+        entities = ["Application", "Resource", "MonitoringResource", "ResponsibleActor"]
+    else:
+        entities = ["Application", "Offer", "Workflow", "CASE_AO", "CASE_AW", "CASE_WO"]
+    if single_pass:
+        # one query for the df-frequencies of all entities, thresholds on activity x activity matrices
+        dfg.discover_dfg(entities, 25000, 0.0)
     else:
-        dfg.discover_dfg_for_entity("Application", 25000, 0.0)
-        dfg.discover_dfg_for_entity("Offer", 25000, 0.0)
-        dfg.discover_dfg_for_entity("Workflow", 25000, 0.0)
-        dfg.discover_dfg_for_entity("CASE_AO", 25000, 0.0)
-        dfg.discover_dfg_for_entity("CASE_AW", 25000, 0.0)
-        dfg.discover_dfg_for_entity("CASE_WO", 25000, 0.0)
+        for entity in entities:
+            dfg.discover_dfg_for_entity(entity, 25000, 0.0)
 
 
 def build_tasks(db_connection, config):
-    semantic_header = SemanticHeader.create_semantic_header(config)
+    semantic_header = get_semantic_header(config)
     print(Fore.RED + 'Detecting tasks.' + Fore.RESET)
     if semantic_header.name == "BPIC15":
         task_identifier = TaskIdentification(
@@ -111,8 +113,39 @@ def build_tasks(db_connection, config):
     # task_identifier.aggregate_on_task_variant()
 
 
-def add_actor_behavior(db_connection, config, analysis_config):
-    semantic_header = SemanticHeader.create_semantic_header(config)
+def export_event_graph(db_connection, config, directory):
+    """
+    Export the df-relationships of all entity types with inferred df-relationships, the task instances and the
+    resources to directory and return the memory-mapped CompactEventGraph
+    """
+    semantic_header = get_semantic_header(config)
+    print(Fore.RED + 'Exporting the event graph.' + Fore.RESET)
+    entities = [entity for entity in semantic_header.nodes + semantic_header.relations if entity.infer_df]
+    event_graph = CompactEventGraph.from_connection(db_connection, entities=entities,
+                                                    resource=semantic_header.get_entity("Resource"))
+    event_graph.save(directory)
+    return CompactEventGraph.load(directory)
+
+
+def provision_indexes(db_connection, config, analysis_config):
+    semantic_header = get_semantic_header(config)
+    print(Fore.RED + 'Provisioning indexes.' + Fore.RESET)
+
+    if semantic_header.name == "BPIC15":
+        decomposition_actor_behavior = DecompositionActorBehavior(db_connection=db_connection,
+                                                                  semantic_header=semantic_header,
+                                                                  dataset_name=analysis_config.dataset_name,
+                                                                  resource="Resource", case="Application")
+    else:
+        decomposition_actor_behavior = DecompositionActorBehavior(db_connection=db_connection,
+                                                                  semantic_header=semantic_header,
+                                                                  dataset_name=analysis_config.dataset_name,
+                                                                  resource="Resource", case="CaseAWO")
+    decomposition_actor_behavior.provision_indexes()
+
+
+def add_actor_behavior(db_connection, config, analysis_config, event_graph=None):
+    semantic_header = get_semantic_header(config)
     print(Fore.RED + 'Adding actor behavior.' + Fore.RESET)
 
     if semantic_header.name == "BPIC15":
@@ -126,11 +159,12 @@ def add_actor_behavior(db_connection, config, analysis_config):
                                                               semantic_header=semantic_header,
                                                               dataset_name=analysis_config.dataset_name,
                                                               resource="Resource", case="CaseAWO")
-    decomposition_actor_behavior.add_actor_behavior()
+    decomposition_actor_behavior.add_actor_behavior(mode=analysis_config.actor_behavior_mode, event_graph=event_graph,
+                                                    handover_backend=analysis_config.handover_backend)
 
 
 def extract_decomposed_performance(db_connection, config, analysis_config):
-    semantic_header = SemanticHeader.create_semantic_header(config)
+    semantic_header = get_semantic_header(config)
     print(Fore.RED + 'Decomposing performance by actor behavior.' + Fore.RESET)
     
     if semantic_header.name == "BPIC15":
@@ -146,13 +180,20 @@ def extract_decomposed_performance(db_connection, config, analysis_config):
                                                               resource="Resource", case="CaseAWO")
     
     decomposition_actor_behavior.extract_decomposed_performance_by_actor_behavior_per_edge(
-        case_edges=analysis_config.case_edges, edge_min_freq=analysis_config.edge_min_freq)
+        case_edges=analysis_config.case_edges, edge_min_freq=analysis_config.edge_min_freq,
+        extraction_mode=analysis_config.extraction_mode, columnar_ingestion=analysis_config.columnar_ingestion,
+        intermediate_format=analysis_config.intermediate_format,
+        extraction_workers=analysis_config.extraction_workers, aggregation_mode=analysis_config.aggregation_mode,
+        aggregation_workers=analysis_config.aggregation_workers,
+        streaming_chunk_size=analysis_config.streaming_chunk_size, spill_instances=analysis_config.spill_instances,
+        statistics_backend=analysis_config.statistics_backend,
+        incremental=analysis_config.actor_behavior_mode == "incremental")
 
 
-def infer_delays(db_connection):
+def infer_delays(db_connection, event_graph=None):
     print(Fore.RED + 'Computing delay edges.' + Fore.RESET)
-    delays = PerformanceAnalyzeDelays(db_connection)
-    # delays.enrich_with_delay_edges()
+    delays = PerformanceAnalyzeDelays(db_connection, event_graph=event_graph)
+    delays.enrich_with_delay_edges()
     # delays.analyze_delays()
     delays.visualize_delays(10000)
 
@@ -0,0 +1,389 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    # sparse activity x activity matrices for logs with many activities, dense matrices otherwise
+    import scipy.sparse as sparse
+except ImportError:
+    sparse = None
+
+from queries.compact_event_graph import CompactEventGraphQueryLibrary as cql
+from queries.decomposition_actor_behavior import DecompositionActorBehaviorQueryLibrary as ql
+from queries import query_result_parser as qp
+
+NO_INDEX = -1
+# stored for missing timestamps in the int64 time arrays
+MISSING_TIME = np.iinfo(np.int64).min
+
+
+def build_csr(sources, targets, nr_nodes, dtype=np.int32):
+    """
+    @return: compressed sparse row arrays of the edges sources -> targets: the targets of node i are
+    indices[indptr[i]:indptr[i + 1]], and the position of every edge in indices
+    """
+    order = np.lexsort((targets, sources))
+    indptr = np.zeros(nr_nodes + 1, dtype=np.int32)
+    np.cumsum(np.bincount(sources, minlength=nr_nodes), out=indptr[1:])
+    return indptr, np.asarray(targets, dtype=dtype)[order], order
+
+
+def to_index(positions: pd.Series, ids) -> np.ndarray:
+    """
+    @return: the position of every database id in ids, NO_INDEX for unknown ids
+    """
+    return positions.reindex(ids).fillna(NO_INDEX).to_numpy(dtype=np.int32)
+
+
+class CompactEventGraph:
+    """
+    Array representation of the event graph for analyses in Python. The events are numbered 0..n-1 in the order of
+    their database id; the df-relationships of every entity type are kept as successor and predecessor arrays in
+    compressed sparse row layout, next to the task instance and the resources of every event. All indices are int32
+    arrays, the database ids are kept as int64 arrays such that results can be written back to the graph.
+
+    The arrays are saved as .npy files in a directory and memory-mapped when loaded; they reflect the graph at the
+    time of the export, so the graph has to be exported again after the df-relationships changed.
+    """
+
+    def __init__(self, arrays: dict, entity_types: list, resource_type: str, corr_types: dict):
+        self.arrays = arrays
+        self.entity_types = entity_types
+        self.resource_type = resource_type
+        # correlation types of every entity type
+        self.corr_types = corr_types
+
+    @property
+    def nr_events(self):
+        return len(self.arrays["event_ids"])
+
+    @staticmethod
+    def from_connection(connection, entities: list, resource):
+        """
+        Export the event graph of the connection
+        @param entities: ConstructedNodes of the entity types of which the df-relationships are exported
+        @param resource: ConstructedNodes of the resource entity
+        """
+        events = qp.parse_to_dataframe(connection.exec_query(cql.q_get_events),
+                                       columns=["event", "activity", "timestamp"]).sort_values("event")
+        event_ids = events["event"].to_numpy(dtype=np.int64)
+        event_positions = pd.Series(np.arange(len(event_ids)), index=event_ids)
+        activity_ids, activities = np.unique(events["activity"].dropna().to_numpy(dtype=np.int64),
+                                             return_inverse=True)
+        activity_index = np.full(len(event_ids), NO_INDEX, dtype=np.int32)
+        activity_index[events["activity"].notna().to_numpy()] = activities
+        arrays = {
+            "event_ids": event_ids,
+            "timestamps": events["timestamp"].astype("Int64").fillna(MISSING_TIME).to_numpy(np.int64),
+            "activities": activity_index,
+            "activity_ids": activity_ids
+        }
+
+        corr_types = {entity.type: entity.get_corr_type_strings().split("|") for entity in entities}
+        for corr_type in sorted(set(sum(corr_types.values(), []))):
+            correlations = qp.parse_to_dataframe(connection.exec_query(cql.q_get_correlations,
+                                                                       **{"corr_type": corr_type}),
+                                                 columns=["event", "node"])
+            arrays[f"corr_{corr_type}_indptr"], arrays[f"corr_{corr_type}_nodes"], _ = build_csr(
+                to_index(event_positions, correlations["event"]), correlations["node"].to_numpy(dtype=np.int64),
+                len(event_ids), dtype=np.int64)
+
+        for entity in entities:
+            df_edges = qp.parse_to_dataframe(connection.exec_query(cql.q_get_df_edges, **{"entity": entity}),
+                                             columns=["df_id", "e1", "e2"])
+            e1 = to_index(event_positions, df_edges["e1"])
+            e2 = to_index(event_positions, df_edges["e2"])
+            df_ids = df_edges["df_id"].to_numpy(dtype=np.int64)
+            arrays.update(get_df_arrays(entity.type, e1, e2, df_ids, len(event_ids)))
+
+        # all resources of every event, as the sequential queries match any shared resource
+        event_resources = qp.parse_to_dataframe(connection.exec_query(ql.q_get_event_resources,
+                                                                      **{"resource": resource}),
+                                                columns=["event", "resource"])
+        resource_ids, resources = np.unique(event_resources["resource"].to_numpy(dtype=np.int64),
+                                            return_inverse=True)
+        arrays["resource_ids"] = resource_ids
+        arrays["resources_indptr"], arrays["resources"], _ = build_csr(
+            to_index(event_positions, event_resources["event"]), resources, len(event_ids))
+
+        task_instance_intervals = qp.parse_to_dataframe(connection.exec_query(ql.q_get_task_instance_intervals),
+                                                        columns=["task_instance", "start_time", "end_time"]) \
+            .sort_values("task_instance")
+        task_instance_ids = task_instance_intervals["task_instance"].to_numpy(dtype=np.int64)
+        task_instance_positions = pd.Series(np.arange(len(task_instance_ids)), index=task_instance_ids)
+        arrays["task_instance_ids"] = task_instance_ids
+        for column in ["start_time", "end_time"]:
+            arrays[f"task_instance_{column}s"] = task_instance_intervals[column].astype("Int64") \
+                .fillna(MISSING_TIME).to_numpy(np.int64)
+        task_instance_events = qp.parse_to_dataframe(connection.exec_query(ql.q_get_task_instance_events),
+                                                     columns=["task_instance", "event"])
+        arrays["task_instances"] = np.full(len(event_ids), NO_INDEX, dtype=np.int32)
+        arrays["task_instances"][to_index(event_positions, task_instance_events["event"])] = \
+            to_index(task_instance_positions, task_instance_events["task_instance"])
+
+        df_ti = qp.parse_to_dataframe(connection.exec_query(ql.q_get_df_ti_edges, **{"resource": resource}),
+                                      columns=["task_instance1", "task_instance2"])
+        ti1 = to_index(task_instance_positions, df_ti["task_instance1"])
+        ti2 = to_index(task_instance_positions, df_ti["task_instance2"])
+        arrays["df_ti_successors_indptr"], arrays["df_ti_successors"], _ = build_csr(ti1, ti2,
+                                                                                     len(task_instance_ids))
+        return CompactEventGraph(arrays, entity_types=[entity.type for entity in entities],
+                                 resource_type=resource.type, corr_types=corr_types)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name, array in self.arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+        with open(os.path.join(directory, "event_graph.json"), "w", encoding="utf-8") as f:
+            json.dump({"entity_types": self.entity_types, "resource_type": self.resource_type,
+                       "corr_types": self.corr_types, "nr_events": self.nr_events}, f, indent=2)
+
+    @staticmethod
+    def load(directory, mmap_mode="r"):
+        """
+        Load an exported event graph, the arrays are memory-mapped instead of read unless mmap_mode is None
+        """
+        with open(os.path.join(directory, "event_graph.json"), encoding="utf-8") as f:
+            description = json.load(f)
+        arrays = {file_name[:-len(".npy")]: np.load(os.path.join(directory, file_name), mmap_mode=mmap_mode)
+                  for file_name in os.listdir(directory) if file_name.endswith(".npy")}
+        return CompactEventGraph(arrays, entity_types=description["entity_types"],
+                                 resource_type=description["resource_type"],
+                                 corr_types=description["corr_types"])
+
+    def has_entity(self, entity_type):
+        return entity_type in self.entity_types
+
+    def successors(self, entity_type, event):
+        indptr = self.arrays[f"df_{entity_type}_successors_indptr"]
+        return self.arrays[f"df_{entity_type}_successors"][indptr[event]:indptr[event + 1]]
+
+    def predecessors(self, entity_type, event):
+        indptr = self.arrays[f"df_{entity_type}_predecessors_indptr"]
+        return self.arrays[f"df_{entity_type}_predecessors"][indptr[event]:indptr[event + 1]]
+
+    def get_df_edges(self, entity_type):
+        """
+        @return: arrays e1, e2 and df_ids of the df-relationships of entity_type, ordered by e1 and e2
+        """
+        indptr = self.arrays[f"df_{entity_type}_successors_indptr"]
+        e1 = np.repeat(np.arange(self.nr_events, dtype=np.int32), np.diff(indptr))
+        return e1, np.asarray(self.arrays[f"df_{entity_type}_successors"]), \
+            np.asarray(self.arrays[f"df_{entity_type}_ids"])
+
+    def get_correlations(self, corr_type):
+        """
+        @return: arrays events and nodes of the correlations (e)-[:corr_type]->(n), nodes are database ids
+        """
+        indptr = self.arrays[f"corr_{corr_type}_indptr"]
+        return np.repeat(np.arange(self.nr_events, dtype=np.int32), np.diff(indptr)), \
+            np.asarray(self.arrays[f"corr_{corr_type}_nodes"])
+
+    def get_task_instance_successors(self, task_instance):
+        indptr = self.arrays["df_ti_successors_indptr"]
+        return self.arrays["df_ti_successors"][indptr[task_instance]:indptr[task_instance + 1]]
+
+    def get_event_resources(self) -> pd.DataFrame:
+        """
+        @return: every pair of an event and the position of a resource it is correlated to
+        """
+        indptr = self.arrays["resources_indptr"]
+        return pd.DataFrame({"event": np.repeat(np.arange(self.nr_events, dtype=np.int32), np.diff(indptr)),
+                             "resource": np.asarray(self.arrays["resources"])})
+
+    def get_task_instance_events(self) -> pd.DataFrame:
+        task_instances = np.asarray(self.arrays["task_instances"])
+        contained = task_instances != NO_INDEX
+        return pd.DataFrame({"task_instance": task_instances[contained],
+                             "event": np.flatnonzero(contained).astype(np.int32)})
+
+    def get_task_instance_intervals(self) -> pd.DataFrame:
+        """
+        @return: start and end time of every task instance in nanoseconds since the epoch, missing times are NA
+        """
+        intervals = {"task_instance": np.arange(len(self.arrays["task_instance_ids"]), dtype=np.int32)}
+        for column in ["start_time", "end_time"]:
+            times = np.asarray(self.arrays[f"task_instance_{column}s"])
+            intervals[column] = pd.array(times, dtype="Int64")
+            intervals[column][times == MISSING_TIME] = pd.NA
+        return pd.DataFrame(intervals)
+
+    def get_df_ti_edges(self) -> pd.DataFrame:
+        indptr = self.arrays["df_ti_successors_indptr"]
+        return pd.DataFrame({
+            "task_instance1": np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr)),
+            "task_instance2": np.asarray(self.arrays["df_ti_successors"])})
+
+
+def get_df_arrays(entity_type, e1, e2, df_ids, nr_events):
+    successors_indptr, successors, order = build_csr(e1, e2, nr_events)
+    predecessors_indptr, predecessors, _ = build_csr(e2, e1, nr_events)
+    return {
+        f"df_{entity_type}_successors_indptr": successors_indptr,
+        f"df_{entity_type}_successors": successors,
+        # database id of the df-relationship of every successor
+        f"df_{entity_type}_ids": df_ids[order],
+        f"df_{entity_type}_predecessors_indptr": predecessors_indptr,
+        f"df_{entity_type}_predecessors": predecessors
+    }
+
+
+def get_pair_keys(e1, e2, nr_events):
+    return np.asarray(e1, dtype=np.int64) * nr_events + np.asarray(e2, dtype=np.int64)
+
+
+def get_shared_node_counts(event_graph: CompactEventGraph, e1, e2, corr_types) -> np.ndarray:
+    """
+    @return: per pair of events the number of nodes n with (e1)-[:corr_types]->(n)<-[:corr_types]-(e2)
+    """
+    events, nodes = zip(*[event_graph.get_correlations(corr_type) for corr_type in corr_types])
+    events, nodes = np.concatenate(events), np.concatenate(nodes)
+    # the correlations of every e1, then the ones that e2 shares
+    indptr = np.zeros(event_graph.nr_events + 1, dtype=np.int64)
+    np.cumsum(np.bincount(events, minlength=event_graph.nr_events), out=indptr[1:])
+    order = np.argsort(events, kind="stable")
+    nr_correlations = indptr[np.asarray(e1) + 1] - indptr[np.asarray(e1)]
+    pairs = np.repeat(np.arange(len(e1)), nr_correlations)
+    positions = np.arange(len(pairs)) - np.repeat(np.cumsum(nr_correlations) - nr_correlations, nr_correlations)
+    pair_nodes = nodes[order][indptr[np.asarray(e1)][pairs] + positions]
+    shared = pd.MultiIndex.from_arrays([np.asarray(e2)[pairs], pair_nodes]) \
+        .isin(pd.MultiIndex.from_arrays([events, nodes])) if len(pairs) else np.zeros(0, dtype=bool)
+    return np.bincount(pairs[shared], minlength=len(e1))
+
+
+def get_activity_matrix(c1, c2, values, nr_activities):
+    """
+    @return: activity x activity matrix with the sum of values per pair of activity indices c1 and c2, as a SciPy
+    CSR matrix if SciPy is installed and as a dense array otherwise
+    """
+    if sparse is not None:
+        return sparse.csr_matrix((np.asarray(values, dtype=np.int64), (c1, c2)),
+                                 shape=(nr_activities, nr_activities))
+    return np.bincount(get_pair_keys(c1, c2, nr_activities), weights=values,
+                       minlength=nr_activities * nr_activities).astype(np.int64).reshape(nr_activities, nr_activities)
+
+
+def get_nonzero_entries(matrix):
+    """
+    @return: row indices, column indices and values of the nonzero entries of an activity matrix
+    """
+    if sparse is not None:
+        matrix = matrix.tocoo()
+        nonzero = matrix.data != 0
+        return matrix.row[nonzero], matrix.col[nonzero], matrix.data[nonzero]
+    rows, columns = np.nonzero(matrix)
+    return rows, columns, matrix[rows, columns]
+
+
+def get_entries(matrix, rows, columns):
+    if sparse is not None and len(rows) > 0:
+        return np.asarray(matrix[rows, columns]).ravel()
+    return matrix[rows, columns]
+
+
+def get_df_frequency_table(c1, c2, df_freq, df_count, nr_activities) -> pd.DataFrame:
+    """
+    Sum df_freq and df_count per pair of activities in activity x activity matrices; the frequency of the reverse
+    direction is read from the transposed count matrix instead of being matched per pair
+    @return: DataFrame with the activity indices c1 and c2 of every pair with df_freq > 0, df_freq and the number
+    df_freq2 of df-relationships c2 -> c1
+    """
+    frequencies = get_activity_matrix(c1, c2, df_freq, nr_activities)
+    counts_transposed = get_activity_matrix(c1, c2, df_count, nr_activities).T
+    rows, columns, values = get_nonzero_entries(frequencies)
+    return pd.DataFrame({"c1": rows, "c2": columns, "df_freq": values,
+                         "df_freq2": get_entries(counts_transposed, rows, columns)})
+
+
+def select_df_a_relations(df_frequencies: pd.DataFrame, df_threshold: int = 0,
+                          relative_df_threshold: float = 0.0) -> pd.DataFrame:
+    """
+    Apply the thresholds of DiscoverDFGQueryLibrary.aggregate_df_relations(_heuristic) to a df-frequency table
+    """
+    df_frequencies = df_frequencies[df_frequencies["df_freq"] > df_threshold]
+    if relative_df_threshold != 0.0:
+        df_frequencies = df_frequencies[df_frequencies["df_freq"] >
+                                        df_frequencies["df_freq2"] * relative_df_threshold]
+    return df_frequencies
+
+
+def get_activity_df_frequencies(event_graph: CompactEventGraph, entity_type) -> pd.DataFrame:
+    """
+    Count the df-relationships of entity_type per pair of activities, as DiscoverDFGQueryLibrary.aggregate_df_relations
+    does: once for every node that both events are correlated to with the correlation types of entity_type,
+    whatever the label of the node
+    @return: DataFrame with the database ids c1 and c2 of the activities, the frequency df_freq of c1 -> c2 and the
+    number df_freq2 of df-relationships c2 -> c1
+    """
+    e1, e2, _ = event_graph.get_df_edges(entity_type)
+    activities = np.asarray(event_graph.arrays["activities"])
+    activity_ids = np.asarray(event_graph.arrays["activity_ids"])
+    a1 = activities[e1]
+    a2 = activities[e2]
+    observed = (a1 != NO_INDEX) & (a2 != NO_INDEX)
+    shared = get_shared_node_counts(event_graph, e1[observed], e2[observed], event_graph.corr_types[entity_type])
+    df_frequencies = get_df_frequency_table(a1[observed], a2[observed], shared,
+                                            np.ones(observed.sum(), dtype=np.int64), len(activity_ids))
+    return df_frequencies.assign(c1=activity_ids[df_frequencies["c1"].to_numpy()],
+                                 c2=activity_ids[df_frequencies["c2"].to_numpy()])
+
+
+def get_parallel_df_ids(event_graph: CompactEventGraph, entity_type, original_entity_type,
+                        deleted_df_ids=None) -> np.ndarray:
+    """
+    @param deleted_df_ids: database ids of df-relationships that are deleted from the graph since the export
+    @return: database ids of the df-relationships of entity_type between events that also have a df-relationship
+    of original_entity_type, as InferDFInteractionsQueryLibrary.delete_parallel_directly_follows_derived matches
+    """
+    e1, e2, df_ids = event_graph.get_df_edges(entity_type)
+    original_e1, original_e2, original_df_ids = event_graph.get_df_edges(original_entity_type)
+    if deleted_df_ids is not None:
+        remaining = ~np.isin(df_ids, deleted_df_ids)
+        e1, e2, df_ids = e1[remaining], e2[remaining], df_ids[remaining]
+        original_remaining = ~np.isin(original_df_ids, deleted_df_ids)
+        original_e1, original_e2 = original_e1[original_remaining], original_e2[original_remaining]
+    parallel = np.isin(get_pair_keys(e1, e2, event_graph.nr_events),
+                       get_pair_keys(original_e1, original_e2, event_graph.nr_events))
+    return df_ids[parallel]
+
+
+def get_delay_edges(event_graph: CompactEventGraph, excluded_entity_types=("CaseAWO",)) -> pd.DataFrame:
+    """
+    Select per event e2 the latest predecessor e1 over the df-relationships of all exported entity types except
+    excluded_entity_types, as PerformanceAnalyzeDelaysQueryLibrary.q_create_delay_edges does, with a top-1 reduction
+    per e2 instead of a sort: the latest timestamp of a predecessor per e2, of those predecessors the one with the
+    lowest index; missing timestamps are ordered like the null durations of the query
+    @return: DataFrame with the database ids e1 and e2, the entity type by of the first df-relationship between
+    them and the number of df-relationships between them
+    """
+    entity_types = [entity_type for entity_type in event_graph.entity_types
+                    if entity_type not in excluded_entity_types]
+    if not entity_types:
+        return pd.DataFrame(columns=["e1", "e2", "by", "count"])
+    df_edges = [event_graph.get_df_edges(entity_type) for entity_type in entity_types]
+    e1 = np.concatenate([edges[0] for edges in df_edges])
+    e2 = np.concatenate([edges[1] for edges in df_edges])
+    by = np.repeat(np.arange(len(entity_types)), [len(edges[0]) for edges in df_edges])
+    timestamps = np.asarray(event_graph.arrays["timestamps"])
+    # the duration to an event without timestamp is null for every predecessor, which leaves the lowest index, and
+    # a predecessor without timestamp (MISSING_TIME) is only the latest if no other predecessor has a timestamp
+    predecessor_times = np.where(timestamps[e2] == MISSING_TIME, MISSING_TIME, timestamps[e1])
+
+    nr_events = event_graph.nr_events
+    latest_time = np.full(nr_events, MISSING_TIME, dtype=np.int64)
+    np.maximum.at(latest_time, e2, predecessor_times)
+    latest = predecessor_times == latest_time[e2]
+    latest_e1 = np.full(nr_events, nr_events, dtype=np.int64)
+    np.minimum.at(latest_e1, e2[latest], e1[latest])
+    # every e2 has a single latest predecessor, hence the selected df-relationships are grouped by e2
+    selected = e1 == latest_e1[e2]
+    e1, e2, by = e1[selected], e2[selected], by[selected]
+    first_by = np.full(nr_events, len(entity_types), dtype=np.int64)
+    np.minimum.at(first_by, e2, by)
+    targets = np.unique(e2)
+    event_ids = np.asarray(event_graph.arrays["event_ids"])
+    return pd.DataFrame({"e1": event_ids[latest_e1[targets]], "e2": event_ids[targets],
+                         "by": np.asarray(entity_types, dtype=object)[first_by[targets]],
+                         "count": np.bincount(e2, minlength=nr_events)[targets]})
@@ -1,16 +1,34 @@
 from promg import DatabaseConnection
 from promg import Performance
+from modules.compact_event_graph.compact_event_graph import get_delay_edges
 from modules.custom_queries.delay_analysis import PerformanceAnalyzeDelaysQueryLibrary as ql
 
 
 class PerformanceAnalyzeDelays:
-    def __init__(self, db_connection):
+    def __init__(self, db_connection, event_graph=None):
         self.connection = db_connection
+        # exported CompactEventGraph, if set the delay edges are selected on its arrays
+        self.event_graph = event_graph
 
     @Performance.track()
-    def enrich_with_delay_edges(self):
-        result = self.connection.exec_query(ql.q_create_delay_edges)
-        print(f"Computed {result} delay edges.")
+    def enrich_with_delay_edges(self, batched: bool = True):
+        if self.event_graph is not None:
+            delays = get_delay_edges(self.event_graph)
+            # plain Python values, the driver cannot serialize NumPy scalars
+            records = [{"e1": e1, "e2": e2, "by": by} for e1, e2, by in
+                       zip(delays["e1"].tolist(), delays["e2"].tolist(), delays["by"].tolist())]
+            batch_size = self.connection.batch_size
+            for start in range(0, len(records), batch_size):
+                self.connection.exec_query(ql.q_merge_delay_edges, **{"batch": records[start:start + batch_size]})
+            print(f"Computed {int(delays['count'].sum())} delay edges.")
+        elif batched:
+            result = self.connection.exec_query(ql.q_create_delay_edges_batched)[0]
+            if result["failedBatches"] > 0:
+                raise Exception(f"Failed to compute delay edges: {result['errorMessages']}")
+            print(f"Computed the delay edges of {result['total']} events in {result['batches']} batches.")
+        else:
+            result = self.connection.exec_query(ql.q_create_delay_edges)
+            print(f"Computed {result} delay edges.")
 
     @Performance.track()
     def analyze_delays(self):
@@ -1,20 +1,101 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
 from promg import DatabaseConnection, SemanticHeader
 from promg import Performance
+from modules.compact_event_graph.compact_event_graph import get_parallel_df_ids
 from modules.custom_queries.df_interactions import InferDFInteractionsQueryLibrary as ql
+from queries.query_stream import run_write_query
 
 
 class InferDFInteractions:
-    def __init__(self, db_connection, semantic_header):
+    def __init__(self, db_connection, semantic_header, event_graph=None):
         self.connection = db_connection
         self.semantic_header = semantic_header
+        # exported CompactEventGraph, if set the parallel df-relationships are matched on its arrays
+        self.event_graph = event_graph
+        # database ids of the df-relationships deleted since the export of event_graph
+        self.deleted_df_ids = []
 
     @Performance.track()
     def delete_parallel_directly_follows_derived(self, entity_str: str, original_entity_str: str):
         entity = self.semantic_header.get_entity(entity_type=entity_str)
         original_entity = self.semantic_header.get_entity(entity_type=original_entity_str)
 
-        self.connection.exec_query(ql.delete_parallel_directly_follows_derived,
-                                   **{
-                                       "entity": entity,
-                                       "original_entity": original_entity
-                                   })
+        if self.event_graph is not None and self.event_graph.has_entity(entity.type) \
+                and self.event_graph.has_entity(original_entity.type):
+            df_ids = get_parallel_df_ids(self.event_graph, entity.type, original_entity.type,
+                                         deleted_df_ids=np.asarray(self.deleted_df_ids, dtype=np.int64)).tolist()
+            self.delete_directly_follows_by_id(df_ids)
+        else:
+            self.connection.exec_query(ql.delete_parallel_directly_follows_derived,
+                                       **{
+                                           "entity": entity,
+                                           "original_entity": original_entity
+                                       })
+
+    @Performance.track()
+    def delete_parallel_directly_follows_derived_pairs(self, entity_pairs: list, workers: int = 1) -> pd.DataFrame:
+        """
+        Delete the df-relationships of all (entity, original entity) pairs in a single pass over the events with a
+        derived df-relationship, in transactions of batch_size start events on up to workers concurrent sessions.
+        The pairs are applied in order per start event, which deletes the same df-relationships as
+        delete_parallel_directly_follows_derived per pair.
+        @return: DataFrame with the number of deleted df-relationships per pair
+        """
+        entities = [(self.semantic_header.get_entity(entity_type=entity_str),
+                     self.semantic_header.get_entity(entity_type=original_entity_str))
+                    for entity_str, original_entity_str in entity_pairs]
+        deleted = np.zeros(len(entities), dtype=np.int64)
+        start_time = time.perf_counter()
+
+        if self.event_graph is not None and all(self.event_graph.has_entity(entity.type) for pair in entities
+                                                for entity in pair):
+            df_ids = []
+            for position, (entity, original_entity) in enumerate(entities):
+                pair_df_ids = get_parallel_df_ids(self.event_graph, entity.type, original_entity.type,
+                                                  deleted_df_ids=np.asarray(self.deleted_df_ids + df_ids,
+                                                                            dtype=np.int64))
+                deleted[position] = len(pair_df_ids)
+                df_ids.extend(pair_df_ids.tolist())
+            self.delete_directly_follows_by_id(df_ids)
+        else:
+            pairs = [{"df_label": entity.get_df_label(), "df_original_label": original_entity.get_df_label()}
+                     for entity, original_entity in entities]
+            events = [record["event"] for record in self.connection.exec_query(
+                ql.get_derived_directly_follows_start_events,
+                **{"df_labels": sorted({pair["df_label"] for pair in pairs})}) or []]
+            batch_size = self.connection.batch_size
+            batches = [events[start:start + batch_size] for start in range(0, len(events), batch_size)]
+            # the batches partition the start events, hence concurrent transactions never delete the same
+            # relationship; the driver retries transactions that deadlock on a shared end event. Connections that
+            # cannot run queries concurrently (LocalGraphConnection) run the batches one by one.
+            max_workers = workers if getattr(self.connection, "supports_concurrency", True) else 1
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for records in executor.map(
+                        lambda batch: run_write_query(self.connection,
+                                                      ql.delete_parallel_directly_follows_derived_pairs,
+                                                      **{"pairs": pairs, "events": batch}), batches):
+                    for record in records:
+                        deleted[record["position"]] += record["deleted"]
+
+        duration = time.perf_counter() - start_time
+        for (entity_str, original_entity_str), pair_deleted in zip(entity_pairs, deleted):
+            print(f"Deleted {pair_deleted} df-relationships of {entity_str} parallel to {original_entity_str}.")
+        print(f"Deleted {deleted.sum()} parallel df-relationships of {len(entity_pairs)} pairs in {duration:.2f} "
+              f"seconds.")
+        return pd.DataFrame({"entity": [entity_str for entity_str, _ in entity_pairs],
+                             "original_entity": [original_entity_str for _, original_entity_str in entity_pairs],
+                             "deleted": deleted})
+
+    def delete_directly_follows_by_id(self, df_ids: list):
+        self.deleted_df_ids.extend(df_ids)
+        batch_size = self.connection.batch_size
+        for start in range(0, len(df_ids), batch_size):
+            self.connection.exec_query(ql.delete_directly_follows_by_id,
+                                       **{
+                                           "df_ids": df_ids[start:start + batch_size]
+                                       })
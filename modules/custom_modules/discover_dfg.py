@@ -1,17 +1,29 @@
+import numpy as np
+import pandas as pd
+
 from promg import Performance
+from modules.compact_event_graph.compact_event_graph import get_activity_df_frequencies, get_df_frequency_table, \
+    select_df_a_relations
 from modules.custom_queries.discovery_dfg import DiscoverDFGQueryLibrary as ql
+from queries import query_result_parser as qp
 
 
 class DiscoverDFG:
-    def __init__(self, db_connection, semantic_header):
+    def __init__(self, db_connection, semantic_header, event_graph=None):
         self.connection = db_connection
         self.semantic_header = semantic_header
+        # exported CompactEventGraph, if set the df-frequencies are counted on its arrays instead of in the database
+        self.event_graph = event_graph
 
     @Performance.track()
     def discover_dfg_for_entity(self, entity_str: str, df_threshold: int = 0, relative_df_threshold: float = 0.0):
         entity = self.semantic_header.get_entity(entity_type=entity_str)
 
-        if relative_df_threshold == 0.0:
+        if self.event_graph is not None and self.event_graph.has_entity(entity.type):
+            df_frequencies = select_df_a_relations(get_activity_df_frequencies(self.event_graph, entity.type),
+                                                   df_threshold, relative_df_threshold)
+            self.write_df_a_relations(df_frequencies.assign(dfc_label=entity.get_df_a_label()))
+        elif relative_df_threshold == 0.0:
             self.connection.exec_query(ql.aggregate_df_relations,
                                        **{
                                            "corr_label": entity.get_corr_type_strings(),
@@ -28,3 +40,60 @@ class DiscoverDFG:
                                            "df_threshold": df_threshold,
                                            "relative_df_threshold": relative_df_threshold
                                        })
+
+    @Performance.track()
+    def discover_dfg(self, entity_strs: list, df_threshold: int = 0, relative_df_threshold: float = 0.0):
+        """
+        Discover the DFG of all entities at once: the df-frequencies of all df labels are retrieved with a single
+        query and the thresholds are applied on activity x activity matrices, after which the DF_A relationships of
+        all entities are written in batches
+        """
+        entities = [self.semantic_header.get_entity(entity_type=entity_str) for entity_str in entity_strs]
+        queried_entities = [entity for entity in entities
+                            if self.event_graph is None or not self.event_graph.has_entity(entity.type)]
+        corr_types = {}
+        for entity in queried_entities:
+            corr_types.setdefault(entity.get_df_label(), get_corr_types(entity))
+        for entity in queried_entities:
+            if corr_types[entity.get_df_label()] != get_corr_types(entity):
+                # entities that share a df label with other correlation types are discovered on their own
+                self.discover_dfg_for_entity(entity.type, df_threshold, relative_df_threshold)
+        all_df_frequencies = qp.parse_to_dataframe(
+            self.connection.exec_query(ql.get_activity_df_frequencies, **{"corr_types": corr_types})
+            if corr_types else None, columns=["df_label", "c1", "c2", "df_freq", "df_count"])
+
+        # activities are numbered once for the matrices of all entities
+        activity_ids, activities = np.unique(all_df_frequencies[["c1", "c2"]].to_numpy(dtype=np.int64),
+                                             return_inverse=True)
+        activities = activities.reshape(-1, 2)
+        df_a_relations = []
+        for entity in entities:
+            if self.event_graph is not None and self.event_graph.has_entity(entity.type):
+                df_frequencies = get_activity_df_frequencies(self.event_graph, entity.type)
+            elif corr_types[entity.get_df_label()] == get_corr_types(entity):
+                of_entity = (all_df_frequencies["df_label"] == entity.get_df_label()).to_numpy()
+                df_frequencies = get_df_frequency_table(activities[of_entity, 0], activities[of_entity, 1],
+                                                        all_df_frequencies["df_freq"].to_numpy()[of_entity],
+                                                        all_df_frequencies["df_count"].to_numpy()[of_entity],
+                                                        len(activity_ids))
+                df_frequencies = df_frequencies.assign(c1=activity_ids[df_frequencies["c1"].to_numpy()],
+                                                       c2=activity_ids[df_frequencies["c2"].to_numpy()])
+            else:
+                continue
+            df_a_relations.append(select_df_a_relations(df_frequencies, df_threshold, relative_df_threshold)
+                                  .assign(dfc_label=entity.get_df_a_label()))
+        if df_a_relations:
+            self.write_df_a_relations(pd.concat(df_a_relations, ignore_index=True))
+
+    def write_df_a_relations(self, df_a_relations: pd.DataFrame):
+        # plain Python values, the driver cannot serialize NumPy scalars
+        records = [{"c1": c1, "c2": c2, "dfc_label": dfc_label, "df_freq": df_freq} for c1, c2, dfc_label, df_freq in
+                   zip(df_a_relations["c1"].tolist(), df_a_relations["c2"].tolist(),
+                       df_a_relations["dfc_label"].tolist(), df_a_relations["df_freq"].tolist())]
+        batch_size = self.connection.batch_size
+        for start in range(0, len(records), batch_size):
+            self.connection.exec_query(ql.merge_df_a_relations, **{"batch": records[start:start + batch_size]})
+
+
+def get_corr_types(entity):
+    return sorted(entity.get_corr_type_strings().split("|"))
@@ -21,6 +21,44 @@ class PerformanceAnalyzeDelaysQueryLibrary:
         return Query(query_str=query_str)
     
 
+    @staticmethod
+    def q_create_delay_edges_batched():
+        # per target event e2 the latest predecessor over its df-relationships is selected with a top-1 subquery,
+        # in transactions of $batch_size target events, instead of ordering and collecting all df-relationships. As in
+        # q_create_delay_edges the predecessors are ordered by the ascending duration to e2, which sorts missing
+        # timestamps last (ORDER BY e1.timestamp DESC would sort them first)
+        query_str = '''
+            CALL apoc.periodic.iterate(
+            'MATCH (e2:Event) WHERE EXISTS { (:Event)-[df {type:"DF"}]->(e2) WHERE df.entityType <> "CaseAWO" }
+             RETURN e2',
+            'CALL {
+                 WITH e2
+                 MATCH (e1:Event)-[df {type:"DF"}]->(e2) WHERE df.entityType <> "CaseAWO"
+                 RETURN e1 AS e1_last ORDER BY duration.between(e1.timestamp, e2.timestamp), id(e1) LIMIT 1
+             }
+             MATCH (e1_last)-[df {type:"DF"}]->(e2) WHERE df.entityType <> "CaseAWO"
+             MERGE (e1_last)-[delay:DELAY]->(e2) ON CREATE SET delay.by=df.entityType',
+            {batchSize: $batch_size})
+            YIELD batches, total, failedBatches, errorMessages
+            RETURN batches, total, failedBatches, errorMessages
+        '''
+
+        return Query(query_str=query_str)
+
+    @staticmethod
+    def q_merge_delay_edges(batch: list):
+        query_str = '''
+            UNWIND $batch AS row
+            MATCH (e1:Event) WHERE id(e1) = row.e1
+            MATCH (e2:Event) WHERE id(e2) = row.e2
+            MERGE (e1)-[delay:DELAY]->(e2) ON CREATE SET delay.by=row.by
+        '''
+
+        return Query(query_str=query_str,
+                     parameters={
+                         "batch": batch
+                     })
+
     @staticmethod
     def q_summarize_delay_entities():
         query_str = '''
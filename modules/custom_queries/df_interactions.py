@@ -28,3 +28,68 @@ class InferDFInteractionsQueryLibrary:
                          "df_original_entity": original_entity.get_df_label(),
                          "event_label": event_label
                      })
+
+    @staticmethod
+    def get_derived_directly_follows_start_events(df_labels: list, event_label: str = 'Event'):
+        query_str = '''
+                        MATCH (e1:$event_label) -[df]-> (:$event_label)
+                        WHERE type(df) IN $df_labels
+                        RETURN DISTINCT id(e1) AS event
+                    '''
+
+        return Query(query_str=query_str,
+                     template_string_parameters={
+                         "event_label": event_label
+                     },
+                     parameters={
+                         "df_labels": df_labels
+                     })
+
+    @staticmethod
+    def delete_parallel_directly_follows_derived_pairs(pairs: list, events: list, event_label: str = 'Event'):
+        # a df-relationship only depends on the outgoing df-relationships of its start event, hence applying the
+        # pairs (df_label, df_original_label) in order per start event deletes the same df-relationships as running
+        # delete_parallel_directly_follows_derived once per pair. The outgoing relationships are matched once per start
+        # event; deleted_per_pair holds the relationships deleted for every pair, which are skipped by the later pairs
+        query_str = '''
+                        UNWIND $events AS event
+                        MATCH (e1:$event_label) WHERE id(e1) = event
+                        MATCH (e1) -[df]-> (e2:$event_label)
+                        WITH e1, collect({type: type(df), end: e2, relationship: df}) AS outgoing
+                        WITH reduce(deleted_per_pair = [], pair IN $pairs |
+                            deleted_per_pair + [[df IN outgoing
+                                WHERE df.type = pair.df_label
+                                    AND none(deleted IN deleted_per_pair WHERE df.relationship IN deleted)
+                                    AND any(original IN outgoing
+                                            WHERE original.type = pair.df_original_label
+                                                AND original.end = df.end
+                                                AND none(deleted IN deleted_per_pair
+                                                         WHERE original.relationship IN deleted))
+                                | df.relationship]]) AS deleted_per_pair
+                        FOREACH (deleted IN deleted_per_pair | FOREACH (df IN deleted | DELETE df))
+                        WITH deleted_per_pair
+                        UNWIND range(0, size(deleted_per_pair) - 1) AS position
+                        RETURN position, sum(size(deleted_per_pair[position])) AS deleted
+                    '''
+
+        return Query(query_str=query_str,
+                     template_string_parameters={
+                         "event_label": event_label
+                     },
+                     parameters={
+                         "pairs": pairs,
+                         "events": events
+                     })
+
+    @staticmethod
+    def delete_directly_follows_by_id(df_ids: list):
+        query_str = '''
+                        UNWIND $df_ids AS df_id
+                        MATCH () -[df]-> () WHERE id(df) = df_id
+                        DELETE df
+                    '''
+
+        return Query(query_str=query_str,
+                     parameters={
+                         "df_ids": df_ids
+                     })
@@ -61,3 +61,47 @@ class DiscoverDFGQueryLibrary:
                          "dfc_label": dfc_label,
                          "df_threshold": df_threshold
                      })
+
+    @staticmethod
+    def get_activity_df_frequencies(corr_types: dict, event_label: str = 'Event'):
+        # corr_types maps every df label to the correlation types of its entity, df_freq counts every
+        # df-relationship once per node shared by its events like aggregate_df_relations, df_count counts it once
+        query_str = '''
+                        MATCH
+                        (c1:Activity)
+                            -[:OBSERVED]->
+                        (e1:$event_label) -[df]-> (e2:$event_label)
+                            <-[:OBSERVED]-
+                        (c2:Activity)
+                        WHERE type(df) IN keys($corr_types)
+                        WITH type(df) AS df_label, c1, c2,
+                            size([(e1) -[corr1]-> (n) <-[corr2]- (e2)
+                                WHERE type(corr1) IN $corr_types[type(df)] AND type(corr2) IN $corr_types[type(df)]
+                                | n]) AS shared
+                        RETURN df_label, id(c1) AS c1, id(c2) AS c2, sum(shared) AS df_freq, count(*) AS df_count
+                    '''
+
+        return Query(query_str=query_str,
+                     template_string_parameters={
+                         "event_label": event_label
+                     },
+                     parameters={
+                         "corr_types": corr_types
+                     })
+
+    @staticmethod
+    def merge_df_a_relations(batch: list):
+        # the DF_A label differs per entity, hence the relationships are merged with APOC
+        query_str = '''
+                        UNWIND $batch AS row
+                        MATCH (c1:Activity) WHERE id(c1) = row.c1
+                        MATCH (c2:Activity) WHERE id(c2) = row.c2
+                        CALL apoc.merge.relationship(c1, row.dfc_label, {type: 'DF_A'}, {count: row.df_freq}, c2, {})
+                        YIELD rel
+                        RETURN count(rel) AS df_a_relations
+                    '''
+
+        return Query(query_str=query_str,
+                     parameters={
+                         "batch": batch
+                     })
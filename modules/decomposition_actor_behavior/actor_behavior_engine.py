@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+
+from modules.decomposition_actor_behavior.handover_intervals import HandoverIntervalJoin
+from queries.decomposition_actor_behavior import DecompositionActorBehaviorQueryLibrary as ql
+from queries import query_result_parser as qp
+
+# backends of the handover conditions: "merge" joins the task instances with pandas merges, "interval_join" uses the
+# sort-merge interval join of HandoverIntervalJoin with explicit precedence
+HANDOVER_BACKENDS = ["merge", "interval_join"]
+
+# actor behaviors in the order in which the sequential Cypher queries write them; a later behavior overwrites an
+# earlier one, hence the last behavior in this list has the highest precedence
+ACTOR_BEHAVIORS = ["continuation", "interruption", "handover_idle", "handover_prioritized",
+                   "handover_deprioritized"]
+
+
+class ColumnarActorBehaviorEngine:
+    """
+    In-memory alternative for the five actor behavior queries. The case df-edges, resource df-edges, the
+    event-resource correlation and the task instance intervals are loaded once as columns, after which every case
+    df-edge is classified in a single vectorized pass that reproduces the labels of the sequential Cypher path.
+    """
+
+    def __init__(self, case_df: pd.DataFrame, resource_df: pd.DataFrame, event_resources: pd.DataFrame,
+                 task_instance_events: pd.DataFrame, task_instance_intervals: pd.DataFrame,
+                 df_ti: pd.DataFrame, handover_backend: str = "merge"):
+        if handover_backend not in HANDOVER_BACKENDS:
+            raise ValueError(f"Unknown handover backend '{handover_backend}'")
+        self.handover_backend = handover_backend
+        self.case_df = case_df.reset_index(drop=True)
+        self.resource_df = resource_df
+        self.event_resources = event_resources
+        self.task_instance_events = task_instance_events
+        self.task_instance_intervals = task_instance_intervals.set_index("task_instance")
+        self.df_ti = df_ti
+
+    @staticmethod
+    def from_connection(connection, case, resource, handover_backend: str = "merge"):
+        case_df = qp.parse_to_dataframe(connection.exec_query(ql.q_get_case_df_edges, **{"case": case}),
+                                        columns=["df_id", "e1", "e2", "actor_behavior"])
+        resource_df = qp.parse_to_dataframe(
+            connection.exec_query(ql.q_get_resource_df_edges, **{"resource": resource}), columns=["e1", "e2"])
+        event_resources = qp.parse_to_dataframe(
+            connection.exec_query(ql.q_get_event_resources, **{"resource": resource}),
+            columns=["event", "resource"])
+        task_instance_events = qp.parse_to_dataframe(connection.exec_query(ql.q_get_task_instance_events),
+                                                     columns=["task_instance", "event"])
+        task_instance_intervals = qp.parse_to_dataframe(connection.exec_query(ql.q_get_task_instance_intervals),
+                                                        columns=["task_instance", "start_time", "end_time"])
+        task_instance_intervals = task_instance_intervals.astype(
+            {"start_time": "Int64", "end_time": "Int64"})
+        df_ti = qp.parse_to_dataframe(connection.exec_query(ql.q_get_df_ti_edges, **{"resource": resource}),
+                                      columns=["task_instance1", "task_instance2"])
+        return ColumnarActorBehaviorEngine(case_df=case_df, resource_df=resource_df,
+                                           event_resources=event_resources,
+                                           task_instance_events=task_instance_events,
+                                           task_instance_intervals=task_instance_intervals, df_ti=df_ti,
+                                           handover_backend=handover_backend)
+
+    @staticmethod
+    def from_event_graph(event_graph, case, resource, handover_backend: str = "merge"):
+        """
+        Load the engine from an exported CompactEventGraph instead of the connection; the events and task instances
+        are identified by their position in the arrays, the case df-edges keep their database id
+        """
+        e1, e2, df_ids = event_graph.get_df_edges(case.type)
+        resource_e1, resource_e2, _ = event_graph.get_df_edges(resource.type)
+        return ColumnarActorBehaviorEngine(
+            case_df=pd.DataFrame({"df_id": df_ids, "e1": e1, "e2": e2, "actor_behavior": None}),
+            resource_df=pd.DataFrame({"e1": resource_e1, "e2": resource_e2}),
+            event_resources=event_graph.get_event_resources(),
+            task_instance_events=event_graph.get_task_instance_events(),
+            task_instance_intervals=event_graph.get_task_instance_intervals(),
+            df_ti=event_graph.get_df_ti_edges(),
+            handover_backend=handover_backend)
+
+    def get_conditions(self) -> dict:
+        """
+        @return: dictionary from actor behavior to the boolean array of the case df-edges that the sequential
+        query of that behavior matches, in the order of ACTOR_BEHAVIORS
+        """
+        e1 = self.case_df["e1"].to_numpy()
+        e2 = self.case_df["e2"].to_numpy()
+
+        continuation = _pairs_isin(e1, e2, self.resource_df["e1"].to_numpy(), self.resource_df["e2"].to_numpy())
+        shared_resource = self._shares_resource(e1, e2)
+        has_resource_predecessor = np.isin(e2, self.resource_df["e2"].to_numpy())
+        idle, prioritized, deprioritized = self._handover_conditions(e1, e2)
+
+        return {
+            "continuation": continuation,
+            "interruption": shared_resource & ~continuation,
+            "handover_idle": (~shared_resource & idle) | ~has_resource_predecessor,
+            "handover_prioritized": ~shared_resource & prioritized,
+            "handover_deprioritized": ~shared_resource & deprioritized
+        }
+
+    def classify(self) -> pd.DataFrame:
+        """
+        Classify every case df-edge
+        @return: DataFrame with columns df_id, e1, e2 and actor_behavior (None if no behavior applies)
+        """
+        edges = self.case_df
+        conditions = self.get_conditions()
+        actor_behavior = np.full(len(edges), None, dtype=object)
+        for behavior in ACTOR_BEHAVIORS:
+            actor_behavior[conditions[behavior]] = behavior
+
+        return pd.DataFrame({
+            "df_id": edges["df_id"].to_numpy(),
+            "e1": edges["e1"].to_numpy(),
+            "e2": edges["e2"].to_numpy(),
+            "actor_behavior": actor_behavior
+        })
+
+    def _shares_resource(self, e1, e2):
+        shared_resource = np.zeros(len(e1), dtype=bool)
+        edge_index = pd.DataFrame({"edge": np.arange(len(e1)), "event": e1, "e2": e2})
+        source_resources = edge_index.merge(self.event_resources, on="event")
+        shared = _pairs_isin(source_resources["e2"].to_numpy(), source_resources["resource"].to_numpy(),
+                             self.event_resources["event"].to_numpy(),
+                             self.event_resources["resource"].to_numpy())
+        shared_resource[source_resources["edge"].to_numpy()[shared]] = True
+        return shared_resource
+
+    def _handover_conditions(self, e1, e2):
+        if self.handover_backend == "interval_join":
+            return HandoverIntervalJoin(self.task_instance_events, self.task_instance_intervals.reset_index(),
+                                        self.df_ti).get_conditions(e1, e2)
+
+        nr_edges = len(e1)
+        idle = np.zeros(nr_edges, dtype=bool)
+        prioritized = np.zeros(nr_edges, dtype=bool)
+        deprioritized = np.zeros(nr_edges, dtype=bool)
+
+        # (tic)-[:CONTAINS]->(e1)
+        source_task_instances = pd.DataFrame({"edge": np.arange(nr_edges), "event": e1}) \
+            .merge(self.task_instance_events, on="event")[["edge", "task_instance"]] \
+            .rename(columns={"task_instance": "tic"})
+        # (e2)<-[:CONTAINS]-(ti)<-[:DF_TI]-(tir)
+        target_task_instances = pd.DataFrame({"edge": np.arange(nr_edges), "event": e2}) \
+            .merge(self.task_instance_events, on="event") \
+            .merge(self.df_ti, left_on="task_instance", right_on="task_instance2")[["edge", "task_instance1"]] \
+            .rename(columns={"task_instance1": "tir"})
+        candidates = source_task_instances.merge(target_task_instances, on="edge")
+        if candidates.empty:
+            return idle, prioritized, deprioritized
+
+        tic_end = self.task_instance_intervals["end_time"].reindex(candidates["tic"]).reset_index(drop=True)
+        tir_start = self.task_instance_intervals["start_time"].reindex(candidates["tir"]).reset_index(drop=True)
+        tir_end = self.task_instance_intervals["end_time"].reindex(candidates["tir"]).reset_index(drop=True)
+        edge = candidates["edge"].to_numpy()
+
+        idle[edge[_to_bool(tir_end < tic_end)]] = True
+        prioritized[edge[_to_bool((tir_start < tic_end) & (tic_end < tir_end))]] = True
+        deprioritized[edge[_to_bool(tic_end < tir_start)]] = True
+        return idle, prioritized, deprioritized
+
+    def compare_with_graph(self, classification: pd.DataFrame = None) -> pd.DataFrame:
+        """
+        Compare the columnar classification with the actor behavior currently stored on the case df-edges
+        @return: DataFrame with the case df-edges of which the labels differ
+        """
+        if classification is None:
+            classification = self.classify()
+        stored = self.case_df["actor_behavior"].fillna("").to_numpy()
+        computed = classification["actor_behavior"].fillna("").to_numpy()
+        mismatches = classification[stored != computed].copy()
+        mismatches["stored_actor_behavior"] = self.case_df["actor_behavior"][stored != computed]
+        return mismatches
+
+    @staticmethod
+    def write_to_graph(connection, classification: pd.DataFrame, batch_size: int = 10000):
+        classified = classification[classification["actor_behavior"].notna()]
+        # plain Python values, the driver cannot serialize NumPy scalars
+        records = [{"df_id": df_id, "actor_behavior": actor_behavior} for df_id, actor_behavior in
+                   zip(classified["df_id"].tolist(), classified["actor_behavior"].tolist())]
+        for start in range(0, len(records), batch_size):
+            connection.exec_query(ql.q_set_actor_behavior_per_df, **{"batch": records[start:start + batch_size]})
+
+
+def _pairs_isin(left1, left2, right1, right2):
+    if len(left1) == 0:
+        return np.zeros(0, dtype=bool)
+    return pd.MultiIndex.from_arrays([left1, left2]).isin(pd.MultiIndex.from_arrays([right1, right2]))
+
+
+def _to_bool(series):
+    return series.fillna(False).to_numpy(dtype=bool)
@@ -1,13 +1,26 @@
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import quote
+
+import numpy as np
 import pandas as pd
-from os import path
-import re
 
 from promg import DatabaseConnection
 from promg.data_managers.semantic_header import ConstructedNodes, SemanticHeader
 
+from modules.decomposition_actor_behavior.actor_behavior_engine import ColumnarActorBehaviorEngine
+from modules.decomposition_actor_behavior.handover_intervals import HANDOVER_PRECEDENCE
+from modules.decomposition_actor_behavior.index_provisioning import IndexProvisioning
+from modules.decomposition_actor_behavior.intermediate_cache import CacheManifest, FingerprintedIntermediateStore, \
+    get_edge_fingerprints
+from modules.decomposition_actor_behavior.intermediate_store import create_intermediate_store, get_edge_names
+from modules.decomposition_actor_behavior.running_aggregates import ActorBehaviorAggregates
+from modules.decomposition_actor_behavior.statistics_backend import DEFAULT_QUANTILE_AGG_FUNCS, aggregate_durations
 from queries.decomposition_actor_behavior import DecompositionActorBehaviorQueryLibrary as ql
 from queries import query_result_parser as qp
+from PerformanceRecorder import record_span
+from queries.query_stream import stream_query, stream_query_chunks
 
 
 class DecompositionActorBehavior:
@@ -15,6 +28,7 @@ class DecompositionActorBehavior:
     def __init__(self, db_connection, semantic_header, dataset_name, resource: str, case: str):
         self.connection = db_connection
         self.dataset_name = dataset_name
+        self.semantic_header_version = f"{semantic_header.name}-{semantic_header.version}"
         self.resource: ConstructedNodes = semantic_header.get_entity(resource)
         self.case: ConstructedNodes = semantic_header.get_entity(case)
 
@@ -23,20 +37,114 @@ class DecompositionActorBehavior:
         self.output_directory = f"output_final\\{dataset_name}\\decomposed_actor_behavior\\"
         os.makedirs(self.output_directory, exist_ok=True)
 
-    def add_actor_behavior(self):
-        kwargs = {"case": self.case, "resource": self.resource}
-        self.connection.exec_query(ql.q_add_actor_behavior_continuation, **kwargs)
-        self.connection.exec_query(ql.q_add_actor_behavior_interruption, **kwargs)
-        self.connection.exec_query(ql.q_add_actor_behavior_handover_idle, **kwargs)
-        self.connection.exec_query(ql.q_add_actor_behavior_handover_prioritized, **kwargs)
-        self.connection.exec_query(ql.q_add_actor_behavior_handover_deprioritized, **kwargs)
+    def provision_indexes(self, verify: bool = True):
+        index_provisioning = IndexProvisioning(self.connection, dataset_name=self.dataset_name,
+                                               resource=self.resource, case=self.case)
+        index_provisioning.create_indexes()
+        if verify:
+            index_provisioning.verify_query_plans()
+
+    def add_actor_behavior(self, mode: str = "sequential", event_graph=None, handover_backend: str = "cypher"):
+        """
+        @param handover_backend: "cypher" runs the handover queries, "interval_join" classifies the handovers with
+        the sort-merge interval join of the columnar engine instead
+        """
+        if mode == "sequential":
+            kwargs = {"case": self.case, "resource": self.resource}
+            self.connection.exec_query(ql.q_add_actor_behavior_continuation, **kwargs)
+            self.connection.exec_query(ql.q_add_actor_behavior_interruption, **kwargs)
+            if handover_backend == "cypher":
+                self.connection.exec_query(ql.q_add_actor_behavior_handover_idle, **kwargs)
+                self.connection.exec_query(ql.q_add_actor_behavior_handover_prioritized, **kwargs)
+                self.connection.exec_query(ql.q_add_actor_behavior_handover_deprioritized, **kwargs)
+            elif handover_backend == "interval_join":
+                engine = self.get_actor_behavior_engine(event_graph, handover_backend="interval_join")
+                classification = engine.classify()
+                # only the handovers, the continuation and interruption labels are already written by the queries
+                handovers = classification[classification["actor_behavior"].isin(HANDOVER_PRECEDENCE)]
+                engine.write_to_graph(self.connection, handovers, batch_size=self.connection.batch_size)
+            else:
+                raise ValueError(f"Unknown handover backend '{handover_backend}'")
+        elif mode == "fused":
+            self.connection.exec_query(ql.q_add_actor_behavior_fused,
+                                       **{"case": self.case, "resource": self.resource})
+        elif mode == "incremental":
+            # classify the df-edges touched by new events only, then mark the current task instances as classified
+            self.connection.exec_query(ql.q_add_actor_behavior_incremental,
+                                       **{"case": self.case, "resource": self.resource})
+            self.connection.exec_query(ql.q_mark_task_instances_classified)
+        elif mode == "columnar":
+            engine = self.get_actor_behavior_engine(
+                event_graph, handover_backend="interval_join" if handover_backend == "interval_join" else "merge")
+            engine.write_to_graph(self.connection, engine.classify(), batch_size=self.connection.batch_size)
+        else:
+            raise ValueError(f"Unknown actor behavior mode '{mode}'")
+
+    def get_actor_behavior_engine(self, event_graph=None, handover_backend: str = "merge"):
+        if event_graph is not None:
+            return ColumnarActorBehaviorEngine.from_event_graph(event_graph, case=self.case, resource=self.resource,
+                                                                handover_backend=handover_backend)
+        return ColumnarActorBehaviorEngine.from_connection(self.connection, case=self.case, resource=self.resource,
+                                                           handover_backend=handover_backend)
+
+    def get_pending_case_edges(self):
+        if self.dataset_name == "BPIC17":
+            return qp.parse_to_2d2tuple_list(
+                self.connection.exec_query(ql.q_get_pending_df_edges_activity_lifecycle, **{"case": self.case}),
+                "activity1", "lifecycle1", "activity2", "lifecycle2")
+        return qp.parse_to_2d_list(
+            self.connection.exec_query(ql.q_get_pending_df_edges_activity, **{"case": self.case}),
+            "activity1", "activity2")
+
+    def get_output_path(self, groupby_str):
+        return f"{self.output_directory}\\performance_decomposed_by_{groupby_str}.csv"
+
+    def write_decomposed_performance(self, df_actor_behavior_agg, groupby_str, edge_names,
+                                     merge_with_existing=False):
+        """
+        Write the decomposed performance of the case edges to the output CSV. When merging with the existing CSV,
+        the rows of the given case edges are replaced and the pending marks of their df-edges are cleared.
+        """
+        output_path = self.get_output_path(groupby_str)
+        if merge_with_existing and os.path.exists(output_path):
+            df_existing_agg = pd.read_csv(output_path, header=[0, 1], index_col=[0, 1, 2],
+                                          float_precision="round_trip")
+            df_actor_behavior_agg = merge_decomposed_performance(df_existing_agg, df_actor_behavior_agg, edge_names)
+        df_actor_behavior_agg.to_csv(output_path)
+        if merge_with_existing:
+            self.connection.exec_query(ql.q_clear_pending_df_edges, **{"case": self.case})
+
+    def verify_actor_behavior_parity(self):
+        """
+        Compare the actor behavior stored on the case df-edges (e.g. by the sequential Cypher path) with the
+        labels computed by the columnar engine
+        @return: DataFrame with the case df-edges of which the labels differ
+        """
+        engine = ColumnarActorBehaviorEngine.from_connection(self.connection, case=self.case, resource=self.resource)
+        mismatches = engine.compare_with_graph()
+        print(f"Actor behavior parity: {len(engine.case_df) - len(mismatches)} of {len(engine.case_df)} "
+              f"case df-edges match the columnar classification.")
+        return mismatches
 
     def extract_decomposed_performance_by_actor_behavior_per_edge(self, case_edges, edge_min_freq: int = 1000,
                                                                   time_unit: str = 'hours',
                                                                   agg_func=None,
-                                                                  exclude_zero_duration: bool = True):
-        if agg_func is None:
+                                                                  exclude_zero_duration: bool = True,
+                                                                  extraction_mode: str = "per_edge",
+                                                                  columnar_ingestion: bool = False,
+                                                                  intermediate_format: str = "pickle",
+                                                                  extraction_workers: int = 4,
+                                                                  aggregation_mode: str = "per_edge",
+                                                                  aggregation_workers: int = 1,
+                                                                  streaming_chunk_size: int = 10000,
+                                                                  spill_instances: bool = False,
+                                                                  statistics_backend: str = "pandas",
+                                                                  incremental: bool = False):
+        if agg_func is None and statistics_backend == "pandas":
             agg_func = ["mean", "median", "min", "max", "std", "count"]
+        elif agg_func is None:
+            agg_func = DEFAULT_QUANTILE_AGG_FUNCS
+        ql.prepared_queries.reset_statistics()
         if case_edges == 'all' and self.dataset_name == "BPIC17":
             self.case_edges = qp.parse_to_2d2tuple_list(
                 self.connection.exec_query(ql.q_get_all_df_edges_activity_lifecycle,
@@ -52,46 +160,87 @@ class DecompositionActorBehavior:
             )
         else:
             self.case_edges = case_edges
+
+        groupby = ["actor_behavior"]
+        groupby_str = ", ".join(groupby)
+
+        if incremental and not os.path.exists(self.get_output_path(groupby_str)):
+            print("No decomposed performance to update yet, all case df-edges are computed.")
+        elif incremental:
+            # only update the case edges of which df-edges were (re)classified since the last update
+            pending_edge_names = {get_edge_names(case_edge) for case_edge in self.get_pending_case_edges()}
+            self.case_edges = [case_edge for case_edge in self.case_edges
+                               if get_edge_names(case_edge) in pending_edge_names]
+            print(f"{len(self.case_edges)} case df-edges have pending actor behavior changes.")
+            if not self.case_edges:
+                return
+
+        edge_names = [get_edge_names(case_edge) for case_edge in self.case_edges]
+
+        if extraction_mode == "streaming":
+            # aggregate while the instances are streamed, without storing the intermediate instances; quantiles are
+            # always approximated by a sketch in this mode
+            actor_behavior_agg_all = []
+            for case_edge, (source_activity, target_activity) in zip(self.case_edges, edge_names):
+                spill_path = f"{self.intermediate_output_directory}instances_" \
+                             f"{quote(source_activity, safe='')}_{quote(target_activity, safe='')}.csv" \
+                    if spill_instances else None
+                get_streamed_actor_behavior_agg = get_streamed_actor_behavior_agg_bpic15 \
+                    if self.dataset_name == "BPIC15" else get_streamed_actor_behavior_agg_bpic17
+                df_actor_behavior_agg = get_streamed_actor_behavior_agg(
+                    self.connection, self.case, self.resource, time_unit, case_edge, agg_func,
+                    exclude_zero_duration=exclude_zero_duration, chunk_size=streaming_chunk_size,
+                    spill_path=spill_path)
+                df_actor_behavior_agg = pd.concat([df_actor_behavior_agg], keys=[target_activity], names=["sink"])
+                df_actor_behavior_agg = pd.concat([df_actor_behavior_agg], keys=[source_activity], names=["source"])
+                actor_behavior_agg_all.append(df_actor_behavior_agg)
+            self.write_decomposed_performance(pd.concat(actor_behavior_agg_all, axis=0, ignore_index=False),
+                                              groupby_str, edge_names, merge_with_existing=incremental)
+            ql.prepared_queries.print_statistics()
+            return
+
+        # cached edges are only reused if they were computed with the same inputs and the same graph state
+        input_fingerprint = {"dataset_name": self.dataset_name, "semantic_header": self.semantic_header_version,
+                             "time_unit": time_unit, "edge_min_freq": edge_min_freq,
+                             "intermediate_format": intermediate_format}
+        intermediate_store = FingerprintedIntermediateStore(
+            create_intermediate_store(intermediate_format, self.intermediate_output_directory),
+            CacheManifest(f"{self.intermediate_output_directory}manifest_{intermediate_format}.json"),
+            get_edge_fingerprints(self.connection, self.case, self.case_edges, self.dataset_name, input_fingerprint))
+        nr_stale_edges = sum(not intermediate_store.exists(case_edge) for case_edge in self.case_edges)
+        print(f"{nr_stale_edges} of {len(self.case_edges)} case df-edges are (re)computed.")
         
         if self.dataset_name == "BPIC15":
             list_df_instances_by_actor_behavior = get_df_instances_by_actor_behavior_bpic15(
-                intermediate_output_directory=self.intermediate_output_directory, connection=self.connection,
-                case=self.case, resource=self.resource, time_unit=time_unit, case_edges=self.case_edges)
+                intermediate_store=intermediate_store, connection=self.connection,
+                case=self.case, resource=self.resource, time_unit=time_unit, case_edges=self.case_edges,
+                extraction_mode=extraction_mode, columnar_ingestion=columnar_ingestion,
+                extraction_workers=extraction_workers)
         else:
             list_df_instances_by_actor_behavior = get_df_instances_by_actor_behavior_bpic17(
-                intermediate_output_directory=self.intermediate_output_directory, connection=self.connection,
-                case=self.case, resource=self.resource, time_unit=time_unit, case_edges=self.case_edges)
+                intermediate_store=intermediate_store, connection=self.connection,
+                case=self.case, resource=self.resource, time_unit=time_unit, case_edges=self.case_edges,
+                extraction_mode=extraction_mode, columnar_ingestion=columnar_ingestion,
+                extraction_workers=extraction_workers)
+        intermediate_store.flush()
             
-        groupby = ["actor_behavior"]
-        groupby_str = ", ".join(groupby)
-        actor_behavior_agg_all = []
 
-        if self.dataset_name == "BPIC17":
+        if aggregation_mode == "grouped":
+            df_concat_actor_behavior_agg = aggregate_actor_behavior_all_edges(
+                list_df_instances_by_actor_behavior, edge_names, agg_func, time_unit,
+                exclude_zero_duration=exclude_zero_duration, aggregation_workers=aggregation_workers,
+                statistics_backend=statistics_backend)
+        elif aggregation_mode == "per_edge":
+            actor_behavior_agg_all = []
             for i, df_instances_per_edge in enumerate(list_df_instances_by_actor_behavior):
                 df_actor_behavior_agg = aggregate_actor_behavior(df_instances_per_edge,
                                                                  groupby,
                                                                  agg_func,
                                                                  time_unit,
-                                                                 exclude_zero_duration=exclude_zero_duration)
-                df_actor_behavior_agg = pd.concat([df_actor_behavior_agg],
-                                                keys=[f"{self.case_edges[i][1][0]}-{self.case_edges[i][1][1]}"],
-                                                names=["sink"])
-                df_actor_behavior_agg = pd.concat([df_actor_behavior_agg],
-                                                keys=[f"{self.case_edges[i][0][0]}-{self.case_edges[i][0][1]}"],
-                                                names=["source"])
-                actor_behavior_agg_all.append(df_actor_behavior_agg)
-            df_concat_actor_behavior_agg = pd.concat(actor_behavior_agg_all, axis=0, ignore_index=False)
-            df_concat_actor_behavior_agg.to_csv(
-                f"{self.output_directory}\\performance_decomposed_by_{groupby_str}.csv")
-        else:
-            for i, df_instances_per_edge in enumerate(list_df_instances_by_actor_behavior):
-                df_actor_behavior_agg = aggregate_actor_behavior(df_instances_per_edge,
-                                                                 groupby,
-                                                                 agg_func,
-                                                                 time_unit,
-                                                                 exclude_zero_duration=exclude_zero_duration)
+                                                                 exclude_zero_duration=exclude_zero_duration,
+                                                                 statistics_backend=statistics_backend)
 
-                source_activity, target_activity = self.case_edges[i]
+                source_activity, target_activity = edge_names[i]
                 df_actor_behavior_agg = pd.concat([df_actor_behavior_agg],
                                                 keys=[target_activity],
                                                 names=["sink"])
@@ -102,19 +251,55 @@ class DecompositionActorBehavior:
                 actor_behavior_agg_all.append(df_actor_behavior_agg)
 
             df_concat_actor_behavior_agg = pd.concat(actor_behavior_agg_all, axis=0, ignore_index=False)
-            df_concat_actor_behavior_agg.to_csv(
-                f"{self.output_directory}\\performance_decomposed_by_{groupby_str}.csv"
-            )
+        else:
+            raise ValueError(f"Unknown aggregation mode '{aggregation_mode}'")
 
+        self.write_decomposed_performance(df_concat_actor_behavior_agg, groupby_str, edge_names,
+                                          merge_with_existing=incremental)
+
+        ql.prepared_queries.print_statistics()
 
-def aggregate_actor_behavior(df_to_aggregate, groupby, agg_func, time_unit, exclude_zero_duration=True):
-    duration_col = f"duration_{time_unit}"
-    df_filtered = df_to_aggregate.copy()
 
+def merge_decomposed_performance(df_existing_agg, df_delta_agg, edge_names):
+    """
+    Replace the rows of the given case edges in an existing decomposed performance table by their recomputed rows.
+    Case edges keep their position, case edges that were not in the table yet are appended.
+    @param edge_names: (source, sink) of the recomputed case edges, also those without any recomputed row
+    """
+    edge_names = set(tuple(edge_name) for edge_name in edge_names)
+    existing_positions = get_edge_positions(df_existing_agg)
+    delta_positions = get_edge_positions(df_delta_agg)
+
+    blocks = []
+    for edge_name in dict.fromkeys([*existing_positions, *delta_positions, *edge_names]):
+        if edge_name in edge_names:
+            blocks.append(df_delta_agg.iloc[delta_positions.get(edge_name, [])])
+        else:
+            blocks.append(df_existing_agg.iloc[existing_positions[edge_name]])
+    return pd.concat(blocks, axis=0)
+
+
+def get_edge_positions(df_agg):
+    """
+    @return: dictionary from (source, sink) to the row positions of that case edge, in order of appearance
+    """
+    edge_positions = {}
+    for position, edge_name in enumerate(zip(df_agg.index.get_level_values(0), df_agg.index.get_level_values(1))):
+        edge_positions.setdefault(edge_name, []).append(position)
+    return edge_positions
+
+
+def get_agg_funcs(agg_func):
     if isinstance(agg_func, str) or not hasattr(agg_func, "__iter__"):
-        agg_funcs = [agg_func] if agg_func is not None else []
-    else:
-        agg_funcs = list(agg_func)
+        return [agg_func] if agg_func is not None else []
+    return list(agg_func)
+
+
+def aggregate_actor_behavior(df_to_aggregate, groupby, agg_func, time_unit, exclude_zero_duration=True,
+                             statistics_backend="pandas"):
+    duration_col = f"duration_{time_unit}"
+    df_filtered = df_to_aggregate.copy()
+    agg_funcs = get_agg_funcs(agg_func)
 
     if exclude_zero_duration and duration_col in df_filtered.columns:
         df_filtered = df_filtered[df_filtered[duration_col].fillna(0) > 0]
@@ -125,14 +310,21 @@ def aggregate_actor_behavior(df_to_aggregate, groupby, agg_func, time_unit, excl
         columns = pd.MultiIndex.from_tuples(column_tuples)
         return pd.DataFrame(columns=columns)
 
-    total_count = len(df_filtered) / 2
-    total_count = total_count if total_count else 1
+    total_count = len(df_filtered)
+    # group on object keys, such that the actor behaviors and the "all" rollup sort alphabetically
+    keys = [df_filtered[column].astype(object) for column in groupby]
+    # the "all" rollup covers every instance of the edge, including those without actor behavior
+    rollup_keys = [pd.Series("all", index=df_filtered.index, name=column) for column in groupby]
 
-    counts = df_filtered.groupby(groupby)["actor_behavior"].count()
-    percentage = counts / total_count if total_count else counts * 0
+    counts = pd.concat([df_filtered.groupby(keys)["actor_behavior"].count(),
+                        df_filtered.groupby(rollup_keys).size()]).sort_index()
+    percentage = counts / total_count
 
     duration_agg = (
-        df_filtered.groupby(groupby)[duration_col].agg(agg_funcs) if agg_funcs else pd.DataFrame()
+        pd.concat([aggregate_durations(df_filtered, keys, duration_col, agg_funcs, statistics_backend),
+                   aggregate_durations(df_filtered, rollup_keys, duration_col, agg_funcs, statistics_backend)]
+                  ).sort_index()
+        if agg_funcs else pd.DataFrame()
     )
     if isinstance(duration_agg, pd.Series):
         duration_agg = duration_agg.to_frame()
@@ -156,6 +348,81 @@ def aggregate_actor_behavior(df_to_aggregate, groupby, agg_func, time_unit, excl
     return result
 
 
+def aggregate_actor_behavior_grouped(list_df_instances, edge_names, agg_func, time_unit,
+                                     exclude_zero_duration=True, statistics_backend="pandas"):
+    """
+    Aggregate the instances of several case edges in a single grouped aggregation over [edge, actor_behavior]. The
+    result equals concatenating aggregate_actor_behavior of every edge with the source and sink index levels.
+    @param list_df_instances: instances per case edge, in the order of edge_names
+    @param edge_names: (source, sink) name per case edge
+    @return: DataFrame indexed by source, sink and actor_behavior
+    """
+    duration_col = f"duration_{time_unit}"
+    agg_funcs = get_agg_funcs(agg_func)
+    column_tuples = [("actor_behavior", "count"), ("actor_behavior", "percentage")]
+    column_tuples.extend((duration_col, str(func)) for func in agg_funcs)
+
+    # group by the position of the edge, such that the rows keep the edge order and repeated edges stay separate
+    # empty edges are left out of the concatenation, their untyped columns would turn the durations into objects
+    non_empty_df_instances = [df_instances_per_edge for df_instances_per_edge in list_df_instances
+                              if len(df_instances_per_edge)]
+    df_instances = pd.concat(non_empty_df_instances, ignore_index=True, sort=False) if non_empty_df_instances \
+        else pd.DataFrame(columns=["actor_behavior", duration_col])
+    df_instances["edge"] = np.repeat(np.arange(len(list_df_instances)),
+                                     [len(df_instances_per_edge) for df_instances_per_edge in list_df_instances])
+    if exclude_zero_duration and duration_col in df_instances.columns:
+        df_instances = df_instances[df_instances[duration_col].fillna(0) > 0]
+
+    keys = [df_instances["edge"], df_instances["actor_behavior"].astype(object)]
+    # the "all" rollup per edge covers every instance of the edge, including those without actor behavior
+    rollup_keys = [df_instances["edge"], pd.Series("all", index=df_instances.index, name="actor_behavior")]
+    counts = pd.concat([df_instances.groupby(keys).size(), df_instances.groupby(rollup_keys).size()]).sort_index()
+    instance_counts = np.bincount(df_instances["edge"], minlength=len(list_df_instances))
+    frames = [counts.to_frame(), (counts / instance_counts[counts.index.get_level_values("edge")]).to_frame()]
+    if agg_funcs:
+        duration_agg = pd.concat(
+            [aggregate_durations(df_instances, keys, duration_col, agg_funcs, statistics_backend),
+             aggregate_durations(df_instances, rollup_keys, duration_col, agg_funcs, statistics_backend)]
+        ).sort_index()
+        frames.append(duration_agg.to_frame() if isinstance(duration_agg, pd.Series) else duration_agg)
+    result = pd.concat(frames, axis=1)
+    result.columns = pd.MultiIndex.from_tuples(column_tuples)
+
+    edge_codes = result.index.get_level_values("edge")
+    source_names = np.array([source for source, _ in edge_names], dtype=object)
+    sink_names = np.array([sink for _, sink in edge_names], dtype=object)
+    result.index = pd.MultiIndex.from_arrays(
+        [source_names[edge_codes], sink_names[edge_codes], result.index.get_level_values("actor_behavior")],
+        names=["source", "sink", "actor_behavior"])
+    if (instance_counts == 0).any():
+        # aggregate_actor_behavior returns an unnamed empty frame for an edge without instances, which drops the
+        # actor_behavior level name when the per-edge results are concatenated
+        result.index = result.index.set_names(None, level="actor_behavior")
+    return result
+
+
+def aggregate_actor_behavior_all_edges(list_df_instances, edge_names, agg_func, time_unit,
+                                       exclude_zero_duration=True, aggregation_workers=1,
+                                       statistics_backend="pandas"):
+    """
+    Aggregate the instances of all case edges, optionally fanned out over a pool of aggregation_workers processes
+    that each aggregate a contiguous chunk of edges. Only worthwhile for very large inputs, as the instances are
+    pickled to the worker processes.
+    """
+    if aggregation_workers <= 1 or len(list_df_instances) <= 1:
+        return aggregate_actor_behavior_grouped(list_df_instances, edge_names, agg_func, time_unit,
+                                                exclude_zero_duration, statistics_backend)
+
+    chunk_bounds = np.linspace(0, len(list_df_instances), min(aggregation_workers, len(list_df_instances)) + 1,
+                               dtype=int)
+    with ProcessPoolExecutor(max_workers=aggregation_workers) as executor:
+        futures = [executor.submit(aggregate_actor_behavior_grouped, list_df_instances[start:end],
+                                   edge_names[start:end], agg_func, time_unit, exclude_zero_duration,
+                                   statistics_backend)
+                   for start, end in zip(chunk_bounds[:-1], chunk_bounds[1:])]
+        return pd.concat([future.result() for future in futures], axis=0)
+
+
 # def aggregate_actor_behavior(df_to_aggregate, groupby, agg_func, time_unit):
 #     if list(set(df_to_aggregate['actor_behavior'].unique().tolist()) & {"interruption", "handover_idle",
 #                                                                        "handover_prioritized",
@@ -189,51 +456,85 @@ def aggregate_actor_behavior(df_to_aggregate, groupby, agg_func, time_unit, excl
 #                 df.loc[index, f"{column_name}_{prioritized_task[0]}"] = prioritized_task[1]
 #     return df
 
-def get_df_instances_by_actor_behavior_bpic15(intermediate_output_directory, connection, case, resource, time_unit, case_edges):
+def get_df_instances_by_actor_behavior_bpic15(intermediate_store, connection, case, resource, time_unit,
+                                              case_edges, extraction_mode="per_edge", columnar_ingestion=False,
+                                              extraction_workers=1):
     list_df_instances_by_actor_behavior = []
-
-    for case_edge in case_edges:
-        try:
-            str_case_edge = f"{case_edge[0]}_{case_edge[1]}"
-        except IndexError:
-            print("Invalid edge tuple structure:", case_edge)
-
-        # Sanitize filename
-        safe_edge_name = re.sub(r'[\\/:*?"<>|]', '_', str_case_edge)
-        filepath = f"{intermediate_output_directory}actor_behavior_{safe_edge_name}.pkl"
-
-        # Load or compute per-edge dataframe
-        if path.exists(filepath):
-            df_instances_by_actor_behavior = pd.read_pickle(filepath)
-        else:
-            df_instances_by_actor_behavior = get_instances_by_actor_behavior_per_df_bpic15(
-                connection, case, resource, time_unit, case_edge
-            )
-            df_instances_by_actor_behavior.to_pickle(filepath)
-
+    batched_df_instances = {}
+    parallel_df_instances = iter(())
+
+    # decide once which edges are computed, such that saving an edge does not change the order of the results
+    is_cached = [intermediate_store.exists(case_edge) for case_edge in case_edges]
+    missing_case_edges = [case_edge for case_edge, cached in zip(case_edges, is_cached) if not cached]
+    if extraction_mode == "batched" and missing_case_edges:
+        batched_df_instances = get_instances_by_actor_behavior_all_dfs_bpic15(connection, case, resource,
+                                                                              time_unit, missing_case_edges,
+                                                                              columnar_ingestion)
+    elif extraction_mode == "parallel":
+        parallel_df_instances = map_ordered_bounded(
+            lambda case_edge: get_instances_by_actor_behavior_per_df_bpic15(connection, case, resource, time_unit,
+                                                                            case_edge, columnar_ingestion),
+            missing_case_edges, max_workers=extraction_workers)
+
+    for case_edge, cached in zip(case_edges, is_cached):
+        with record_span(" -> ".join(get_edge_names(case_edge)), "edge") as span:
+            # Load or compute per-edge dataframe
+            if cached:
+                df_instances_by_actor_behavior = intermediate_store.load(case_edge)
+            elif extraction_mode == "batched":
+                df_instances_by_actor_behavior = batched_df_instances[tuple(case_edge)]
+                intermediate_store.save(case_edge, df_instances_by_actor_behavior)
+            elif extraction_mode == "parallel":
+                df_instances_by_actor_behavior = next(parallel_df_instances)
+                intermediate_store.save(case_edge, df_instances_by_actor_behavior)
+            else:
+                df_instances_by_actor_behavior = get_instances_by_actor_behavior_per_df_bpic15(
+                    connection, case, resource, time_unit, case_edge, columnar_ingestion
+                )
+                intermediate_store.save(case_edge, df_instances_by_actor_behavior)
+
+            span.rows = len(df_instances_by_actor_behavior)
         list_df_instances_by_actor_behavior.append(df_instances_by_actor_behavior)
 
     return list_df_instances_by_actor_behavior
 
 
-def get_df_instances_by_actor_behavior_bpic17(intermediate_output_directory, connection, case, resource, time_unit,
-                                       case_edges):
+def get_df_instances_by_actor_behavior_bpic17(intermediate_store, connection, case, resource, time_unit,
+                                       case_edges, extraction_mode="per_edge", columnar_ingestion=False,
+                                       extraction_workers=1):
     list_df_instances_by_actor_behavior = []
-    for case_edge in case_edges:
-        try:
-            str_case_edge = f"{case_edge[0][0]}-{case_edge[0][1]}_{case_edge[1][0]}-{case_edge[1][1]}"
-        except IndexError:
-            print("Your tuple does not have that index")
-
-        if path.exists(
-                f"{intermediate_output_directory}actor_behavior_{str_case_edge}.pkl"):
-            df_instances_by_actor_behavior = pd.read_pickle(
-                f"{intermediate_output_directory}actor_behavior_{str_case_edge}.pkl")
-        else:
-            df_instances_by_actor_behavior = get_instances_by_actor_behavior_per_df_bpic17(connection, case, resource,
-                                                                                    time_unit, case_edge)
-            df_instances_by_actor_behavior.to_pickle(
-                f"{intermediate_output_directory}actor_behavior_{str_case_edge}.pkl")
+    batched_df_instances = {}
+    parallel_df_instances = iter(())
+
+    is_cached = [intermediate_store.exists(case_edge) for case_edge in case_edges]
+    missing_case_edges = [case_edge for case_edge, cached in zip(case_edges, is_cached) if not cached]
+    if extraction_mode == "batched" and missing_case_edges:
+        batched_df_instances = get_instances_by_actor_behavior_all_dfs_bpic17(connection, case, resource,
+                                                                              time_unit, missing_case_edges,
+                                                                              columnar_ingestion)
+    elif extraction_mode == "parallel":
+        parallel_df_instances = map_ordered_bounded(
+            lambda case_edge: get_instances_by_actor_behavior_per_df_bpic17(connection, case, resource, time_unit,
+                                                                            case_edge, columnar_ingestion),
+            missing_case_edges, max_workers=extraction_workers)
+
+    for case_edge, cached in zip(case_edges, is_cached):
+        with record_span(" -> ".join(get_edge_names(case_edge)), "edge") as span:
+            if cached:
+                df_instances_by_actor_behavior = intermediate_store.load(case_edge)
+            elif extraction_mode == "batched":
+                df_instances_by_actor_behavior = batched_df_instances[(case_edge[0][0], case_edge[0][1],
+                                                                       case_edge[1][0], case_edge[1][1])]
+                intermediate_store.save(case_edge, df_instances_by_actor_behavior)
+            elif extraction_mode == "parallel":
+                df_instances_by_actor_behavior = next(parallel_df_instances)
+                intermediate_store.save(case_edge, df_instances_by_actor_behavior)
+            else:
+                df_instances_by_actor_behavior = get_instances_by_actor_behavior_per_df_bpic17(connection, case, resource,
+                                                                                        time_unit, case_edge,
+                                                                                        columnar_ingestion)
+                intermediate_store.save(case_edge, df_instances_by_actor_behavior)
+            span.rows = len(df_instances_by_actor_behavior)
         # if "prioritized_tasks" in df_actor_behavior.columns:
         #     df_actor_behavior = extract_stringlist_to_columns(df_actor_behavior, "prioritized_tasks")
         # for column in ([value for value in df_actor_behavior.columns if
@@ -246,33 +547,148 @@ def get_df_instances_by_actor_behavior_bpic17(intermediate_output_directory, con
         list_df_instances_by_actor_behavior.append(df_instances_by_actor_behavior)
     return list_df_instances_by_actor_behavior
 
-def get_instances_by_actor_behavior_per_df_bpic15(connection, case, resource, time_unit, case_edge):
+def get_instances_by_actor_behavior_per_df_bpic15(connection, case, resource, time_unit, case_edge,
+                                                  columnar_ingestion=False):
     # Execute the actor behavior query for a given (activity1, activity2)
-    df_instances_by_actor_behavior = qp.parse_to_dataframe(
-        connection.exec_query(
-            ql.q_get_all_actor_behavior_per_df,
-            **{"case": case, "resource": resource, "edge_tuple": case_edge},
-        ),
+    df_instances_by_actor_behavior = query_df_instances(
+        connection, ql.q_get_all_actor_behavior_per_df,
+        {"case": case, "resource": resource, "edge_tuple": case_edge},
         timedelta_cols={"duration": time_unit},
         timestamp_cols=["startTime", "completeTime"],
+        columns=["startTime", "completeTime", "duration", "actor_behavior"],
+        columnar_ingestion=columnar_ingestion
     )
 
-    # Add an 'all' category for comparison
-    df_instances_all = df_instances_by_actor_behavior.copy()
-    df_instances_all["actor_behavior"] = "all"
+    return df_instances_by_actor_behavior
 
-    df_instances_per_df = pd.concat(
-        [df_instances_by_actor_behavior, df_instances_all], ignore_index=True, sort=False
+
+def get_instances_by_actor_behavior_all_dfs_bpic15(connection, case, resource, time_unit, case_edges,
+                                                   columnar_ingestion=False):
+    # Execute one query for all (activity1, activity2) and partition the instances per edge
+    df_instances_by_actor_behavior = query_df_instances(
+        connection, ql.q_get_all_actor_behavior_all_df,
+        {"case": case, "resource": resource, "edge_tuples": case_edges},
+        timedelta_cols={"duration": time_unit},
+        timestamp_cols=["startTime", "completeTime"],
+        columns=["activity1", "activity2", "startTime", "completeTime", "duration", "actor_behavior"],
+        key_columns=["activity1", "activity2"],
+        columnar_ingestion=columnar_ingestion
     )
-    return df_instances_per_df
-
-def get_instances_by_actor_behavior_per_df_bpic17(connection, case, resource, time_unit, case_edge):
-    df_instances_by_actor_behavior = qp.parse_to_dataframe(
-        connection.exec_query(ql.q_get_all_actor_behavior_per_df_bpic17,
-                              **{"case": case, "resource": resource, "edge_tuple": case_edge}),
-        timedelta_cols={"duration": time_unit}, timestamp_cols=["time"])
-    df_instances_all = df_instances_by_actor_behavior.copy()
-    df_instances_all["actor_behavior"] = "all"
-
-    df_instances_per_df = pd.concat([df_instances_by_actor_behavior, df_instances_all], ignore_index=True, sort=False)
-    return df_instances_per_df
+    return partition_instances_per_df(df_instances_by_actor_behavior, ["activity1", "activity2"],
+                                      [tuple(case_edge) for case_edge in case_edges])
+
+def get_instances_by_actor_behavior_per_df_bpic17(connection, case, resource, time_unit, case_edge,
+                                                  columnar_ingestion=False):
+    df_instances_by_actor_behavior = query_df_instances(
+        connection, ql.q_get_all_actor_behavior_per_df_bpic17,
+        {"case": case, "resource": resource, "edge_tuple": case_edge},
+        timedelta_cols={"duration": time_unit}, timestamp_cols=["time"],
+        columns=["time", "duration", "actor_behavior"], columnar_ingestion=columnar_ingestion)
+    return df_instances_by_actor_behavior
+
+
+def get_instances_by_actor_behavior_all_dfs_bpic17(connection, case, resource, time_unit, case_edges,
+                                                   columnar_ingestion=False):
+    df_instances_by_actor_behavior = query_df_instances(
+        connection, ql.q_get_all_actor_behavior_all_df_bpic17,
+        {"case": case, "resource": resource, "edge_tuples": case_edges},
+        timedelta_cols={"duration": time_unit}, timestamp_cols=["time"],
+        columns=["activity1", "lifecycle1", "activity2", "lifecycle2", "time", "duration", "actor_behavior"],
+        key_columns=["activity1", "lifecycle1", "activity2", "lifecycle2"], columnar_ingestion=columnar_ingestion)
+    return partition_instances_per_df(
+        df_instances_by_actor_behavior, ["activity1", "lifecycle1", "activity2", "lifecycle2"],
+        [(case_edge[0][0], case_edge[0][1], case_edge[1][0], case_edge[1][1]) for case_edge in case_edges])
+
+
+def get_streamed_actor_behavior_agg_bpic15(connection, case, resource, time_unit, case_edge, agg_func,
+                                           exclude_zero_duration=True, chunk_size=10000, spill_path=None):
+    return aggregate_streamed_df_instances(
+        connection, ql.q_get_all_actor_behavior_per_df,
+        {"case": case, "resource": resource, "edge_tuple": case_edge},
+        timedelta_cols={"duration": time_unit},
+        timestamp_cols=["startTime", "completeTime"],
+        columns=["startTime", "completeTime", "duration", "actor_behavior"],
+        agg_func=agg_func, time_unit=time_unit, exclude_zero_duration=exclude_zero_duration,
+        chunk_size=chunk_size, spill_path=spill_path)
+
+
+def get_streamed_actor_behavior_agg_bpic17(connection, case, resource, time_unit, case_edge, agg_func,
+                                           exclude_zero_duration=True, chunk_size=10000, spill_path=None):
+    return aggregate_streamed_df_instances(
+        connection, ql.q_get_all_actor_behavior_per_df_bpic17,
+        {"case": case, "resource": resource, "edge_tuple": case_edge},
+        timedelta_cols={"duration": time_unit}, timestamp_cols=["time"],
+        columns=["time", "duration", "actor_behavior"],
+        agg_func=agg_func, time_unit=time_unit, exclude_zero_duration=exclude_zero_duration,
+        chunk_size=chunk_size, spill_path=spill_path)
+
+
+def aggregate_streamed_df_instances(connection, query_function, query_kwargs, timedelta_cols, timestamp_cols, columns,
+                                    agg_func, time_unit, exclude_zero_duration=True, chunk_size=10000,
+                                    spill_path=None):
+    """
+    Aggregate the instances of a df-relation while the driver streams them in chunks of chunk_size records, such
+    that memory use does not depend on the number of instances. The median is approximated by a mergeable sketch.
+    @param spill_path: if given, the raw instances are appended to this CSV file
+    @return: DataFrame in the layout of aggregate_actor_behavior
+    """
+    duration_col = f"duration_{time_unit}"
+    aggregates = ActorBehaviorAggregates()
+    chunks = stream_query_chunks(connection, query_function, chunk_size=chunk_size, **query_kwargs)
+    for i, records in enumerate(chunks):
+        df_chunk = qp.parse_to_dataframe(records, timedelta_cols=timedelta_cols, timestamp_cols=timestamp_cols,
+                                         columns=columns)
+        if spill_path is not None:
+            df_chunk.to_csv(spill_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        if exclude_zero_duration:
+            df_chunk = df_chunk[df_chunk[duration_col].fillna(0) > 0]
+        aggregates.update(df_chunk["actor_behavior"].to_numpy(dtype=object),
+                          df_chunk[duration_col].to_numpy(dtype=np.float64))
+    return aggregates.to_frame(get_agg_funcs(agg_func), duration_col)
+
+
+def partition_instances_per_df(df_instances, key_columns, case_edges):
+    """
+    Split the instances of several df-relations into one DataFrame per df-relation, in the column layout of the
+    per-edge queries
+    @return: dictionary from case edge key (tuple of the key columns) to its instances
+    """
+    value_columns = [column for column in df_instances.columns if column not in key_columns]
+    partitions = {key: df_partition[value_columns].reset_index(drop=True)
+                  for key, df_partition in df_instances.groupby(key_columns, sort=False, observed=True)}
+    return {case_edge: partitions.get(case_edge, pd.DataFrame(columns=value_columns)) for case_edge in case_edges}
+
+
+def query_df_instances(connection, query_function, query_kwargs, timedelta_cols, timestamp_cols, columns,
+                       key_columns=(), columnar_ingestion=False):
+    with record_span(query_function.__name__, "query") as span:
+        if columnar_ingestion:
+            # fill typed columns while the driver streams the records instead of materializing them first
+            df_instances = qp.parse_to_columnar_dataframe(
+                stream_query(connection, query_function, **query_kwargs), timedelta_cols=timedelta_cols,
+                timestamp_cols=timestamp_cols, categorical_cols=["actor_behavior", *key_columns], columns=columns)
+        else:
+            df_instances = qp.parse_to_dataframe(connection.exec_query(query_function, **query_kwargs),
+                                                 timedelta_cols=timedelta_cols, timestamp_cols=timestamp_cols,
+                                                 columns=columns)
+        span.rows = len(df_instances)
+    return df_instances
+
+
+def map_ordered_bounded(function, items, max_workers: int = 4, max_in_flight: int = None):
+    """
+    Apply function to the items on a pool of worker threads, each of which runs its queries on its own driver
+    session. At most max_in_flight items are submitted ahead of the consumer, which bounds both the number of
+    concurrent queries and the number of results held in memory.
+    @return: generator over the results, in the order of the items
+    """
+    if max_in_flight is None:
+        max_in_flight = 2 * max_workers
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = deque()
+        for item in items:
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+            in_flight.append(executor.submit(function, item))
+        while in_flight:
+            yield in_flight.popleft().result()
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+# handover behaviors from the lowest to the highest precedence: a case df-edge with several candidate task instance
+# pairs gets the behavior of highest precedence over all of them, like the overwrite order of the Cypher queries
+HANDOVER_PRECEDENCE = ["handover_idle", "handover_prioritized", "handover_deprioritized"]
+NO_HANDOVER = 0
+
+
+def sort_merge_join(left_keys, right_keys):
+    """
+    Equi-join of two key arrays by sorting the right keys and searching the left keys in them
+    @return: positions in left_keys and in right_keys of all pairs of equal keys
+    """
+    left_keys = np.asarray(left_keys, dtype=np.int64)
+    right_keys = np.asarray(right_keys, dtype=np.int64)
+    order = np.argsort(right_keys, kind="stable")
+    sorted_keys = right_keys[order]
+    first = np.searchsorted(sorted_keys, left_keys, side="left")
+    counts = np.searchsorted(sorted_keys, left_keys, side="right") - first
+    left = np.repeat(np.arange(len(left_keys)), counts)
+    offsets = np.arange(len(left)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return left, order[np.repeat(first, counts) + offsets]
+
+
+def rank_handovers(tic_end, tir_start, tir_end, valid_tic_end, valid_tir_start, valid_tir_end):
+    """
+    Classify the end of the task instance tic of e1 against the interval of the task instance tir that precedes the
+    task instance of e2, as rank in HANDOVER_PRECEDENCE (1 is the first behavior), NO_HANDOVER if no rule applies.
+    Comparisons with a missing time are false, as in Cypher.
+    """
+    ranks = np.full(len(tic_end), NO_HANDOVER, dtype=np.int8)
+    # the rules in order of precedence, a rule only applies if no rule of higher precedence applied
+    rules = {
+        "handover_deprioritized": valid_tic_end & valid_tir_start & (tic_end < tir_start),
+        "handover_prioritized": valid_tic_end & valid_tir_start & valid_tir_end & (tir_start < tic_end) &
+        (tic_end < tir_end),
+        "handover_idle": valid_tic_end & valid_tir_end & (tir_end < tic_end)
+    }
+    for behavior, applies in rules.items():
+        ranks[applies & (ranks == NO_HANDOVER)] = HANDOVER_PRECEDENCE.index(behavior) + 1
+    return ranks
+
+
+class HandoverIntervalJoin:
+    """
+    Interval join of the task instances of the case df-edges for the handover behaviors. The task instance tic of e1
+    and the DF_TI predecessors tir of the task instance of e2 are found with sort-merge joins, after which the end
+    of tic is compared with the interval of tir in a vectorized pass, in O(n log n) for n task instances and edges.
+    """
+
+    def __init__(self, task_instance_events: pd.DataFrame, task_instance_intervals: pd.DataFrame,
+                 df_ti: pd.DataFrame):
+        self.contained_events = task_instance_events["event"].to_numpy(dtype=np.int64)
+        self.containing_task_instances = task_instance_events["task_instance"].to_numpy(dtype=np.int64)
+        intervals = task_instance_intervals.sort_values("task_instance")
+        self.task_instances = intervals["task_instance"].to_numpy(dtype=np.int64)
+        self.start_times, self.valid_start_times = _to_int64(intervals["start_time"])
+        self.end_times, self.valid_end_times = _to_int64(intervals["end_time"])
+        self.df_ti_sources = df_ti["task_instance1"].to_numpy(dtype=np.int64)
+        self.df_ti_targets = df_ti["task_instance2"].to_numpy(dtype=np.int64)
+
+    def get_candidates(self, e1, e2):
+        """
+        @return: arrays edge, tic and tir of the matches of (tic)-[:CONTAINS]->(e1) and
+        (e2)<-[:CONTAINS]-(ti)<-[:DF_TI]-(tir) per case df-edge
+        """
+        # (tic)-[:CONTAINS]->(e1)
+        source_edges, contained = sort_merge_join(e1, self.contained_events)
+        tic = self.containing_task_instances[contained]
+        # (e2)<-[:CONTAINS]-(ti)<-[:DF_TI]-(tir)
+        target_edges, contained = sort_merge_join(e2, self.contained_events)
+        target_rows, predecessors = sort_merge_join(self.containing_task_instances[contained], self.df_ti_targets)
+        target_edges = target_edges[target_rows]
+        tir = self.df_ti_sources[predecessors]
+        sources, targets = sort_merge_join(source_edges, target_edges)
+        return source_edges[sources], tic[sources], tir[targets]
+
+    def get_interval_positions(self, task_instances):
+        """
+        @return: positions of the task instances in the sorted intervals and whether they have an interval at all
+        """
+        positions = np.searchsorted(self.task_instances, task_instances)
+        positions[positions == len(self.task_instances)] = 0
+        known = self.task_instances[positions] == task_instances
+        return positions, known
+
+    def classify(self, e1, e2) -> np.ndarray:
+        """
+        @return: rank in HANDOVER_PRECEDENCE of the handover behavior of every case df-edge, NO_HANDOVER if none
+        """
+        ranks = np.full(len(e1), NO_HANDOVER, dtype=np.int8)
+        edges, tic, tir = self.get_candidates(e1, e2)
+        if len(edges) == 0 or len(self.task_instances) == 0:
+            return ranks
+        tic_positions, tic_known = self.get_interval_positions(tic)
+        tir_positions, tir_known = self.get_interval_positions(tir)
+        candidate_ranks = rank_handovers(self.end_times[tic_positions], self.start_times[tir_positions],
+                                         self.end_times[tir_positions],
+                                         tic_known & self.valid_end_times[tic_positions],
+                                         tir_known & self.valid_start_times[tir_positions],
+                                         tir_known & self.valid_end_times[tir_positions])
+        np.maximum.at(ranks, edges, candidate_ranks)
+        return ranks
+
+    def get_conditions(self, e1, e2):
+        """
+        @return: boolean arrays idle, prioritized and deprioritized of the case df-edges, of which at most one is
+        true per edge
+        """
+        ranks = self.classify(e1, e2)
+        return tuple(ranks == HANDOVER_PRECEDENCE.index(behavior) + 1 for behavior in HANDOVER_PRECEDENCE)
+
+
+def _to_int64(times: pd.Series):
+    valid = times.notna().to_numpy()
+    return times.astype("Int64").fillna(0).to_numpy(dtype=np.int64), valid
@@ -0,0 +1,167 @@
+from promg.data_managers.semantic_header import ConstructedNodes
+
+from queries.decomposition_actor_behavior import DecompositionActorBehaviorQueryLibrary as ql
+from queries.index_provisioning import IndexProvisioningQueryLibrary as iql
+from queries import query_result_parser as qp
+from queries.query_stream import build_query
+
+# plan operators that read an index, and plan operators that read every node or relationship of a label or type
+INDEX_OPERATORS = ("NodeIndexSeek", "NodeUniqueIndexSeek", "NodeIndexScan", "NodeIndexContainsScan",
+                   "NodeIndexEndsWithScan", "MultiNodeIndexSeek", "DirectedRelationshipIndexSeek",
+                   "UndirectedRelationshipIndexSeek", "DirectedRelationshipIndexScan",
+                   "UndirectedRelationshipIndexScan")
+SCAN_OPERATORS = ("AllNodesScan", "NodeByLabelScan", "DirectedRelationshipTypeScan",
+                  "UndirectedRelationshipTypeScan", "DirectedAllRelationshipsScan", "UndirectedAllRelationshipsScan")
+
+# the sequential classification queries, which match every case df-edge
+CLASSIFICATION_QUERIES = ["q_add_actor_behavior_continuation", "q_add_actor_behavior_interruption",
+                          "q_add_actor_behavior_handover_idle", "q_add_actor_behavior_handover_prioritized",
+                          "q_add_actor_behavior_handover_deprioritized"]
+PER_EDGE_QUERIES = ["q_get_all_actor_behavior_per_df", "q_get_continuation_per_df", "q_get_interruption_per_df",
+                    "q_get_all_actor_behavior_per_df_bpic17"]
+BATCHED_QUERIES = ["q_get_all_actor_behavior_all_df", "q_get_all_actor_behavior_all_df_bpic17"]
+APOC_BATCHED_QUERIES = ["q_add_actor_behavior_fused", "q_add_actor_behavior_incremental",
+                        "q_mark_task_instances_classified", "q_clear_pending_df_edges"]
+
+
+def get_plan_operators(plan):
+    """
+    @return: operator types of a query plan (as in ResultSummary.plan) and all its children, depth first
+    """
+    # Neo4j 5 suffixes the operator type with the database name, e.g. NodeIndexSeek@neo4j
+    operators = [plan["operatorType"].split("@")[0]]
+    for child in plan.get("children", []):
+        operators.extend(get_plan_operators(child))
+    return operators
+
+
+def explain_query(connection, function, **kwargs):
+    """
+    Plan a library query with EXPLAIN, without executing it
+    @return: the plan of the query as a nested dictionary
+    """
+    query, parameters, database = build_query(connection, function, **kwargs)
+    with connection.driver.session(database=database) as session:
+        return session.run(f"EXPLAIN {query}", parameters).consume().plan
+
+
+class IndexProvisioning:
+    """
+    Creates the indexes on the access paths of the actor behavior and extraction queries and verifies that the
+    query plans use them
+    """
+
+    def __init__(self, db_connection, dataset_name, resource: ConstructedNodes, case: ConstructedNodes):
+        self.connection = db_connection
+        self.dataset_name = dataset_name
+        self.resource = resource
+        self.case = case
+
+    def get_node_indexes(self):
+        node_indexes = {
+            "event_activity": ("Event", ["activity"]),
+            "task_instance_start_time": ("TaskInstance", ["start_time"]),
+            "task_instance_end_time": ("TaskInstance", ["end_time"])
+        }
+        if self.dataset_name == "BPIC17":
+            node_indexes["event_activity_lifecycle"] = ("Event", ["activity", "lifecycle"])
+        return node_indexes
+
+    def get_relationship_indexes(self):
+        df_label = self.case.get_df_label()
+        return {f"{df_label.lower()}_actor_behavior": (df_label, ["actor_behavior"])}
+
+    def create_indexes(self, timeout: int = 300):
+        """
+        Create the missing indexes and wait until all of them are ONLINE, creating an existing index is a no-op
+        """
+        for index_name, (label, properties) in self.get_node_indexes().items():
+            self.connection.exec_query(iql.q_create_node_index,
+                                       **{"index_name": index_name, "label": label, "properties": properties})
+        for index_name, (relationship_type, properties) in self.get_relationship_indexes().items():
+            self.connection.exec_query(iql.q_create_relationship_index,
+                                       **{"index_name": index_name, "relationship_type": relationship_type,
+                                          "properties": properties})
+        self.connection.exec_query(iql.q_await_indexes, **{"timeout": timeout})
+
+        index_names = [*self.get_node_indexes(), *self.get_relationship_indexes()]
+        index_states = qp.parse_to_dataframe(self.connection.exec_query(iql.q_get_index_states,
+                                                                        **{"index_names": index_names}),
+                                             columns=["name", "state", "populationPercent"])
+        for index_name, state in zip(index_states["name"], index_states["state"]):
+            print(f"Index {index_name}: {state}")
+        not_online = set(index_names) - set(index_states.loc[index_states["state"] == "ONLINE", "name"])
+        if not_online:
+            raise RuntimeError(f"Indexes {sorted(not_online)} are not ONLINE after {timeout} seconds")
+
+    def get_verified_queries(self):
+        """
+        @return: dictionary from query name to the library query function and its arguments, for example case
+        df-edges of the graph
+        """
+        kwargs = {"case": self.case, "resource": self.resource}
+        verified_queries = {query_name: (getattr(ql, query_name), kwargs) for query_name in CLASSIFICATION_QUERIES}
+        if self.dataset_name == "BPIC17":
+            case_edges = qp.parse_to_2d2tuple_list(
+                self.connection.exec_query(ql.q_get_all_df_edges_activity_lifecycle,
+                                           **{"case": self.case, "min_freq": 0}),
+                "activity1", "lifecycle1", "activity2", "lifecycle2")
+            per_edge_queries = ["q_get_all_actor_behavior_per_df_bpic17"]
+            batched_queries = ["q_get_all_actor_behavior_all_df_bpic17"]
+        else:
+            case_edges = qp.parse_to_2d_list(
+                self.connection.exec_query(ql.q_get_all_df_edges_activity, **{"case": self.case, "min_freq": 0}),
+                "activity1", "activity2")
+            per_edge_queries = ["q_get_all_actor_behavior_per_df", "q_get_continuation_per_df",
+                                "q_get_interruption_per_df"]
+            batched_queries = ["q_get_all_actor_behavior_all_df"]
+        if case_edges:
+            for query_name in per_edge_queries:
+                verified_queries[query_name] = (getattr(ql, query_name), {**kwargs, "edge_tuple": case_edges[0]})
+            for query_name in batched_queries:
+                verified_queries[query_name] = (getattr(ql, query_name), {**kwargs, "edge_tuples": case_edges})
+        return verified_queries
+
+    def get_unverified_queries(self, verified_queries):
+        """
+        @return: dictionary from the name of every other query of the library to the reason it is not verified
+        """
+        unverified_queries = {}
+        for query_name in vars(ql):
+            if not query_name.startswith("q_") or query_name in verified_queries:
+                continue
+            if query_name in APOC_BATCHED_QUERIES:
+                reason = "batched by apoc.periodic.iterate, EXPLAIN only plans the procedure call"
+            elif query_name in PER_EDGE_QUERIES + BATCHED_QUERIES:
+                reason = "extraction query of another dataset or the graph has no case df-edges"
+            elif query_name == "q_set_actor_behavior_per_df":
+                reason = "looks up the df-edges by id"
+            else:
+                reason = "reads or writes every case df-edge or task instance, not on an indexed access path"
+            unverified_queries[query_name] = reason
+        return unverified_queries
+
+    def verify_query_plans(self):
+        """
+        Print for every verified library query whether its plan starts from an index or scans a label, and for
+        every other query of the library why it is not verified
+        @return: dictionary from query name to the operator types of its plan
+        """
+        query_operators = {}
+        for query_name, (function, kwargs) in self.get_verified_queries().items():
+            operators = get_plan_operators(explain_query(self.connection, function, **kwargs))
+            index_operators = [operator for operator in operators if operator in INDEX_OPERATORS]
+            scan_operators = [operator for operator in operators if operator in SCAN_OPERATORS]
+            if index_operators and not scan_operators:
+                verdict = f"index seek ({', '.join(index_operators)})"
+            elif scan_operators:
+                verdict = f"LABEL SCAN ({', '.join(scan_operators)})"
+            else:
+                verdict = "no index or label scan"
+            if scan_operators and query_name in CLASSIFICATION_QUERIES:
+                verdict += ", expected as every case df-edge is classified"
+            print(f"{query_name}: {verdict}")
+            query_operators[query_name] = operators
+        for query_name, reason in self.get_unverified_queries(query_operators).items():
+            print(f"{query_name}: not verified ({reason})")
+        return query_operators
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+
+from modules.decomposition_actor_behavior.intermediate_store import get_edge_names
+from queries.decomposition_actor_behavior import DecompositionActorBehaviorQueryLibrary as ql
+from queries import query_result_parser as qp
+
+# bump when the layout of the stored instances changes, this invalidates every cached edge
+CACHE_FORMAT_VERSION = 2
+
+
+def get_fingerprint(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def get_edge_key(case_edge) -> str:
+    return json.dumps(list(get_edge_names(case_edge)))
+
+
+def get_edge_fingerprints(connection, case, case_edges, dataset_name, input_fingerprint):
+    """
+    Fingerprint every case edge from the extraction inputs and the current state of its df-instances in the graph:
+    the number of instances per actor behavior and the highest df id, so re-running add_actor_behavior or appending
+    events only invalidates the edges that changed
+    @return: dictionary from edge key to fingerprint
+    """
+    if dataset_name == "BPIC17":
+        df_edge_states = qp.parse_to_dataframe(
+            connection.exec_query(ql.q_get_df_edge_fingerprints_bpic17, **{"case": case}),
+            columns=["activity1", "lifecycle1", "activity2", "lifecycle2", "actor_behavior", "count", "max_df_id"])
+        df_edge_states["source"] = df_edge_states["activity1"] + "-" + df_edge_states["lifecycle1"]
+        df_edge_states["sink"] = df_edge_states["activity2"] + "-" + df_edge_states["lifecycle2"]
+    else:
+        df_edge_states = qp.parse_to_dataframe(
+            connection.exec_query(ql.q_get_df_edge_fingerprints, **{"case": case}),
+            columns=["activity1", "activity2", "actor_behavior", "count", "max_df_id"])
+        df_edge_states["source"] = df_edge_states["activity1"]
+        df_edge_states["sink"] = df_edge_states["activity2"]
+
+    edge_states = {}
+    for (source, sink), df_edge_state in df_edge_states.groupby(["source", "sink"]):
+        edge_states[json.dumps([source, sink])] = sorted(
+            [str(actor_behavior), int(count), int(max_df_id)] for actor_behavior, count, max_df_id in
+            zip(df_edge_state["actor_behavior"], df_edge_state["count"], df_edge_state["max_df_id"]))
+
+    edge_fingerprints = {}
+    for case_edge in case_edges:
+        edge_key = get_edge_key(case_edge)
+        edge_fingerprints[edge_key] = get_fingerprint({
+            "format_version": CACHE_FORMAT_VERSION,
+            "inputs": input_fingerprint,
+            "graph_state": edge_states.get(edge_key, [])
+        })
+    return edge_fingerprints
+
+
+class CacheManifest:
+    """
+    Records the fingerprint with which each cached case edge was computed
+    """
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.edges = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                self.edges = json.load(f)["edges"]
+
+    def is_valid(self, edge_key, edge_fingerprint):
+        return self.edges.get(edge_key) == edge_fingerprint
+
+    def update(self, edge_key, edge_fingerprint):
+        self.edges[edge_key] = edge_fingerprint
+
+    def save(self):
+        # write to a temporary file first, so an interrupted run never leaves a corrupt manifest behind
+        temporary_path = f"{self.manifest_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump({"format_version": CACHE_FORMAT_VERSION, "edges": self.edges}, f, indent=1)
+        os.replace(temporary_path, self.manifest_path)
+
+
+class FingerprintedIntermediateStore:
+    """
+    Wraps an intermediate store such that a cached case edge is only reused if it was computed with the current
+    fingerprint of that edge
+    """
+
+    def __init__(self, intermediate_store, manifest: CacheManifest, edge_fingerprints: dict,
+                 flush_interval: int = 100):
+        self.intermediate_store = intermediate_store
+        self.manifest = manifest
+        self.edge_fingerprints = edge_fingerprints
+        self.flush_interval = flush_interval
+        self.nr_unflushed = 0
+
+    def exists(self, case_edge):
+        edge_key = get_edge_key(case_edge)
+        return self.manifest.is_valid(edge_key, self.edge_fingerprints.get(edge_key)) \
+            and self.intermediate_store.exists(case_edge)
+
+    def load(self, case_edge, columns=None):
+        return self.intermediate_store.load(case_edge, columns=columns)
+
+    def save(self, case_edge, df_instances):
+        self.intermediate_store.save(case_edge, df_instances)
+        edge_key = get_edge_key(case_edge)
+        self.manifest.update(edge_key, self.edge_fingerprints.get(edge_key))
+        self.nr_unflushed += 1
+        if self.nr_unflushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.manifest.save()
+        self.nr_unflushed = 0
@@ -0,0 +1,110 @@
+import os
+import re
+from urllib.parse import quote
+
+import pandas as pd
+
+
+def get_edge_names(case_edge):
+    """
+    Source and sink name of a case edge, (activity1, activity2) for BPIC15 and
+    ((activity1, lifecycle1), (activity2, lifecycle2)) for BPIC17
+    """
+    if isinstance(case_edge[0], (tuple, list)):
+        return f"{case_edge[0][0]}-{case_edge[0][1]}", f"{case_edge[1][0]}-{case_edge[1][1]}"
+    return case_edge[0], case_edge[1]
+
+
+class PickleIntermediateStore:
+    """
+    Stores the instances of every case edge in a separate pickle file
+    """
+
+    def __init__(self, intermediate_output_directory):
+        self.intermediate_output_directory = intermediate_output_directory
+
+    def get_filepath(self, case_edge):
+        if isinstance(case_edge[0], (tuple, list)):
+            try:
+                str_case_edge = f"{case_edge[0][0]}-{case_edge[0][1]}_{case_edge[1][0]}-{case_edge[1][1]}"
+            except IndexError:
+                print("Your tuple does not have that index")
+            return f"{self.intermediate_output_directory}actor_behavior_{str_case_edge}.pkl"
+
+        try:
+            str_case_edge = f"{case_edge[0]}_{case_edge[1]}"
+        except IndexError:
+            print("Invalid edge tuple structure:", case_edge)
+
+        # Sanitize filename
+        safe_edge_name = re.sub(r'[\\/:*?"<>|]', '_', str_case_edge)
+        return f"{self.intermediate_output_directory}actor_behavior_{safe_edge_name}.pkl"
+
+    def exists(self, case_edge):
+        return os.path.exists(self.get_filepath(case_edge))
+
+    def load(self, case_edge, columns=None):
+        df_instances = pd.read_pickle(self.get_filepath(case_edge))
+        return df_instances[columns] if columns is not None else df_instances
+
+    def save(self, case_edge, df_instances):
+        df_instances.to_pickle(self.get_filepath(case_edge))
+
+
+class ParquetIntermediateStore:
+    """
+    Stores the instances of all case edges in a single Parquet dataset, hive-partitioned by source and sink
+    activity. Edges are reloaded through memory-mapped files, optionally reading only the requested columns.
+    """
+
+    def __init__(self, intermediate_output_directory, compression: str = "zstd"):
+        # fail early if pyarrow is not installed
+        import pyarrow  # noqa: F401
+
+        self.dataset_directory = os.path.join(intermediate_output_directory, "actor_behavior.parquet")
+        self.compression = compression
+
+    def get_partition_directory(self, case_edge):
+        source, sink = get_edge_names(case_edge)
+        return os.path.join(self.dataset_directory, f"source={quote(source, safe='')}", f"sink={quote(sink, safe='')}")
+
+    def get_filepath(self, case_edge):
+        return os.path.join(self.get_partition_directory(case_edge), "part-0.parquet")
+
+    def exists(self, case_edge):
+        return os.path.exists(self.get_filepath(case_edge))
+
+    def load(self, case_edge, columns=None):
+        import pyarrow.parquet as pq
+
+        return pq.read_table(self.get_filepath(case_edge), columns=columns, memory_map=True).to_pandas()
+
+    def save(self, case_edge, df_instances):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(self.get_partition_directory(case_edge), exist_ok=True)
+        table = pa.Table.from_pandas(df_instances, preserve_index=False)
+        pq.write_table(table, self.get_filepath(case_edge), compression=self.compression)
+
+    def load_dataset(self, case_edges=None, columns=None):
+        """
+        Read the instances of several case edges at once, including the source and sink partition columns
+        """
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(self.dataset_directory, format="parquet", partitioning="hive")
+        edge_filter = None
+        for case_edge in case_edges if case_edges is not None else []:
+            source, sink = get_edge_names(case_edge)
+            expression = (ds.field("source") == source) & (ds.field("sink") == sink)
+            edge_filter = expression if edge_filter is None else edge_filter | expression
+        return dataset.to_table(columns=columns, filter=edge_filter).to_pandas()
+
+
+def create_intermediate_store(intermediate_format, intermediate_output_directory):
+    if intermediate_format == "pickle":
+        return PickleIntermediateStore(intermediate_output_directory)
+    elif intermediate_format == "parquet":
+        return ParquetIntermediateStore(intermediate_output_directory)
+    raise ValueError(f"Unknown intermediate format '{intermediate_format}'")
@@ -0,0 +1,196 @@
+import re
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+
+class RunningStatistics:
+    """
+    Count, mean, variance, min and max of a stream of values, updated per chunk and mergeable with the parallel
+    variant of Welford's algorithm (Chan et al.)
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        chunk_mean = values.mean()
+        self._combine(len(values), chunk_mean, ((values - chunk_mean) ** 2).sum(), values.min(), values.max())
+
+    def merge(self, other: "RunningStatistics"):
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    def _combine(self, count, mean, m2, minimum, maximum):
+        total_count = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total_count
+        self.m2 += m2 + delta ** 2 * self.count * count / total_count
+        self.count = total_count
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    def get(self, agg_func):
+        if agg_func == "count":
+            return self.count
+        if not self.count:
+            return np.nan
+        if agg_func == "mean":
+            return self.mean
+        if agg_func == "sum":
+            return self.mean * self.count
+        if agg_func == "min":
+            return self.min
+        if agg_func == "max":
+            return self.max
+        # sample variance, as computed by pandas
+        variance = self.m2 / (self.count - 1) if self.count > 1 else np.nan
+        if agg_func == "var":
+            return variance
+        if agg_func == "std":
+            return np.sqrt(variance)
+        raise ValueError(f"Aggregation function '{agg_func}' cannot be computed on a stream")
+
+
+class KLLSketch:
+    """
+    Mergeable quantile sketch (Karnin, Lang and Liberty, 2016). Retains O(k log(n / k)) values in compactors of
+    growing weight, with a rank error of roughly 1.7 / k. Quantiles are exact as long as nothing was compacted.
+    """
+
+    def __init__(self, k: int = 200, seed: int = 0):
+        self.k = k
+        self.rng = np.random.default_rng(seed)
+        self.compactors = [np.empty(0)]
+        self.count = 0
+
+    def _capacity(self, height):
+        depth = len(self.compactors) - height - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        while sum(len(compactor) for compactor in self.compactors) > \
+                sum(self._capacity(height) for height in range(len(self.compactors))):
+            height = next(height for height, compactor in enumerate(self.compactors)
+                          if len(compactor) >= self._capacity(height))
+            if height + 1 == len(self.compactors):
+                self.compactors.append(np.empty(0))
+            values = np.sort(self.compactors[height])
+            # promote every other value of an even number of values with double weight, an odd value stays behind
+            nr_compacted = len(values) - len(values) % 2
+            offset = self.rng.integers(2)
+            self.compactors[height + 1] = np.concatenate([self.compactors[height + 1],
+                                                          values[offset:nr_compacted:2]])
+            self.compactors[height] = values[nr_compacted:]
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.compactors[0] = np.concatenate([self.compactors[0], values])
+        self.count += len(values)
+        self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        for height, compactor in enumerate(other.compactors):
+            if height == len(self.compactors):
+                self.compactors.append(np.empty(0))
+            self.compactors[height] = np.concatenate([self.compactors[height], compactor])
+        self.count += other.count
+        self._compress()
+
+    def quantile(self, q: float):
+        if not self.count:
+            return np.nan
+        if len(self.compactors) == 1:
+            return np.quantile(self.compactors[0], q)
+        values = np.concatenate(self.compactors)
+        weights = np.concatenate([np.full(len(compactor), 2 ** height, dtype=np.int64)
+                                  for height, compactor in enumerate(self.compactors)])
+        order = np.argsort(values, kind="stable")
+        cumulative_weights = np.cumsum(weights[order])
+        index = np.searchsorted(cumulative_weights, q * cumulative_weights[-1], side="left")
+        return values[order][min(index, len(values) - 1)]
+
+
+def get_quantile(agg_func):
+    """
+    @return: the quantile of a "median" or "p<percentile>" aggregation function (e.g. 0.95 for "p95"), None for
+    other aggregation functions
+    """
+    if agg_func == "median":
+        return 0.5
+    match = re.fullmatch(r"p(\d+(\.\d+)?)", str(agg_func))
+    return float(match.group(1)) / 100 if match else None
+
+
+def get_summary_statistic(statistics: RunningStatistics, sketch: KLLSketch, agg_func):
+    quantile = get_quantile(agg_func)
+    return sketch.quantile(quantile) if quantile is not None else statistics.get(agg_func)
+
+
+class ActorBehaviorAggregates:
+    """
+    Running aggregates of the instances of a case edge per actor behavior and over all instances ("all"), in the
+    layout of aggregate_actor_behavior. The median and other quantiles are approximated by a KLLSketch.
+    """
+
+    def __init__(self, sketch_size: int = 200):
+        self.sketch_size = sketch_size
+        self.nr_instances = Counter()
+        self.statistics = {}
+        self.sketches = {}
+
+    def _get(self, actor_behavior):
+        if actor_behavior not in self.statistics:
+            self.statistics[actor_behavior] = RunningStatistics()
+            self.sketches[actor_behavior] = KLLSketch(k=self.sketch_size)
+        return self.statistics[actor_behavior], self.sketches[actor_behavior]
+
+    def update(self, actor_behaviors, durations):
+        """
+        @param actor_behaviors: object array with the actor behavior of every instance of a chunk
+        @param durations: float array with the duration of every instance of a chunk
+        """
+        actor_behaviors = pd.Series(actor_behaviors, dtype=object)
+        durations = np.asarray(durations, dtype=np.float64)
+        # the "all" rollup covers every instance, including those without actor behavior
+        groups = [("all", np.ones(len(durations), dtype=bool))]
+        groups.extend((actor_behavior, (actor_behaviors == actor_behavior).to_numpy())
+                      for actor_behavior in actor_behaviors.dropna().unique())
+        for actor_behavior, mask in groups:
+            statistics, sketch = self._get(actor_behavior)
+            self.nr_instances[actor_behavior] += int(mask.sum())
+            statistics.update(durations[mask])
+            sketch.update(durations[mask])
+
+    def merge(self, other: "ActorBehaviorAggregates"):
+        for actor_behavior in other.statistics:
+            statistics, sketch = self._get(actor_behavior)
+            self.nr_instances[actor_behavior] += other.nr_instances[actor_behavior]
+            statistics.merge(other.statistics[actor_behavior])
+            sketch.merge(other.sketches[actor_behavior])
+
+    def to_frame(self, agg_funcs, duration_col):
+        column_tuples = [("actor_behavior", "count"), ("actor_behavior", "percentage")]
+        column_tuples.extend((duration_col, str(func)) for func in agg_funcs)
+        columns = pd.MultiIndex.from_tuples(column_tuples)
+        if not self.nr_instances["all"]:
+            return pd.DataFrame(columns=columns)
+
+        actor_behaviors = sorted(self.statistics)
+        rows = []
+        for actor_behavior in actor_behaviors:
+            statistics, sketch = self.statistics[actor_behavior], self.sketches[actor_behavior]
+            row = [self.nr_instances[actor_behavior], self.nr_instances[actor_behavior] / self.nr_instances["all"]]
+            row.extend(get_summary_statistic(statistics, sketch, func) for func in agg_funcs)
+            rows.append(row)
+        return pd.DataFrame(rows, columns=columns, index=pd.Index(actor_behaviors, name="actor_behavior"))
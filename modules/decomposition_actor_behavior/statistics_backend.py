@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from modules.decomposition_actor_behavior.running_aggregates import KLLSketch, RunningStatistics, get_quantile, \
+    get_summary_statistic
+
+# duration statistics of the exact and approximate backends, "median" and "p<percentile>" are quantiles
+DEFAULT_QUANTILE_AGG_FUNCS = ["mean", "p50", "p90", "p95", "p99", "min", "max", "std", "count"]
+
+
+def aggregate_durations(df_instances, keys, duration_col, agg_funcs, statistics_backend="pandas",
+                        sketch_size=200):
+    """
+    Aggregate the durations of the instances per group
+    @param keys: grouping keys, as accepted by DataFrame.groupby
+    @param statistics_backend: "pandas" applies agg_funcs with a pandas groupby, "exact" computes all statistics
+    and quantiles with a single sort of all groups, "approximate" computes the quantiles with a KLLSketch per group
+    @return: DataFrame with one column per aggregation function, indexed like a groupby over the keys
+    """
+    grouped = df_instances.groupby(keys)
+    if statistics_backend == "pandas":
+        return grouped[duration_col].agg(agg_funcs)
+
+    index = grouped.size().index
+    # instances with a missing key belong to no group
+    codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    values = df_instances[duration_col].to_numpy(dtype=np.float64)
+    if statistics_backend == "exact":
+        statistics = get_exact_group_statistics(codes, values, len(index), agg_funcs)
+    elif statistics_backend == "approximate":
+        statistics = get_approximate_group_statistics(codes, values, len(index), agg_funcs, sketch_size)
+    else:
+        raise ValueError(f"Unknown statistics backend '{statistics_backend}'")
+    return pd.DataFrame(statistics, index=index)
+
+
+def get_exact_group_statistics(codes, values, nr_groups, agg_funcs):
+    """
+    Exact statistics of the values per group code (codes below zero are ignored), computed from one lexicographic
+    sort of all values such that all quantiles are read off at once. Quantiles interpolate linearly like pandas.
+    @return: dictionary from aggregation function to an array with its value per group
+    """
+    valid = (codes >= 0) & ~np.isnan(values)
+    codes, values = codes[valid], values[valid]
+    sorted_values = values[np.lexsort((values, codes))]
+    counts = np.bincount(codes, minlength=nr_groups)
+    starts = np.cumsum(counts) - counts
+    non_empty = counts > 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sums = np.bincount(codes, weights=values, minlength=nr_groups)
+        means = sums / counts
+        variances = np.bincount(codes, weights=(values - means[codes]) ** 2, minlength=nr_groups) / (counts - 1)
+    variances[counts < 2] = np.nan
+
+    def read_sorted(positions):
+        result = np.full(nr_groups, np.nan)
+        result[non_empty] = sorted_values[positions[non_empty]]
+        return result
+
+    statistics = {}
+    for agg_func in agg_funcs:
+        quantile = get_quantile(agg_func)
+        if quantile is not None:
+            positions = starts + quantile * np.maximum(counts - 1, 0)
+            lower = np.floor(positions).astype(np.int64)
+            upper = np.ceil(positions).astype(np.int64)
+            lower_values, upper_values = read_sorted(lower), read_sorted(upper)
+            statistics[agg_func] = lower_values + (upper_values - lower_values) * (positions - lower)
+        elif agg_func == "count":
+            statistics[agg_func] = counts
+        elif agg_func == "sum":
+            statistics[agg_func] = sums
+        elif agg_func == "mean":
+            statistics[agg_func] = means
+        elif agg_func == "min":
+            statistics[agg_func] = read_sorted(starts)
+        elif agg_func == "max":
+            statistics[agg_func] = read_sorted(starts + counts - 1)
+        elif agg_func == "var":
+            statistics[agg_func] = variances
+        elif agg_func == "std":
+            statistics[agg_func] = np.sqrt(variances)
+        else:
+            raise ValueError(f"Aggregation function '{agg_func}' is not supported by the exact backend")
+    return statistics
+
+
+def get_group_sketches(codes, values, nr_groups, sketch_size=200):
+    """
+    Summarize the values per group code in running statistics and a quantile sketch, which can be merged with the
+    summaries of other chunks, edges or workers
+    @return: list with a (RunningStatistics, KLLSketch) tuple per group
+    """
+    valid = codes >= 0
+    codes, values = codes[valid], values[valid]
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(nr_groups + 1))
+    summaries = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        statistics, sketch = RunningStatistics(), KLLSketch(k=sketch_size)
+        statistics.update(values[order[start:end]])
+        sketch.update(values[order[start:end]])
+        summaries.append((statistics, sketch))
+    return summaries
+
+
+def get_approximate_group_statistics(codes, values, nr_groups, agg_funcs, sketch_size=200):
+    summaries = get_group_sketches(codes, values, nr_groups, sketch_size)
+    return {agg_func: np.array([get_summary_statistic(statistics, sketch, agg_func)
+                                for statistics, sketch in summaries])
+            for agg_func in agg_funcs}
@@ -0,0 +1,310 @@
+import re
+from datetime import timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from DescriptionCache import get_dataset_descriptions, get_semantic_header
+
+# entity types of the local graph per dataset: the event attributes holding the identifier of the entity, each with
+# the condition on the event record under which the event is correlated to the entity, as in the semantic header
+LOCAL_ENTITIES = {
+    "BPIC15": {
+        "Application": [("caseId", None)],
+        "Resource": [("resourceId", None)]
+    },
+    "BPIC17": {
+        "Application": [("case", "eventOrigin == 'Application'")],
+        "Workflow": [("case", "eventOrigin == 'Workflow'")],
+        "Offer": [("eventId", "eventOrigin == 'Offer' and eventId.str.startswith('Offer_', na=False)"),
+                  ("offerId", "eventOrigin == 'Offer' and eventId.str.startswith('OfferState_', na=False)")],
+        "Resource": [("resourceId", None)],
+        "CaseAWO": [("case", None)]
+    }
+}
+EVENT_PROPERTIES = {"BPIC15": ["timestamp", "activity"], "BPIC17": ["timestamp", "activity", "lifecycle"]}
+ACTIVITY_PROPERTIES = {"BPIC15": ["activity", "code"], "BPIC17": ["activity", "lifecycle"]}
+# case and resource entity of the task instances, as in main_functionalities.build_tasks
+TASK_ENTITIES = {"BPIC15": ("Application", "Resource"), "BPIC17": ("CaseAWO", "Resource")}
+
+JAVA_DATETIME_DIRECTIVES = {"y": "%Y", "M": "%m", "d": "%d", "H": "%H", "m": "%M", "s": "%S", "n": "%f", "X": ""}
+
+
+class LocalGraph:
+    """
+    In-process event knowledge graph. The nodes are kept in a table per label and the relationships in a table per
+    type with the ids of their start and end node, both indexed by their id. Every node has a single label, the
+    entity nodes are stored under their entity type.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.relationships = {}
+        self._next_node_id = 0
+        self._next_relationship_id = 0
+
+    def add_nodes(self, label, properties: pd.DataFrame) -> np.ndarray:
+        ids = np.arange(self._next_node_id, self._next_node_id + len(properties), dtype=np.int64)
+        self._next_node_id += len(properties)
+        nodes = properties.set_axis(pd.Index(ids, name="id"))
+        self.nodes[label] = pd.concat([self.nodes[label], nodes]) if label in self.nodes else nodes
+        return ids
+
+    def add_relationships(self, relationship_type, start, end, properties: dict = None) -> np.ndarray:
+        ids = np.arange(self._next_relationship_id, self._next_relationship_id + len(start), dtype=np.int64)
+        self._next_relationship_id += len(start)
+        relationships = pd.DataFrame({"start": np.asarray(start, dtype=np.int64),
+                                      "end": np.asarray(end, dtype=np.int64), **(properties or {})},
+                                     index=pd.Index(ids, name="id"))
+        if relationship_type in self.relationships:
+            relationships = pd.concat([self.relationships[relationship_type], relationships])
+        self.relationships[relationship_type] = relationships
+        return ids
+
+    def merge_relationships(self, relationship_type, start, end, match: dict = None,
+                            on_create: dict = None) -> np.ndarray:
+        """
+        Create the relationships (start)-[:relationship_type match]->(end) that do not exist yet, like MERGE
+        @param on_create: properties of the created relationships, as arrays aligned with start and end
+        @return: ids of the created relationships
+        """
+        start = np.asarray(start, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+        existing = self.get_relationships(relationship_type)
+        for name, value in (match or {}).items():
+            existing = existing[existing[name] == value] if name in existing.columns else existing.iloc[:0]
+        # the first of several rows with the same start and end node creates the relationship, the others match it
+        new = ~pairs_isin(start, end, existing["start"].to_numpy(), existing["end"].to_numpy()) & \
+            ~pd.DataFrame({"start": start, "end": end}).duplicated().to_numpy()
+        properties = {name: np.full(new.sum(), value, dtype=object) for name, value in (match or {}).items()}
+        properties.update({name: np.asarray(values)[new] for name, values in (on_create or {}).items()})
+        return self.add_relationships(relationship_type, start[new], end[new], properties)
+
+    def get_nodes(self, label) -> pd.DataFrame:
+        if label not in self.nodes:
+            return pd.DataFrame(index=pd.Index([], dtype=np.int64, name="id"))
+        return self.nodes[label]
+
+    def get_relationships(self, relationship_type) -> pd.DataFrame:
+        if relationship_type not in self.relationships:
+            return pd.DataFrame({"start": np.zeros(0, dtype=np.int64), "end": np.zeros(0, dtype=np.int64)},
+                                index=pd.Index([], dtype=np.int64, name="id"))
+        return self.relationships[relationship_type]
+
+    def get_node_property(self, label, ids, name):
+        """
+        @return: array of the property of the nodes with the given ids, with the dtype of the property column
+        """
+        nodes = self.get_nodes(label)
+        if name not in nodes.columns:
+            return np.full(len(ids), None, dtype=object)
+        return nodes[name].reindex(ids).array
+
+    def set_node_property(self, label, ids, name, value):
+        nodes = self.nodes[label]
+        if name not in nodes.columns:
+            nodes[name] = pd.Series(None, index=nodes.index, dtype=object)
+        nodes.loc[ids, name] = value
+
+    def set_relationship_property(self, relationship_type, ids, name, value):
+        relationships = self.relationships[relationship_type]
+        if name not in relationships.columns:
+            relationships[name] = pd.Series(None, index=relationships.index, dtype=object)
+        relationships.loc[ids, name] = value
+
+    def remove_relationship_property(self, relationship_type, ids, name):
+        if name in self.get_relationships(relationship_type).columns:
+            self.relationships[relationship_type].loc[ids, name] = None
+
+    def delete_relationships(self, relationship_type, ids):
+        if relationship_type in self.relationships:
+            self.relationships[relationship_type] = self.relationships[relationship_type].drop(index=ids)
+
+    def get_correlations(self, entity_type) -> pd.DataFrame:
+        """
+        @return: the CORR relationships to nodes of entity_type, i.e. (node)-[:CORR]->(n:entity_type)
+        """
+        correlations = self.get_relationships("CORR")
+        return correlations[correlations["end"].isin(self.get_nodes(entity_type).index)]
+
+    @staticmethod
+    def from_event_table(events: pd.DataFrame, dataset_name: str, corr_types: dict = None):
+        """
+        Build the event knowledge graph of main.py from an event table instead of with the import and transform
+        queries of promg: Event and Activity nodes, the entity nodes of LOCAL_ENTITIES with their correlation and
+        directly-follows relationships, and the task instances of the case and resource entity of the dataset
+        @param events: event table with the attributes of the dataset description, with parsed timestamps
+        @param corr_types: relationship type correlating the events to each entity type, CORR if not given
+        """
+        corr_types = corr_types or {}
+        graph = LocalGraph()
+        events = events.reset_index(drop=True)
+        event_properties = [name for name in EVENT_PROPERTIES[dataset_name] if name in events.columns]
+        event_ids = graph.add_nodes("Event", events[event_properties])
+
+        activity_properties = [name for name in ACTIVITY_PROPERTIES[dataset_name] if name in events.columns]
+        activities = events[activity_properties].drop_duplicates().reset_index(drop=True)
+        activity_ids = graph.add_nodes("Activity", activities)
+        observed = events[activity_properties].reset_index().merge(
+            activities.assign(activity_id=activity_ids), on=activity_properties)
+        graph.add_relationships("OBSERVED", observed["activity_id"].to_numpy(),
+                                event_ids[observed["index"].to_numpy()])
+
+        for entity_type, correlations in LOCAL_ENTITIES[dataset_name].items():
+            entity_events = []
+            for column, condition in correlations:
+                if column not in events.columns:
+                    continue
+                correlated = events.query(condition, engine="python") if condition is not None else events
+                correlated = correlated[column].dropna()
+                entity_events.append(pd.DataFrame({"event": event_ids[correlated.index.to_numpy()],
+                                                   "sysId": correlated.to_numpy()}))
+            if entity_events:
+                graph.add_entity(entity_type, pd.concat(entity_events).drop_duplicates(),
+                                 corr_type=corr_types.get(entity_type, "CORR"))
+
+        case, resource = TASK_ENTITIES[dataset_name]
+        graph.identify_tasks(case=case, resource=resource)
+        return graph
+
+    def add_entity(self, entity_type, entity_events: pd.DataFrame, corr_type="CORR"):
+        """
+        Create the entity nodes of entity_type, correlate the events to them with corr_type relationships and create
+        the df-relationships DF_<ENTITY_TYPE> between subsequent events of each entity
+        @param entity_events: DataFrame with columns event and sysId
+        """
+        sys_ids, entities = pd.factorize(entity_events["sysId"])
+        entity_ids = self.add_nodes(entity_type, pd.DataFrame({"sysId": entities}))
+        events = entity_events["event"].to_numpy(dtype=np.int64)
+        entity_ids = entity_ids[sys_ids]
+        self.add_relationships(corr_type, events, entity_ids)
+
+        timestamps = get_epoch_nanoseconds(self.get_node_property("Event", events, "timestamp"))
+        order = np.lexsort((events, timestamps, entity_ids))
+        events = events[order]
+        same_entity = entity_ids[order][1:] == entity_ids[order][:-1]
+        # events correlated to several entities of the same type have a single df-relationship with their count
+        df_edges = pd.DataFrame({"e1": events[:-1][same_entity], "e2": events[1:][same_entity]}) \
+            .value_counts(sort=False).reset_index(name="count")
+        self.add_relationships(f"DF_{entity_type.upper()}", df_edges["e1"].to_numpy(), df_edges["e2"].to_numpy(),
+                               {"entityType": entity_type, "type": "DF", "count": df_edges["count"].to_numpy()})
+
+    def identify_tasks(self, case, resource):
+        """
+        Create the task instances like promg's TaskIdentification: the maximal paths of DF_JOINT relationships,
+        i.e. df-relationships of both the resource and the case, split per date, and the events with a CORR
+        relationship to a resource outside such a path; then correlate the task instances to the case and resource
+        entities of their events and create the df-relationships DF_TI_<entity type> between subsequent task
+        instances of each entity
+        """
+        resource_df = self.get_relationships(f"DF_{resource.upper()}")
+        case_df = self.get_relationships(f"DF_{case.upper()}")
+        joint = resource_df[pairs_isin(resource_df["start"].to_numpy(), resource_df["end"].to_numpy(),
+                                       case_df["start"].to_numpy(), case_df["end"].to_numpy())] \
+            .drop_duplicates("end").drop_duplicates("start")
+        events = np.unique(np.concatenate([joint["start"].to_numpy(), joint["end"].to_numpy(),
+                                           self.get_correlations(resource)["start"].to_numpy()]))
+        events = events[np.isin(events, self.get_nodes("Event").index)]
+        timestamps = self.get_node_property("Event", events, "timestamp")
+        order = np.lexsort((events, get_epoch_nanoseconds(timestamps)))
+        events, timestamps = events[order], timestamps[order]
+        dates = pd.DatetimeIndex(timestamps).normalize()
+
+        # every event points to its DF_JOINT predecessor on the same date, the first event of the path to itself;
+        # pointer jumping resolves the first event of the path of every event
+        positions = pd.Series(np.arange(len(events)), index=events)
+        predecessors = positions.reindex(pd.Series(joint["start"].to_numpy(), index=joint["end"].to_numpy())
+                                         .reindex(events).to_numpy()).to_numpy()
+        first = np.arange(len(events))
+        has_predecessor = ~np.isnan(predecessors)
+        first[has_predecessor] = predecessors[has_predecessor].astype(np.int64)
+        first[dates[first] != dates] = np.arange(len(events))[dates[first] != dates]
+        while (first[first] != first).any():
+            first = first[first]
+        task_instances = pd.factorize(first)[0]
+
+        activities = self.get_node_property("Event", events, "activity")
+        lifecycles = self.get_node_property("Event", events, "lifecycle")
+        # activity+'+'+lifecycle as in promg, null for events without lifecycle
+        variant_steps = [f"{activity}+{lifecycle}" if isinstance(lifecycle, str) else None
+                         for activity, lifecycle in zip(activities, lifecycles)]
+        grouped = pd.DataFrame({"task_instance": task_instances, "timestamp": timestamps,
+                                "variant": variant_steps}).groupby("task_instance", sort=True)
+        task_instance_ids = self.add_nodes("TaskInstance", pd.DataFrame({
+            "variant": grouped["variant"].agg(list).to_numpy(),
+            "start_time": grouped["timestamp"].first().array,
+            "end_time": grouped["timestamp"].last().array}))
+        self.add_relationships("CONTAINS", task_instance_ids[task_instances], events)
+
+        for entity_type in (resource, case):
+            correlations = self.get_correlations(entity_type)
+            task_instance_entities = pd.DataFrame({"task_instance": task_instance_ids[task_instances],
+                                                   "event": events}) \
+                .merge(correlations, left_on="event", right_on="start")[["task_instance", "end"]].drop_duplicates()
+            self.add_relationships("CORR", task_instance_entities["task_instance"].to_numpy(),
+                                   task_instance_entities["end"].to_numpy())
+
+            start_times = get_epoch_nanoseconds(self.get_node_property(
+                "TaskInstance", task_instance_entities["task_instance"].to_numpy(), "start_time"))
+            ordered = task_instance_entities.assign(start_time=start_times) \
+                .sort_values(["end", "start_time", "task_instance"])
+            same_entity = ordered["end"].to_numpy()[1:] == ordered["end"].to_numpy()[:-1]
+            ordered_task_instances = ordered["task_instance"].to_numpy()
+            self.add_relationships(f"DF_TI_{entity_type}", ordered_task_instances[:-1][same_entity],
+                                   ordered_task_instances[1:][same_entity])
+
+
+def pairs_isin(left1, left2, right1, right2) -> np.ndarray:
+    if len(left1) == 0:
+        return np.zeros(0, dtype=bool)
+    return pd.MultiIndex.from_arrays([left1, left2]).isin(pd.MultiIndex.from_arrays([right1, right2]))
+
+
+def get_epoch_nanoseconds(timestamps) -> np.ndarray:
+    """
+    @return: the timestamps as nanoseconds since the epoch (UTC)
+    """
+    return pd.DatetimeIndex(timestamps).as_unit("ns").asi8
+
+
+def get_strptime_format(datetime_format):
+    """
+    Translate the Java datetime format of a dataset description (e.g. y/M/d H:m:s.nX) into a strptime format, the
+    zone offset X is left out since the timezone offset is applied separately
+    """
+    return re.sub(r"([yMdHmsnX])\1*", lambda match: JAVA_DATETIME_DIRECTIVES[match.group(1)], datetime_format)
+
+
+def parse_timestamps(values: pd.Series, datetime_format, timezone_offset="") -> pd.Series:
+    timestamps = pd.to_datetime(values, format=get_strptime_format(datetime_format), errors="coerce")
+    offset = re.fullmatch(r"([+-])(\d{1,2}):?(\d{2})?", timezone_offset or "")
+    if offset is None:
+        return timestamps
+    sign = -1 if offset.group(1) == "-" else 1
+    tz = timezone(sign * timedelta(hours=int(offset.group(2)), minutes=int(offset.group(3) or 0)))
+    return timestamps.dt.tz_localize(tz)
+
+
+def load_event_table(config) -> pd.DataFrame:
+    """
+    Read the event tables of the dataset description of config like promg's importer does and parse their
+    timestamp attributes
+    """
+    dataset_descriptions = get_dataset_descriptions(config=config)
+    event_tables = []
+    for structure in dataset_descriptions.structures:
+        for file_name in structure.file_names:
+            df_log = structure.prepare_event_data_sets(file_name, config.use_sample)
+            for attribute_name, datetime_object in structure.get_datetime_formats().items():
+                if attribute_name in df_log.columns:
+                    df_log[attribute_name] = parse_timestamps(df_log[attribute_name], datetime_object.format,
+                                                              datetime_object.timezone_offset)
+            event_tables.append(df_log)
+    return pd.concat(event_tables, ignore_index=True)
+
+
+def load_local_graph(config, dataset_name) -> LocalGraph:
+    semantic_header = get_semantic_header(config=config)
+    corr_types = {entity_type: semantic_header.get_entity(entity_type).get_corr_type_strings()
+                  for entity_type in LOCAL_ENTITIES[dataset_name]}
+    return LocalGraph.from_event_table(load_event_table(config), dataset_name=dataset_name, corr_types=corr_types)
@@ -0,0 +1,600 @@
+import pandas as pd
+from neo4j.time import Duration
+
+from modules.custom_queries.delay_analysis import PerformanceAnalyzeDelaysQueryLibrary as dql
+from modules.custom_queries.df_interactions import InferDFInteractionsQueryLibrary as iql
+from modules.custom_queries.discovery_dfg import DiscoverDFGQueryLibrary as dfgql
+from modules.decomposition_actor_behavior.actor_behavior_engine import ColumnarActorBehaviorEngine
+from modules.local_graph.local_graph import get_epoch_nanoseconds, pairs_isin
+from queries.compact_event_graph import CompactEventGraphQueryLibrary as cql
+from queries.decomposition_actor_behavior import DecompositionActorBehaviorQueryLibrary as ql
+from queries.index_provisioning import IndexProvisioningQueryLibrary as ipql
+
+# native implementation per query function, keyed by the qualified name of the query function
+LOCAL_QUERIES = {}
+
+
+def local_query(*query_functions):
+    """
+    Register the decorated function as the native implementation of the query functions on a LocalGraph. The
+    implementation is called with the graph and the keyword arguments of the query function and returns the records
+    of the query as dictionaries.
+    """
+    def register(implementation):
+        for query_function in query_functions:
+            LOCAL_QUERIES[query_function.__qualname__] = implementation
+        return implementation
+    return register
+
+
+def get_local_query(query_function):
+    if query_function.__qualname__ not in LOCAL_QUERIES:
+        raise NotImplementedError(f"Query {query_function.__qualname__} has no implementation on the local graph")
+    return LOCAL_QUERIES[query_function.__qualname__]
+
+
+def to_records(dataframe: pd.DataFrame):
+    # missing values are returned as None, like the driver does
+    return dataframe.astype(object).where(dataframe.notna(), None).to_dict("records")
+
+
+def get_durations(start_times, end_times):
+    """
+    @return: duration.inSeconds(start_time, end_time) per pair as neo4j.time.Duration
+    """
+    nanoseconds = get_epoch_nanoseconds(end_times) - get_epoch_nanoseconds(start_times)
+    return [Duration(nanoseconds=int(value)) for value in nanoseconds]
+
+
+def get_event_relationships(graph, relationship_type, event_label="Event"):
+    """
+    @return: the relationships (e1:event_label)-[:relationship_type]->(e2:event_label)
+    """
+    relationships = graph.get_relationships(relationship_type)
+    events = graph.get_nodes(event_label).index
+    return relationships[relationships["start"].isin(events) & relationships["end"].isin(events)]
+
+
+def get_observed_activities(graph, events):
+    """
+    @return: id of the Activity node that observed each event, (c:Activity)-[:OBSERVED]->(e)
+    """
+    observed = graph.get_relationships("OBSERVED")
+    return pd.Series(observed["start"].to_numpy(), index=observed["end"].to_numpy()).reindex(events).to_numpy()
+
+
+def get_case_df_instances(graph, case) -> pd.DataFrame:
+    """
+    @return: the case df-edges with the activity, lifecycle and timestamp of their events and their actor behavior
+    """
+    case_df = get_event_relationships(graph, case.get_df_label())
+    e1 = case_df["start"].to_numpy()
+    e2 = case_df["end"].to_numpy()
+    return pd.DataFrame({
+        "df_id": case_df.index.to_numpy(), "e1": e1, "e2": e2,
+        "activity1": graph.get_node_property("Event", e1, "activity"),
+        "lifecycle1": graph.get_node_property("Event", e1, "lifecycle"),
+        "activity2": graph.get_node_property("Event", e2, "activity"),
+        "lifecycle2": graph.get_node_property("Event", e2, "lifecycle"),
+        "timestamp1": graph.get_node_property("Event", e1, "timestamp"),
+        "timestamp2": graph.get_node_property("Event", e2, "timestamp"),
+        "actor_behavior": case_df["actor_behavior"].to_numpy() if "actor_behavior" in case_df.columns else None,
+        "actor_behavior_pending": case_df["actor_behavior_pending"].to_numpy()
+        if "actor_behavior_pending" in case_df.columns else None
+    })
+
+
+def get_actor_behavior_engine(graph, case, resource, case_df: pd.DataFrame = None) -> ColumnarActorBehaviorEngine:
+    """
+    @param case_df: the case df-edges to classify, by default all of them
+    @return: ColumnarActorBehaviorEngine on the tables of the graph
+    """
+    if case_df is None:
+        case_df = get_event_relationships(graph, case.get_df_label())
+    resource_df = get_event_relationships(graph, resource.get_df_label())
+    event_resources = graph.get_correlations(resource.type)
+    event_resources = event_resources[event_resources["start"].isin(graph.get_nodes("Event").index)]
+    contains = graph.get_relationships("CONTAINS")
+    task_instances = graph.get_nodes("TaskInstance")
+    df_ti = graph.get_relationships(resource.get_df_ti_label())
+    return ColumnarActorBehaviorEngine(
+        case_df=pd.DataFrame({"df_id": case_df.index.to_numpy(), "e1": case_df["start"].to_numpy(),
+                              "e2": case_df["end"].to_numpy(),
+                              "actor_behavior": case_df["actor_behavior"].to_numpy()
+                              if "actor_behavior" in case_df.columns else None}),
+        resource_df=pd.DataFrame({"e1": resource_df["start"].to_numpy(), "e2": resource_df["end"].to_numpy()}),
+        event_resources=pd.DataFrame({"event": event_resources["start"].to_numpy(),
+                                      "resource": event_resources["end"].to_numpy()}),
+        task_instance_events=pd.DataFrame({"task_instance": contains["start"].to_numpy(),
+                                           "event": contains["end"].to_numpy()}),
+        task_instance_intervals=pd.DataFrame({
+            "task_instance": task_instances.index.to_numpy(),
+            "start_time": pd.array(get_epoch_nanoseconds(task_instances["start_time"]), dtype="Int64"),
+            "end_time": pd.array(get_epoch_nanoseconds(task_instances["end_time"]), dtype="Int64")}),
+        df_ti=pd.DataFrame({"task_instance1": df_ti["start"].to_numpy(), "task_instance2": df_ti["end"].to_numpy()}))
+
+
+def set_actor_behavior(graph, case, classification: pd.DataFrame, pending: bool = False):
+    classified = classification[classification["actor_behavior"].notna()]
+    graph.set_relationship_property(case.get_df_label(), classified["df_id"].to_numpy(), "actor_behavior",
+                                    classified["actor_behavior"].to_numpy())
+    if pending:
+        # also the df-edges without actor behavior, their case edge still has to be updated
+        graph.set_relationship_property(case.get_df_label(), classification["df_id"].to_numpy(),
+                                        "actor_behavior_pending", True)
+
+
+def add_actor_behavior(actor_behavior):
+    def add_actor_behavior_query(graph, case, resource):
+        engine = get_actor_behavior_engine(graph, case, resource)
+        df_ids = engine.case_df["df_id"].to_numpy()[engine.get_conditions()[actor_behavior]]
+        graph.set_relationship_property(case.get_df_label(), df_ids, "actor_behavior", actor_behavior)
+    return add_actor_behavior_query
+
+
+local_query(ql.q_add_actor_behavior_continuation)(add_actor_behavior("continuation"))
+local_query(ql.q_add_actor_behavior_interruption)(add_actor_behavior("interruption"))
+local_query(ql.q_add_actor_behavior_handover_idle)(add_actor_behavior("handover_idle"))
+local_query(ql.q_add_actor_behavior_handover_prioritized)(add_actor_behavior("handover_prioritized"))
+local_query(ql.q_add_actor_behavior_handover_deprioritized)(add_actor_behavior("handover_deprioritized"))
+
+
+@local_query(ql.q_add_actor_behavior_fused)
+def add_actor_behavior_fused(graph, case, resource):
+    set_actor_behavior(graph, case, get_actor_behavior_engine(graph, case, resource).classify())
+
+
+@local_query(ql.q_add_actor_behavior_incremental)
+def add_actor_behavior_incremental(graph, case, resource):
+    case_df = get_event_relationships(graph, case.get_df_label())
+    contains = graph.get_relationships("CONTAINS")
+    task_instances = graph.get_nodes("TaskInstance")
+    if "actor_behavior_classified" in task_instances.columns:
+        unclassified = task_instances.index[task_instances["actor_behavior_classified"].isna()]
+    else:
+        unclassified = task_instances.index
+    unclassified_events = contains["end"][contains["start"].isin(unclassified)]
+    # events of the task instances whose preceding task instance of the resource was not classified
+    df_ti = graph.get_relationships(resource.get_df_ti_label())
+    successors = df_ti["end"][df_ti["start"].isin(unclassified)]
+    successor_events = contains["end"][contains["start"].isin(successors)]
+
+    selected = case_df["start"].isin(unclassified_events) | case_df["end"].isin(unclassified_events) | \
+        case_df["end"].isin(successor_events)
+    if "actor_behavior" in case_df.columns:
+        selected |= case_df["actor_behavior"].isna()
+    else:
+        selected[:] = True
+    engine = get_actor_behavior_engine(graph, case, resource, case_df=case_df[selected])
+    set_actor_behavior(graph, case, engine.classify(), pending=True)
+
+
+@local_query(ql.q_mark_task_instances_classified)
+def mark_task_instances_classified(graph):
+    task_instances = graph.get_nodes("TaskInstance")
+    if "actor_behavior_classified" in task_instances.columns:
+        unclassified = task_instances.index[task_instances["actor_behavior_classified"].isna()]
+    else:
+        unclassified = task_instances.index
+    graph.set_node_property("TaskInstance", unclassified, "actor_behavior_classified", True)
+
+
+def get_pending_df_instances(graph, case):
+    df_instances = get_case_df_instances(graph, case)
+    return df_instances[df_instances["actor_behavior_pending"].fillna(False).astype(bool)]
+
+
+@local_query(ql.q_get_pending_df_edges_activity)
+def get_pending_df_edges_activity(graph, case):
+    return to_records(get_pending_df_instances(graph, case)[["activity1", "activity2"]].drop_duplicates())
+
+
+@local_query(ql.q_get_pending_df_edges_activity_lifecycle)
+def get_pending_df_edges_activity_lifecycle(graph, case):
+    return to_records(get_pending_df_instances(graph, case)[["activity1", "lifecycle1", "activity2", "lifecycle2"]]
+                      .drop_duplicates())
+
+
+@local_query(ql.q_clear_pending_df_edges)
+def clear_pending_df_edges(graph, case):
+    pending = get_pending_df_instances(graph, case)
+    graph.remove_relationship_property(case.get_df_label(), pending["df_id"].to_numpy(), "actor_behavior_pending")
+
+
+def get_df_edge_counts(graph, case, key_columns, min_freq):
+    counts = get_case_df_instances(graph, case).groupby(key_columns, dropna=False, sort=False).size() \
+        .reset_index(name="count")
+    return to_records(counts[counts["count"] > min_freq].sort_values("count", ascending=False, kind="stable"))
+
+
+@local_query(ql.q_get_all_df_edges_activity)
+def get_all_df_edges_activity(graph, case, min_freq):
+    return get_df_edge_counts(graph, case, ["activity1", "activity2"], min_freq)
+
+
+@local_query(ql.q_get_all_df_edges_activity_lifecycle)
+def get_all_df_edges_activity_lifecycle(graph, case, min_freq):
+    return get_df_edge_counts(graph, case, ["activity1", "lifecycle1", "activity2", "lifecycle2"], min_freq)
+
+
+def get_df_edge_fingerprints(graph, case, key_columns):
+    fingerprints = get_case_df_instances(graph, case).groupby([*key_columns, "actor_behavior"], dropna=False,
+                                                              sort=False) \
+        .agg(count=("df_id", "size"), max_df_id=("df_id", "max")).reset_index()
+    return to_records(fingerprints)
+
+
+@local_query(ql.q_get_df_edge_fingerprints)
+def get_df_edge_fingerprints_bpic15(graph, case):
+    return get_df_edge_fingerprints(graph, case, ["activity1", "activity2"])
+
+
+@local_query(ql.q_get_df_edge_fingerprints_bpic17)
+def get_df_edge_fingerprints_bpic17(graph, case):
+    return get_df_edge_fingerprints(graph, case, ["activity1", "lifecycle1", "activity2", "lifecycle2"])
+
+
+def get_actor_behavior_instances(df_instances, key_columns, time_columns):
+    """
+    @return: records of the case df-edges with the key columns, the timestamps of e1 and/or e2 named as in
+    time_columns, the duration from e1 to e2 and the actor behavior
+    """
+    instances = df_instances[key_columns].copy()
+    for time_column, timestamp_column in time_columns.items():
+        instances[time_column] = df_instances[timestamp_column].to_numpy()
+    instances["duration"] = get_durations(df_instances["timestamp1"], df_instances["timestamp2"])
+    instances["actor_behavior"] = df_instances["actor_behavior"].to_numpy()
+    return to_records(instances)
+
+
+def select_edges(df_instances, key_columns, edge_keys):
+    keys = pd.MultiIndex.from_frame(df_instances[key_columns])
+    return df_instances[keys.isin(pd.MultiIndex.from_tuples([tuple(edge_key) for edge_key in edge_keys]))]
+
+
+@local_query(ql.q_get_all_actor_behavior_per_df)
+def get_all_actor_behavior_per_df(graph, case, resource, edge_tuple):
+    df_instances = select_edges(get_case_df_instances(graph, case), ["activity1", "activity2"],
+                                [(edge_tuple[0], edge_tuple[1])])
+    return get_actor_behavior_instances(df_instances, [],
+                                        {"startTime": "timestamp1", "completeTime": "timestamp2"})
+
+
+@local_query(ql.q_get_all_actor_behavior_per_df_bpic17)
+def get_all_actor_behavior_per_df_bpic17(graph, case, resource, edge_tuple):
+    df_instances = select_edges(get_case_df_instances(graph, case),
+                                ["activity1", "lifecycle1", "activity2", "lifecycle2"],
+                                [(*edge_tuple[0], *edge_tuple[1])])
+    return get_actor_behavior_instances(df_instances, [], {"time": "timestamp1"})
+
+
+@local_query(ql.q_get_all_actor_behavior_all_df)
+def get_all_actor_behavior_all_df(graph, case, resource, edge_tuples):
+    key_columns = ["activity1", "activity2"]
+    df_instances = select_edges(get_case_df_instances(graph, case), key_columns,
+                                [(edge_tuple[0], edge_tuple[1]) for edge_tuple in edge_tuples])
+    return get_actor_behavior_instances(df_instances, key_columns,
+                                        {"startTime": "timestamp1", "completeTime": "timestamp2"})
+
+
+@local_query(ql.q_get_all_actor_behavior_all_df_bpic17)
+def get_all_actor_behavior_all_df_bpic17(graph, case, resource, edge_tuples):
+    key_columns = ["activity1", "lifecycle1", "activity2", "lifecycle2"]
+    df_instances = select_edges(get_case_df_instances(graph, case), key_columns,
+                                [(*edge_tuple[0], *edge_tuple[1]) for edge_tuple in edge_tuples])
+    return get_actor_behavior_instances(df_instances, key_columns, {"time": "timestamp1"})
+
+
+def get_actor_behavior_per_df_with_actor(graph, case, resource, edge_tuple, actor_behavior):
+    df_instances = select_edges(get_case_df_instances(graph, case), ["activity1", "activity2"],
+                                [(edge_tuple[0], edge_tuple[1])])
+    df_instances = df_instances[df_instances["actor_behavior"] == actor_behavior]
+    # (e2)<-[:CONTAINS]-(ti:TaskInstance)-[:CORR]->(n:resource)
+    contains = graph.get_relationships("CONTAINS")
+    task_instance_resources = graph.get_correlations(resource.type)
+    df_instances = df_instances \
+        .merge(pd.DataFrame({"e2": contains["end"].to_numpy(), "task_instance": contains["start"].to_numpy()}),
+               on="e2") \
+        .merge(pd.DataFrame({"task_instance": task_instance_resources["start"].to_numpy(),
+                             "resource": task_instance_resources["end"].to_numpy()}), on="task_instance")
+    records = get_actor_behavior_instances(df_instances, [],
+                                           {"startTime": "timestamp1", "completeTime": "timestamp2"})
+    clusters = graph.get_node_property("TaskInstance", df_instances["task_instance"].to_numpy(), "cluster")
+    actors = graph.get_node_property(resource.type, df_instances["resource"].to_numpy(), "sysId")
+    for record, cluster, actor in zip(records, clusters, actors):
+        record["task"] = None if pd.isna(cluster) else cluster
+        record["actor"] = actor
+    return records
+
+
+@local_query(ql.q_get_continuation_per_df)
+def get_continuation_per_df(graph, case, resource, edge_tuple):
+    return get_actor_behavior_per_df_with_actor(graph, case, resource, edge_tuple, "continuation")
+
+
+@local_query(ql.q_get_interruption_per_df)
+def get_interruption_per_df(graph, case, resource, edge_tuple):
+    return get_actor_behavior_per_df_with_actor(graph, case, resource, edge_tuple, "interruption")
+
+
+@local_query(ql.q_get_case_df_edges)
+def get_case_df_edges(graph, case):
+    case_df = get_event_relationships(graph, case.get_df_label())
+    return to_records(pd.DataFrame({
+        "df_id": case_df.index.to_numpy(), "e1": case_df["start"].to_numpy(), "e2": case_df["end"].to_numpy(),
+        "actor_behavior": case_df["actor_behavior"].to_numpy() if "actor_behavior" in case_df.columns else None}))
+
+
+@local_query(ql.q_get_resource_df_edges)
+def get_resource_df_edges(graph, resource):
+    resource_df = get_event_relationships(graph, resource.get_df_label())
+    return to_records(pd.DataFrame({"e1": resource_df["start"].to_numpy(), "e2": resource_df["end"].to_numpy()}))
+
+
+@local_query(ql.q_get_event_resources)
+def get_event_resources(graph, resource):
+    event_resources = graph.get_correlations(resource.type)
+    event_resources = event_resources[event_resources["start"].isin(graph.get_nodes("Event").index)]
+    return to_records(pd.DataFrame({"event": event_resources["start"].to_numpy(),
+                                    "resource": event_resources["end"].to_numpy()}))
+
+
+@local_query(ql.q_get_task_instance_events)
+def get_task_instance_events(graph):
+    contains = graph.get_relationships("CONTAINS")
+    return to_records(pd.DataFrame({"task_instance": contains["start"].to_numpy(),
+                                    "event": contains["end"].to_numpy()}))
+
+
+@local_query(ql.q_get_task_instance_intervals)
+def get_task_instance_intervals(graph):
+    task_instances = graph.get_nodes("TaskInstance")
+    return to_records(pd.DataFrame({"task_instance": task_instances.index.to_numpy(),
+                                    "start_time": get_epoch_nanoseconds(task_instances["start_time"]),
+                                    "end_time": get_epoch_nanoseconds(task_instances["end_time"])}))
+
+
+@local_query(ql.q_get_df_ti_edges)
+def get_df_ti_edges(graph, resource):
+    df_ti = graph.get_relationships(resource.get_df_ti_label())
+    return to_records(pd.DataFrame({"task_instance1": df_ti["start"].to_numpy(),
+                                    "task_instance2": df_ti["end"].to_numpy()}))
+
+
+@local_query(ql.q_set_actor_behavior_per_df)
+def set_actor_behavior_per_df(graph, batch):
+    rows = pd.DataFrame(batch, columns=["df_id", "actor_behavior"])
+    for relationship_type, relationships in list(graph.relationships.items()):
+        matched = rows[rows["df_id"].isin(relationships.index)]
+        if not matched.empty:
+            graph.set_relationship_property(relationship_type, matched["df_id"].to_numpy(), "actor_behavior",
+                                            matched["actor_behavior"].to_numpy())
+
+
+@local_query(cql.q_get_events)
+def get_events(graph):
+    events = graph.get_nodes("Event")
+    timestamps = pd.array(get_epoch_nanoseconds(events["timestamp"]), dtype="Int64")
+    timestamps[events["timestamp"].isna().to_numpy()] = pd.NA
+    return to_records(pd.DataFrame({"event": events.index.to_numpy(),
+                                    "activity": pd.array(get_observed_activities(graph, events.index.to_numpy()),
+                                                         dtype="Int64"),
+                                    "timestamp": timestamps}))
+
+
+@local_query(cql.q_get_df_edges)
+def get_df_edges(graph, entity):
+    df = get_event_relationships(graph, entity.get_df_label())
+    return to_records(pd.DataFrame({"df_id": df.index.to_numpy(), "e1": df["start"].to_numpy(),
+                                    "e2": df["end"].to_numpy()}))
+
+
+@local_query(cql.q_get_correlations)
+def get_correlations(graph, corr_type):
+    correlations = graph.get_relationships(corr_type)
+    correlations = correlations[correlations["start"].isin(graph.get_nodes("Event").index)]
+    return to_records(pd.DataFrame({"event": correlations["start"].to_numpy(),
+                                    "node": correlations["end"].to_numpy()}))
+
+
+@local_query(ipql.q_create_node_index, ipql.q_create_relationship_index, ipql.q_await_indexes)
+def create_index(graph, **kwargs):
+    # the tables of the local graph are scanned column-wise, there are no indexes to create or wait for
+    return None
+
+
+@local_query(ipql.q_get_index_states)
+def get_index_states(graph, index_names):
+    return [{"name": index_name, "state": "ONLINE", "populationPercent": 100.0} for index_name in index_names]
+
+
+def get_activity_df_edges(graph, df_label, event_label="Event"):
+    """
+    @return: the df-relationships of df_label between events of event_label with the Activity nodes c1 and c2
+    observing their events
+    """
+    df = get_event_relationships(graph, df_label, event_label=event_label)
+    return pd.DataFrame({"df_id": df.index.to_numpy(), "e1": df["start"].to_numpy(), "e2": df["end"].to_numpy(),
+                         "c1": get_observed_activities(graph, df["start"].to_numpy()),
+                         "c2": get_observed_activities(graph, df["end"].to_numpy())}).dropna(subset=["c1", "c2"])
+
+
+def get_df_frequencies(graph, df_label, corr_label, event_label="Event"):
+    """
+    @return: count(df) per pair of activities c1 and c2 over (e1)-[df]->(e2) with
+    (e1)-[:corr_label]->(n)<-[:corr_label]-(e2), i.e. once for every entity n shared by e1 and e2
+    """
+    df = get_activity_df_edges(graph, df_label, event_label=event_label)
+    correlations = pd.concat([graph.get_relationships(corr_type) for corr_type in corr_label.split("|")])
+    correlations = pd.DataFrame({"event": correlations["start"].to_numpy(), "n": correlations["end"].to_numpy()})
+    shared = df.merge(correlations.rename(columns={"event": "e1"}), on="e1") \
+        .merge(correlations.rename(columns={"event": "e2"}), on=["e2", "n"])
+    return shared.groupby(["c1", "c2"]).size().reset_index(name="df_freq")
+
+
+@local_query(dfgql.aggregate_df_relations)
+def aggregate_df_relations(graph, df_label, corr_label, dfc_label, df_threshold, event_label="Event"):
+    df_frequencies = get_df_frequencies(graph, df_label, corr_label, event_label=event_label)
+    df_frequencies = df_frequencies[df_frequencies["df_freq"] > df_threshold]
+    graph.merge_relationships(dfc_label, df_frequencies["c1"].to_numpy(), df_frequencies["c2"].to_numpy(),
+                              match={"type": "DF_A"}, on_create={"count": df_frequencies["df_freq"].to_numpy()})
+
+
+@local_query(dfgql.aggregate_df_relations_heuristic)
+def aggregate_df_relations_heuristic(graph, df_label, corr_label, dfc_label, df_threshold, relative_df_threshold,
+                                     event_label="Event"):
+    df_frequencies = get_df_frequencies(graph, df_label, corr_label, event_label=event_label)
+    df_frequencies = df_frequencies[df_frequencies["df_freq"] > df_threshold]
+    # count(df2) over the df-relationships in the reverse direction, from an event of c2 to an event of c1
+    reverse_frequencies = get_activity_df_edges(graph, df_label, event_label=event_label) \
+        .groupby(["c2", "c1"]).size().reset_index(name="df_freq2") \
+        .rename(columns={"c2": "c1", "c1": "c2"})
+    df_frequencies = df_frequencies.merge(reverse_frequencies, on=["c1", "c2"], how="left").fillna({"df_freq2": 0})
+    df_frequencies = df_frequencies[df_frequencies["df_freq"] > df_frequencies["df_freq2"] * relative_df_threshold]
+    graph.merge_relationships(dfc_label, df_frequencies["c1"].to_numpy(), df_frequencies["c2"].to_numpy(),
+                              match={"type": "DF_A"}, on_create={"count": df_frequencies["df_freq"].to_numpy()})
+
+
+@local_query(dfgql.get_activity_df_frequencies)
+def get_activity_df_frequencies(graph, corr_types, event_label="Event"):
+    df_frequencies = []
+    for df_label, entity_corr_types in corr_types.items():
+        df_counts = get_activity_df_edges(graph, df_label, event_label=event_label) \
+            .groupby(["c1", "c2"]).size().reset_index(name="df_count")
+        shared = get_df_frequencies(graph, df_label, "|".join(entity_corr_types), event_label=event_label)
+        df_frequencies.append(df_counts.merge(shared, on=["c1", "c2"], how="left").fillna({"df_freq": 0})
+                              .astype({"df_freq": "int64"}).assign(df_label=df_label))
+    if not df_frequencies:
+        return None
+    return to_records(pd.concat(df_frequencies, ignore_index=True)[["df_label", "c1", "c2", "df_freq", "df_count"]])
+
+
+@local_query(dfgql.merge_df_a_relations)
+def merge_df_a_relations(graph, batch):
+    rows = pd.DataFrame(batch, columns=["c1", "c2", "dfc_label", "df_freq"])
+    for dfc_label, label_rows in rows.groupby("dfc_label", sort=False):
+        graph.merge_relationships(dfc_label, label_rows["c1"].to_numpy(), label_rows["c2"].to_numpy(),
+                                  match={"type": "DF_A"}, on_create={"count": label_rows["df_freq"].to_numpy()})
+    return [{"df_a_relations": len(rows)}]
+
+
+@local_query(iql.delete_parallel_directly_follows_derived)
+def delete_parallel_directly_follows_derived(graph, entity, original_entity, event_label="Event"):
+    df = get_event_relationships(graph, entity.get_df_label(), event_label=event_label)
+    original_df = graph.get_relationships(original_entity.get_df_label())
+    parallel = pairs_isin(df["start"].to_numpy(), df["end"].to_numpy(), original_df["start"].to_numpy(),
+                          original_df["end"].to_numpy())
+    graph.delete_relationships(entity.get_df_label(), df.index[parallel])
+
+
+@local_query(iql.get_derived_directly_follows_start_events)
+def get_derived_directly_follows_start_events(graph, df_labels, event_label="Event"):
+    events = pd.concat([get_event_relationships(graph, df_label, event_label=event_label)["start"]
+                        for df_label in df_labels])
+    return to_records(pd.DataFrame({"event": events.unique()}))
+
+
+@local_query(iql.delete_parallel_directly_follows_derived_pairs)
+def delete_parallel_directly_follows_derived_pairs(graph, pairs, events, event_label="Event"):
+    deleted = []
+    for position, pair in enumerate(pairs):
+        df = get_event_relationships(graph, pair["df_label"], event_label=event_label)
+        df = df[df["start"].isin(events)]
+        original_df = graph.get_relationships(pair["df_original_label"])
+        parallel = pairs_isin(df["start"].to_numpy(), df["end"].to_numpy(), original_df["start"].to_numpy(),
+                              original_df["end"].to_numpy())
+        graph.delete_relationships(pair["df_label"], df.index[parallel])
+        deleted.append({"position": position, "deleted": int(parallel.sum())})
+    return deleted
+
+
+@local_query(iql.delete_directly_follows_by_id)
+def delete_directly_follows_by_id(graph, df_ids):
+    for relationship_type, relationships in list(graph.relationships.items()):
+        deleted = relationships.index.intersection(df_ids)
+        if not deleted.empty:
+            graph.delete_relationships(relationship_type, deleted)
+
+
+def get_typed_df_edges(graph):
+    """
+    @return: all df-relationships {type:"DF"} between events with their entity type
+    """
+    df_edges = []
+    for relationship_type, relationships in graph.relationships.items():
+        if "type" in relationships.columns and "entityType" in relationships.columns:
+            relationships = get_event_relationships(graph, relationship_type)
+            relationships = relationships[relationships["type"] == "DF"]
+            df_edges.append(pd.DataFrame({"e1": relationships["start"].to_numpy(),
+                                          "e2": relationships["end"].to_numpy(),
+                                          "entityType": relationships["entityType"].to_numpy()}))
+    if not df_edges:
+        return pd.DataFrame(columns=["e1", "e2", "entityType"])
+    return pd.concat(df_edges, ignore_index=True)
+
+
+def get_delay_edges(graph) -> pd.DataFrame:
+    """
+    @return: per event e2 the df-relationships from its latest predecessor e1, over the df-relationships of all
+    entity types except CaseAWO
+    """
+    df_edges = get_typed_df_edges(graph)
+    df_edges = df_edges[df_edges["entityType"] != "CaseAWO"]
+    timestamps1 = graph.get_node_property("Event", df_edges["e1"].to_numpy(), "timestamp")
+    timestamps2 = graph.get_node_property("Event", df_edges["e2"].to_numpy(), "timestamp")
+    # a duration with a missing timestamp is null, which sorts after every other duration like in Cypher
+    durations = pd.array(get_epoch_nanoseconds(timestamps2) - get_epoch_nanoseconds(timestamps1), dtype="Int64")
+    durations[pd.isna(timestamps1) | pd.isna(timestamps2)] = pd.NA
+    df_edges = df_edges.assign(duration=durations)
+    # per e2 the predecessor e1 with the shortest duration, over all its df-relationships
+    e1_last = df_edges.sort_values(["e2", "duration", "e1"]).drop_duplicates("e2")[["e1", "e2"]]
+    return df_edges.merge(e1_last, on=["e1", "e2"])
+
+
+@local_query(dql.q_create_delay_edges)
+def create_delay_edges(graph):
+    delays = get_delay_edges(graph)
+    graph.merge_relationships("DELAY", delays["e1"].to_numpy(), delays["e2"].to_numpy(),
+                              on_create={"by": delays["entityType"].to_numpy()})
+    return [{"delay_edges": len(delays)}]
+
+
+@local_query(dql.q_create_delay_edges_batched)
+def create_delay_edges_batched(graph):
+    delays = get_delay_edges(graph)
+    graph.merge_relationships("DELAY", delays["e1"].to_numpy(), delays["e2"].to_numpy(),
+                              on_create={"by": delays["entityType"].to_numpy()})
+    # the whole graph is a single batch
+    nr_targets = delays["e2"].nunique()
+    return [{"batches": int(nr_targets > 0), "total": nr_targets, "failedBatches": 0, "errorMessages": {}}]
+
+
+@local_query(dql.q_merge_delay_edges)
+def merge_delay_edges(graph, batch):
+    rows = pd.DataFrame(batch, columns=["e1", "e2", "by"])
+    graph.merge_relationships("DELAY", rows["e1"].to_numpy(), rows["e2"].to_numpy(),
+                              on_create={"by": rows["by"].to_numpy()})
+
+
+@local_query(dql.q_summarize_delay_entities)
+def summarize_delay_entities(graph):
+    delays = get_event_relationships(graph, "DELAY")
+    if delays.empty:
+        return []
+    return to_records(delays.groupby("by", dropna=False).size().reset_index(name="frequency")
+                      .rename(columns={"by": "delay_by"}))
+
+
+@local_query(dql.visualize_delays)
+def visualize_delays(graph, threshold, event_label="Event"):
+    delays = get_activity_df_edges(graph, "DELAY", event_label=event_label)
+    if delays.empty:
+        return None
+    delays["delay_by"] = graph.get_relationships("DELAY")["by"].reindex(delays["df_id"]).to_numpy()
+    delay_frequencies = delays.groupby(["c1", "delay_by", "c2"], dropna=False).size() \
+        .reset_index(name="delay_freq")
+    delay_frequencies = delay_frequencies[delay_frequencies["delay_freq"] > threshold]
+    graph.merge_relationships("DELAY_A", delay_frequencies["c1"].to_numpy(), delay_frequencies["c2"].to_numpy(),
+                              on_create={"count": delay_frequencies["delay_freq"].to_numpy(),
+                                         "by": delay_frequencies["delay_by"].to_numpy()})
+
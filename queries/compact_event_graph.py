@@ -0,0 +1,36 @@
+from promg import Query
+
+
+class CompactEventGraphQueryLibrary:
+
+    @staticmethod
+    def q_get_events():
+        query_str = '''
+            MATCH (e:Event)
+            OPTIONAL MATCH (c:Activity)-[:OBSERVED]->(e)
+            RETURN id(e) AS event, id(c) AS activity,
+                e.timestamp.epochSeconds * 1000000000 + e.timestamp.nanosecond AS timestamp
+        '''
+        return Query(query_str=query_str)
+
+    @staticmethod
+    def q_get_df_edges(entity):
+        query_str = '''
+            MATCH (e1:Event)-[df:$df_entity]->(e2:Event)
+            RETURN id(df) AS df_id, id(e1) AS e1, id(e2) AS e2
+        '''
+        return Query(query_str=query_str,
+                     template_string_parameters={
+                         "df_entity": entity.get_df_label()
+                     })
+
+    @staticmethod
+    def q_get_correlations(corr_type):
+        query_str = '''
+            MATCH (e:Event)-[:$corr_type]->(n)
+            RETURN id(e) AS event, id(n) AS node
+        '''
+        return Query(query_str=query_str,
+                     template_string_parameters={
+                         "corr_type": corr_type
+                     })
@@ -1,7 +1,38 @@
 from promg import Query
 
+from queries.prepared_queries import PreparedQueryRegistry
+
+
+# classifies the df-edge (e1)-[df]->(e2) into actor_behavior, to be used inside the inner statement of
+# apoc.periodic.iterate; the CASE mirrors the overwrite order of the sequential queries: the last query that matches wins,
+# actor_behavior is null if no query matches
+CLASSIFY_DF_EDGE = '''OPTIONAL MATCH (tic:TaskInstance)-[:CONTAINS]->(e1)
+             WITH e1, df, e2, collect(tic) AS tics
+             OPTIONAL MATCH (e2)<-[:CONTAINS]-(:TaskInstance)<-[:$df_ti_resource]-(tir:TaskInstance)
+             WITH e1, df, e2, tics, collect(tir) AS tirs
+             WITH df, tics, tirs,
+                EXISTS { (e1)-[:$df_resource]->(e2) } AS is_continuation,
+                EXISTS { (e1)-[:CORR]->(:$resource_node_label)<-[:CORR]-(e2) } AS shares_resource,
+                EXISTS { ()-[:$df_resource]->(e2) } AS has_resource_predecessor
+             WITH df, CASE
+                WHEN NOT shares_resource
+                    AND any(tic IN tics WHERE any(tir IN tirs WHERE tic.end_time < tir.start_time))
+                    THEN "handover_deprioritized"
+                WHEN NOT shares_resource
+                    AND any(tic IN tics WHERE any(tir IN tirs WHERE tir.start_time < tic.end_time < tir.end_time))
+                    THEN "handover_prioritized"
+                WHEN (NOT shares_resource
+                    AND any(tic IN tics WHERE any(tir IN tirs WHERE tir.end_time < tic.end_time)))
+                    OR NOT has_resource_predecessor
+                    THEN "handover_idle"
+                WHEN shares_resource AND NOT is_continuation THEN "interruption"
+                WHEN is_continuation THEN "continuation"
+                END AS actor_behavior'''
+
 
 class DecompositionActorBehaviorQueryLibrary:
+    # query texts of the parameterised extraction queries, shared across edges to reuse Neo4j's plan cache
+    prepared_queries = PreparedQueryRegistry()
 
 
     @staticmethod
@@ -103,6 +134,109 @@ class DecompositionActorBehaviorQueryLibrary:
             }
         )
 
+    @staticmethod
+    def q_add_actor_behavior_fused(case, resource):
+        query_str = '''
+            CALL apoc.periodic.iterate(
+            'MATCH (e1:Event)-[df:$df_case]->(e2:Event)
+             RETURN e1, df, e2',
+            'WITH e1, df, e2
+             ''' + CLASSIFY_DF_EDGE + '''
+             WHERE actor_behavior IS NOT NULL
+             SET df.actor_behavior = actor_behavior',
+            {batchSize: $batch_size})
+        '''
+        return Query(
+            query_str=query_str,
+            template_string_parameters={
+                "resource_node_label": resource.type,
+                "df_case": case.get_df_label(),
+                "df_resource": resource.get_df_label(),
+                "df_ti_resource": resource.get_df_ti_label()
+            }
+        )
+
+    @staticmethod
+    def q_add_actor_behavior_incremental(case, resource):
+        # only (re)classify df-edges without actor behavior and df-edges whose events, or the task instance preceding
+        # the task instance of e2, belong to task instances that were not classified before; every selected df-edge,
+        # also one without actor behavior, is marked pending until the decomposed performance of its case edge is
+        # updated
+        query_str = '''
+            CALL apoc.periodic.iterate(
+            'MATCH (e1:Event)-[df:$df_case]->(e2:Event)
+             WHERE df.actor_behavior IS NULL
+                OR EXISTS { (ti:TaskInstance)-[:CONTAINS]->(e1) WHERE ti.actor_behavior_classified IS NULL }
+                OR EXISTS { (ti:TaskInstance)-[:CONTAINS]->(e2) WHERE ti.actor_behavior_classified IS NULL }
+                OR EXISTS { (e2)<-[:CONTAINS]-(:TaskInstance)<-[:$df_ti_resource]-(tir:TaskInstance)
+                            WHERE tir.actor_behavior_classified IS NULL }
+             RETURN e1, df, e2',
+            'WITH e1, df, e2
+             ''' + CLASSIFY_DF_EDGE + '''
+             SET df.actor_behavior_pending = true
+             WITH df, actor_behavior
+             WHERE actor_behavior IS NOT NULL
+             SET df.actor_behavior = actor_behavior',
+            {batchSize: $batch_size})
+        '''
+        return Query(
+            query_str=query_str,
+            template_string_parameters={
+                "resource_node_label": resource.type,
+                "df_case": case.get_df_label(),
+                "df_resource": resource.get_df_label(),
+                "df_ti_resource": resource.get_df_ti_label()
+            }
+        )
+
+    @staticmethod
+    def q_mark_task_instances_classified():
+        query_str = '''
+            CALL apoc.periodic.iterate(
+            'MATCH (ti:TaskInstance) WHERE ti.actor_behavior_classified IS NULL RETURN ti',
+            'SET ti.actor_behavior_classified = true',
+            {batchSize: $batch_size})
+        '''
+        return Query(query_str=query_str)
+
+    @staticmethod
+    def q_get_pending_df_edges_activity(case):
+        query_str = '''
+            MATCH (e1:Event)-[df:$df_case]->(e2:Event)
+            WHERE df.actor_behavior_pending
+            RETURN DISTINCT e1.activity AS activity1, e2.activity AS activity2
+        '''
+        return Query(query_str=query_str,
+                     template_string_parameters={
+                         "df_case": case.get_df_label()
+                     })
+
+    @staticmethod
+    def q_get_pending_df_edges_activity_lifecycle(case):
+        query_str = '''
+            MATCH (e1:Event)-[df:$df_case]->(e2:Event)
+            WHERE df.actor_behavior_pending
+            RETURN DISTINCT e1.activity AS activity1, e1.lifecycle AS lifecycle1, e2.activity AS activity2,
+                e2.lifecycle AS lifecycle2
+        '''
+        return Query(query_str=query_str,
+                     template_string_parameters={
+                         "df_case": case.get_df_label()
+                     })
+
+    @staticmethod
+    def q_clear_pending_df_edges(case):
+        query_str = '''
+            CALL apoc.periodic.iterate(
+            'MATCH (:Event)-[df:$df_case]->(:Event) WHERE df.actor_behavior_pending RETURN df',
+            'REMOVE df.actor_behavior_pending',
+            {batchSize: $batch_size})
+        '''
+        return Query(query_str=query_str,
+                     template_string_parameters={
+                         "df_case": case.get_df_label()
+                     })
+
     @staticmethod
     def q_get_all_df_edges_activity(case, min_freq):
         query_str = '''
@@ -134,11 +268,38 @@ class DecompositionActorBehaviorQueryLibrary:
                          "min_freq": min_freq
                      })
     @staticmethod
+    def q_get_df_edge_fingerprints(case):
+        query_str = '''
+            MATCH (e1:Event)-[df:$df_case]->(e2:Event)
+            WITH e1.activity AS activity1, e2.activity AS activity2, df.actor_behavior AS actor_behavior,
+                count(*) AS count, max(id(df)) AS max_df_id
+            RETURN activity1, activity2, actor_behavior, count, max_df_id
+        '''
+        return Query(query_str=query_str,
+                     template_string_parameters={
+                         "df_case": case.get_df_label()
+                     })
+
+    @staticmethod
+    def q_get_df_edge_fingerprints_bpic17(case):
+        query_str = '''
+            MATCH (e1:Event)-[df:$df_case]->(e2:Event)
+            WITH e1.activity AS activity1, e1.lifecycle AS lifecycle1, e2.activity AS activity2, 
+                e2.lifecycle AS lifecycle2, df.actor_behavior AS actor_behavior, count(*) AS count, 
+                max(id(df)) AS max_df_id
+            RETURN activity1, lifecycle1, activity2, lifecycle2, actor_behavior, count, max_df_id
+        '''
+        return Query(query_str=query_str,
+                     template_string_parameters={
+                         "df_case": case.get_df_label()
+                     })
+
+    @staticmethod
     def q_get_all_actor_behavior_per_df(case, resource, edge_tuple):
         query_str = '''
-            MATCH (e1:Event {activity: "$activity1"})
+            MATCH (e1:Event {activity: $activity1})
                   -[df:$df_case]->
-                  (e2:Event {activity: "$activity2"})
+                  (e2:Event {activity: $activity2})
             WITH 
                 e1.timestamp AS startTime,
                 e2.timestamp AS completeTime,
@@ -147,10 +308,12 @@ class DecompositionActorBehaviorQueryLibrary:
             RETURN startTime, completeTime, duration, actor_behavior
         '''
         return Query(
-            query_str=query_str,
-            template_string_parameters={
-                "resource_node_label": resource.type,
-                "df_case": case.get_df_label(),
+            query_str=DecompositionActorBehaviorQueryLibrary.prepared_queries.prepare(
+                "q_get_all_actor_behavior_per_df", query_str,
+                template_string_parameters={
+                    "df_case": case.get_df_label()
+                }),
+            parameters={
                 "activity1": edge_tuple[0],
                 "activity2": edge_tuple[1]
             }
@@ -159,28 +322,75 @@ class DecompositionActorBehaviorQueryLibrary:
     @staticmethod
     def q_get_all_actor_behavior_per_df_bpic17(case, resource, edge_tuple):
         query_str = '''
-            MATCH (e1:Event {activity: "$activity1", lifecycle:"$lifecycle1"})-[df:$df_case]->
-                (e2:Event {activity: "$activity2", lifecycle:"$lifecycle2"})
+            MATCH (e1:Event {activity: $activity1, lifecycle: $lifecycle1})-[df:$df_case]->
+                (e2:Event {activity: $activity2, lifecycle: $lifecycle2})
             WITH e1.timestamp AS time, duration.inSeconds(e1.timestamp, e2.timestamp) AS duration, 
                 df.actor_behavior AS actor_behavior
             RETURN time, duration, actor_behavior
             '''
-        return Query(query_str=query_str,
-                     template_string_parameters={
-                         "resource_node_label": resource.type,
-                         "df_case": case.get_df_label(),
+        return Query(query_str=DecompositionActorBehaviorQueryLibrary.prepared_queries.prepare(
+                         "q_get_all_actor_behavior_per_df_bpic17", query_str,
+                         template_string_parameters={
+                             "df_case": case.get_df_label()
+                         }),
+                     parameters={
                          "activity1": edge_tuple[0][0],
                          "lifecycle1": edge_tuple[0][1],
                          "activity2": edge_tuple[1][0],
                          "lifecycle2": edge_tuple[1][1]
                      })
 
+    @staticmethod
+    def q_get_all_actor_behavior_all_df(case, resource, edge_tuples):
+        query_str = '''
+            MATCH (e1:Event)-[df:$df_case]->(e2:Event)
+            WHERE [e1.activity, e2.activity] IN $edges
+            WITH 
+                e1.activity AS activity1,
+                e2.activity AS activity2,
+                e1.timestamp AS startTime,
+                e2.timestamp AS completeTime,
+                duration.inSeconds(e1.timestamp, e2.timestamp) AS duration,
+                df.actor_behavior AS actor_behavior
+            RETURN activity1, activity2, startTime, completeTime, duration, actor_behavior
+        '''
+        return Query(
+            query_str=DecompositionActorBehaviorQueryLibrary.prepared_queries.prepare(
+                "q_get_all_actor_behavior_all_df", query_str,
+                template_string_parameters={
+                    "df_case": case.get_df_label()
+                }),
+            parameters={
+                "edges": [[edge_tuple[0], edge_tuple[1]] for edge_tuple in edge_tuples]
+            }
+        )
+
+    @staticmethod
+    def q_get_all_actor_behavior_all_df_bpic17(case, resource, edge_tuples):
+        query_str = '''
+            MATCH (e1:Event)-[df:$df_case]->(e2:Event)
+            WHERE [e1.activity, e1.lifecycle, e2.activity, e2.lifecycle] IN $edges
+            WITH e1.activity AS activity1, e1.lifecycle AS lifecycle1, e2.activity AS activity2, 
+                e2.lifecycle AS lifecycle2, e1.timestamp AS time, 
+                duration.inSeconds(e1.timestamp, e2.timestamp) AS duration, df.actor_behavior AS actor_behavior
+            RETURN activity1, lifecycle1, activity2, lifecycle2, time, duration, actor_behavior
+            '''
+        return Query(query_str=DecompositionActorBehaviorQueryLibrary.prepared_queries.prepare(
+                         "q_get_all_actor_behavior_all_df_bpic17", query_str,
+                         template_string_parameters={
+                             "df_case": case.get_df_label()
+                         }),
+                     parameters={
+                         "edges": [[edge_tuple[0][0], edge_tuple[0][1], edge_tuple[1][0], edge_tuple[1][1]]
+                                   for edge_tuple in edge_tuples]
+                     })
+
     @staticmethod
     def q_get_continuation_per_df(case, resource, edge_tuple):
         query_str = '''
-            MATCH (e1:Event {activity: "$activity1"})
+            MATCH (e1:Event {activity: $activity1})
                   -[df:$df_case]->
-                  (e2:Event {activity: "$activity2"})
+                  (e2:Event {activity: $activity2})
                   <-[:CONTAINS]-(ti:TaskInstance)-[:CORR]->(n:$resource_node_label)
             WHERE df.actor_behavior = "continuation"
             WITH 
@@ -193,10 +403,13 @@ class DecompositionActorBehaviorQueryLibrary:
             RETURN startTime, completeTime, duration, actor_behavior, task, actor
         '''
         return Query(
-            query_str=query_str,
-            template_string_parameters={
-                "resource_node_label": resource.type,
-                "df_case": case.get_df_label(),
+            query_str=DecompositionActorBehaviorQueryLibrary.prepared_queries.prepare(
+                "q_get_continuation_per_df", query_str,
+                template_string_parameters={
+                    "resource_node_label": resource.type,
+                    "df_case": case.get_df_label()
+                }),
+            parameters={
                 "activity1": edge_tuple[0],
                 "activity2": edge_tuple[1]
             }
@@ -205,9 +418,9 @@ class DecompositionActorBehaviorQueryLibrary:
     @staticmethod
     def q_get_interruption_per_df(case, resource, edge_tuple):
         query_str = '''
-            MATCH (e1:Event {activity: "$activity1"})
+            MATCH (e1:Event {activity: $activity1})
                   -[df:$df_case]->
-                  (e2:Event {activity: "$activity2"})
+                  (e2:Event {activity: $activity2})
                   <-[:CONTAINS]-(ti:TaskInstance)-[:CORR]->(n:$resource_node_label)
             WHERE df.actor_behavior = "interruption"
             WITH 
@@ -220,11 +433,96 @@ class DecompositionActorBehaviorQueryLibrary:
             RETURN startTime, completeTime, duration, actor_behavior, task, actor
         '''
         return Query(
-            query_str=query_str,
-            template_string_parameters={
-                "resource_node_label": resource.type,
-                "df_case": case.get_df_label(),
+            query_str=DecompositionActorBehaviorQueryLibrary.prepared_queries.prepare(
+                "q_get_interruption_per_df", query_str,
+                template_string_parameters={
+                    "resource_node_label": resource.type,
+                    "df_case": case.get_df_label()
+                }),
+            parameters={
                 "activity1": edge_tuple[0],
                 "activity2": edge_tuple[1]
             }
         )
+
+    @staticmethod
+    def q_get_case_df_edges(case):
+        query_str = '''
+            MATCH (e1:Event)-[df:$df_case]->(e2:Event)
+            RETURN id(df) AS df_id, id(e1) AS e1, id(e2) AS e2, df.actor_behavior AS actor_behavior
+        '''
+        return Query(
+            query_str=query_str,
+            template_string_parameters={
+                "df_case": case.get_df_label()
+            }
+        )
+
+    @staticmethod
+    def q_get_resource_df_edges(resource):
+        query_str = '''
+            MATCH (e1:Event)-[:$df_resource]->(e2:Event)
+            RETURN id(e1) AS e1, id(e2) AS e2
+        '''
+        return Query(
+            query_str=query_str,
+            template_string_parameters={
+                "df_resource": resource.get_df_label()
+            }
+        )
+
+    @staticmethod
+    def q_get_event_resources(resource):
+        query_str = '''
+            MATCH (e:Event)-[:CORR]->(n:$resource_node_label)
+            RETURN id(e) AS event, id(n) AS resource
+        '''
+        return Query(
+            query_str=query_str,
+            template_string_parameters={
+                "resource_node_label": resource.type
+            }
+        )
+
+    @staticmethod
+    def q_get_task_instance_events():
+        query_str = '''
+            MATCH (ti:TaskInstance)-[:CONTAINS]->(e:Event)
+            RETURN id(ti) AS task_instance, id(e) AS event
+        '''
+        return Query(query_str=query_str)
+
+    @staticmethod
+    def q_get_task_instance_intervals():
+        query_str = '''
+            MATCH (ti:TaskInstance)
+            RETURN id(ti) AS task_instance,
+                ti.start_time.epochSeconds * 1000000000 + ti.start_time.nanosecond AS start_time,
+                ti.end_time.epochSeconds * 1000000000 + ti.end_time.nanosecond AS end_time
+        '''
+        return Query(query_str=query_str)
+
+    @staticmethod
+    def q_get_df_ti_edges(resource):
+        query_str = '''
+            MATCH (ti1:TaskInstance)-[:$df_ti_resource]->(ti2:TaskInstance)
+            RETURN id(ti1) AS task_instance1, id(ti2) AS task_instance2
+        '''
+        return Query(
+            query_str=query_str,
+            template_string_parameters={
+                "df_ti_resource": resource.get_df_ti_label()
+            }
+        )
+
+    @staticmethod
+    def q_set_actor_behavior_per_df(batch):
+        query_str = '''
+            UNWIND $batch AS row
+            MATCH ()-[df]->() WHERE id(df) = row.df_id
+            SET df.actor_behavior = row.actor_behavior
+        '''
+        return Query(query_str=query_str,
+                     parameters={
+                         "batch": batch
+                     })
@@ -0,0 +1,52 @@
+from promg import Query
+
+
+class IndexProvisioningQueryLibrary:
+
+    @staticmethod
+    def q_create_node_index(index_name, label, properties):
+        query_str = '''
+            CREATE INDEX $index_name IF NOT EXISTS
+            FOR (n:$label) ON ($properties)
+        '''
+        return Query(query_str=query_str,
+                     template_string_parameters={
+                         "index_name": index_name,
+                         "label": label,
+                         "properties": ", ".join(f"n.{property_name}" for property_name in properties)
+                     })
+
+    @staticmethod
+    def q_create_relationship_index(index_name, relationship_type, properties):
+        query_str = '''
+            CREATE INDEX $index_name IF NOT EXISTS
+            FOR ()-[r:$relationship_type]-() ON ($properties)
+        '''
+        return Query(query_str=query_str,
+                     template_string_parameters={
+                         "index_name": index_name,
+                         "relationship_type": relationship_type,
+                         "properties": ", ".join(f"r.{property_name}" for property_name in properties)
+                     })
+
+    @staticmethod
+    def q_await_indexes(timeout):
+        query_str = '''
+            CALL db.awaitIndexes($timeout)
+        '''
+        return Query(query_str=query_str,
+                     parameters={
+                         "timeout": timeout
+                     })
+
+    @staticmethod
+    def q_get_index_states(index_names):
+        query_str = '''
+            SHOW INDEXES YIELD name, state, populationPercent
+            WHERE name IN $index_names
+            RETURN name, state, populationPercent
+        '''
+        return Query(query_str=query_str,
+                     parameters={
+                         "index_names": index_names
+                     })
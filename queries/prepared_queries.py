@@ -0,0 +1,38 @@
+from collections import Counter
+from string import Template
+from threading import Lock
+
+
+class PreparedQueryRegistry:
+    """
+    Client-side registry of prepared query texts. Queries that only differ in their bound parameters share one
+    query text, so Neo4j can reuse the cached plan. The statistics count on the client how often a query text is
+    prepared (first request) and reused (every following request); whether Neo4j hits its plan cache is not observed.
+    """
+
+    def __init__(self):
+        self.query_texts = {}
+        self.reused = Counter()
+        self.prepared = Counter()
+        # queries are prepared concurrently when edges are extracted in parallel
+        self.lock = Lock()
+
+    def prepare(self, name: str, query_str: str, template_string_parameters: dict = None) -> str:
+        if template_string_parameters is None:
+            template_string_parameters = {}
+        key = (name, tuple(sorted(template_string_parameters.items())))
+        with self.lock:
+            if key in self.query_texts:
+                self.reused[name] += 1
+            else:
+                self.query_texts[key] = Template(query_str).safe_substitute(template_string_parameters)
+                self.prepared[name] += 1
+            return self.query_texts[key]
+
+    def reset_statistics(self):
+        self.reused.clear()
+        self.prepared.clear()
+
+    def print_statistics(self):
+        for name in sorted(set(self.reused) | set(self.prepared)):
+            print(f"{name}: query text reused {self.reused[name]} times, prepared {self.prepared[name]} times")
@@ -1,22 +1,42 @@
 import datetime
+from array import array
+
+import numpy as np
 import pandas as pd
 
 
+# nanoseconds per unit of the transformed duration columns
+NANOSECONDS_PER_UNIT = {
+    'nanoseconds': 1,
+    'seconds': 10 ** 9,
+    'minutes': 60 * 10 ** 9,
+    'hours': 60 * 60 * 10 ** 9,
+    'days': 24 * 60 * 60 * 10 ** 9
+}
+# a month is converted using the average length of a Gregorian month (30.436875 days)
+NANOSECONDS_PER_MONTH = 2629746 * 10 ** 9
+
+
+def neo_durations_to_nanoseconds(durations):
+    """
+    Convert Neo4j durations (months, days, seconds, nanoseconds) to nanoseconds in a single sweep
+    @param durations: Series of neo4j.time.Duration values, missing values are allowed
+    @return: int64 array with the durations in nanoseconds and boolean array marking the missing values
+    """
+    missing = durations.isna().to_numpy()
+    components = np.zeros((len(durations), 4), dtype=np.int64)
+    if not missing.all():
+        components[~missing] = np.array(durations[~missing].tolist(), dtype=np.int64).reshape(-1, 4)
+    component_nanoseconds = np.array([NANOSECONDS_PER_MONTH, NANOSECONDS_PER_UNIT['days'],
+                                      NANOSECONDS_PER_UNIT['seconds'], 1], dtype=np.int64)
+    return components @ component_nanoseconds, missing
+
+
 def transform_neo_duration(dataframe, column, unit='seconds'):
-    for index, row in dataframe.iterrows():
-        duration = row[column]
-        duration_seconds = duration.hours_minutes_seconds_nanoseconds[0] * 3600 + \
-                           duration.hours_minutes_seconds_nanoseconds[1] * 60 + \
-                           duration.hours_minutes_seconds_nanoseconds[2]
-        if unit == 'seconds':
-            duration_unit = duration_seconds
-        elif unit == 'minutes':
-            duration_unit = duration_seconds / 60
-        elif unit == 'hours':
-            duration_unit = duration_seconds / 60 / 60
-        elif unit == 'days':
-            duration_unit = duration_seconds / 60 / 60 / 24
-        dataframe.loc[index, f'{column}_{unit}'] = duration_unit
+    nanoseconds, missing = neo_durations_to_nanoseconds(dataframe[column])
+    duration_unit = nanoseconds / NANOSECONDS_PER_UNIT[unit]
+    duration_unit[missing] = np.nan
+    dataframe[f'{column}_{unit}'] = duration_unit
     dataframe.drop(columns=[column], inplace=True)
     return dataframe
 
@@ -54,8 +74,11 @@ def parse_timestamp(query_result, key):
     return timestamp
 
 
-def parse_to_dataframe(query_result, timedelta_cols: dict = None, timestamp_cols: list = None):
-    dataframe = pd.DataFrame([dict(record) for record in query_result])
+def parse_to_dataframe(query_result, timedelta_cols: dict = None, timestamp_cols: list = None,
+                       columns: list = None):
+    if query_result is None:
+        query_result = []
+    dataframe = pd.DataFrame([dict(record) for record in query_result], columns=columns)
     if timedelta_cols is not None:
         for timedelta_col_name, unit in timedelta_cols.items():
             transform_neo_duration(dataframe, timedelta_col_name, unit=unit)
@@ -63,3 +86,149 @@ def parse_to_dataframe(query_result, timedelta_cols: dict = None, timestamp_cols
         for timestamp_col in timestamp_cols:
             transform_neo_date(dataframe, timestamp_col)
     return dataframe
+
+
+UNIX_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def neo_datetime_to_nanoseconds(value):
+    """
+    Convert a Neo4j DateTime (or a Python datetime) to nanoseconds since the Unix epoch (UTC)
+    """
+    if isinstance(value, datetime.datetime):
+        return pd.Timestamp(value).value
+    seconds = (value.date().to_ordinal() - UNIX_EPOCH_ORDINAL) * 86400 + \
+              value.hour * 3600 + value.minute * 60 + value.second
+    offset = value.utcoffset()
+    if offset is not None:
+        seconds -= int(offset.total_seconds())
+    return seconds * 10 ** 9 + value.nanosecond
+
+
+def neo_duration_to_nanoseconds(value):
+    months, days, seconds, nanoseconds = value
+    return months * NANOSECONDS_PER_MONTH + days * NANOSECONDS_PER_UNIT['days'] + \
+        seconds * NANOSECONDS_PER_UNIT['seconds'] + nanoseconds
+
+
+class ColumnarResultAdapter:
+    """
+    Collects query records directly into typed column buffers: timestamps as int64 nanoseconds, durations as int64
+    nanoseconds and categorical columns as int32 codes. The buffers are exposed without copying as a DataFrame with
+    the same layout as parse_to_dataframe, or as a pyarrow Table.
+    """
+
+    def __init__(self, timedelta_cols: dict = None, timestamp_cols: list = None, categorical_cols: list = None,
+                 columns: list = None):
+        self.timedelta_cols = timedelta_cols if timedelta_cols is not None else {}
+        self.timestamp_cols = timestamp_cols if timestamp_cols is not None else []
+        self.categorical_cols = categorical_cols if categorical_cols is not None else []
+        self.columns = columns
+        self.buffers = {}
+        self.missing = {}
+        self.categories = {column: {} for column in self.categorical_cols}
+        self.timezones = {}
+        self.nr_records = 0
+
+    def _init_buffers(self, columns):
+        self.columns = list(columns)
+        for column in self.columns:
+            if column in self.timedelta_cols or column in self.timestamp_cols:
+                self.buffers[column] = array('q')
+                self.missing[column] = array('b')
+            elif column in self.categorical_cols:
+                self.buffers[column] = array('i')
+            else:
+                self.buffers[column] = []
+
+    def append(self, record):
+        if not self.buffers:
+            self._init_buffers(self.columns if self.columns is not None else record.keys())
+        for column in self.columns:
+            value = record[column]
+            if column in self.timedelta_cols:
+                self.missing[column].append(value is None)
+                self.buffers[column].append(neo_duration_to_nanoseconds(value) if value is not None else 0)
+            elif column in self.timestamp_cols:
+                self.missing[column].append(value is None)
+                self.buffers[column].append(neo_datetime_to_nanoseconds(value) if value is not None else 0)
+                if value is not None and column not in self.timezones:
+                    self.timezones[column] = value.utcoffset()
+            elif column in self.categorical_cols:
+                categories = self.categories[column]
+                if value is None:
+                    self.buffers[column].append(-1)
+                else:
+                    self.buffers[column].append(categories.setdefault(value, len(categories)))
+            else:
+                self.buffers[column].append(value)
+        self.nr_records += 1
+
+    def extend(self, records):
+        for record in records if records is not None else []:
+            self.append(record)
+        return self
+
+    def _column_values(self, column):
+        buffer = self.buffers[column]
+        if column in self.timedelta_cols or column in self.timestamp_cols:
+            return np.frombuffer(buffer, dtype=np.int64), np.frombuffer(self.missing[column], dtype=np.bool_)
+        if column in self.categorical_cols:
+            return np.frombuffer(buffer, dtype=np.int32), None
+        return buffer, None
+
+    def to_dataframe(self):
+        if not self.buffers:
+            self._init_buffers(self.columns if self.columns is not None else [])
+        data = {}
+        for column in self.columns:
+            values, missing = self._column_values(column)
+            if column in self.timedelta_cols:
+                continue
+            if column in self.timestamp_cols:
+                timestamps = pd.to_datetime(np.where(missing, np.iinfo(np.int64).min, values), utc=True)
+                if self.timezones.get(column) is not None:
+                    timestamps = timestamps.tz_convert(datetime.timezone(self.timezones[column]))
+                data[column] = timestamps
+            elif column in self.categorical_cols:
+                data[column] = pd.Categorical.from_codes(values, categories=list(self.categories[column]))
+            else:
+                data[column] = values
+        # like transform_neo_duration, the converted durations are added as last columns
+        for column, unit in self.timedelta_cols.items():
+            if column in self.buffers:
+                values, missing = self._column_values(column)
+                duration_unit = values / NANOSECONDS_PER_UNIT[unit]
+                duration_unit[missing] = np.nan
+                data[f'{column}_{unit}'] = duration_unit
+        return pd.DataFrame(data, index=pd.RangeIndex(self.nr_records))
+
+    def to_arrow(self):
+        import pyarrow as pa
+
+        if not self.buffers:
+            self._init_buffers(self.columns if self.columns is not None else [])
+        arrays = {}
+        for column in self.columns:
+            values, missing = self._column_values(column)
+            if column in self.timedelta_cols:
+                continue
+            if column in self.timestamp_cols:
+                arrays[column] = pa.array(values, type=pa.timestamp('ns', tz='UTC'), mask=missing)
+            elif column in self.categorical_cols:
+                arrays[column] = pa.DictionaryArray.from_arrays(
+                    pa.array(values, mask=values < 0), pa.array(list(self.categories[column]), type=pa.string()))
+            else:
+                arrays[column] = pa.array(values)
+        for column, unit in self.timedelta_cols.items():
+            if column in self.buffers:
+                values, missing = self._column_values(column)
+                arrays[f'{column}_{unit}'] = pa.array(values / NANOSECONDS_PER_UNIT[unit], mask=missing)
+        return pa.table(arrays)
+
+
+def parse_to_columnar_dataframe(query_result, timedelta_cols: dict = None, timestamp_cols: list = None,
+                                categorical_cols: list = None, columns: list = None):
+    return ColumnarResultAdapter(timedelta_cols=timedelta_cols, timestamp_cols=timestamp_cols,
+                                 categorical_cols=categorical_cols, columns=columns) \
+        .extend(query_result).to_dataframe()
@@ -0,0 +1,62 @@
+def build_query(connection, function, **kwargs):
+    """
+    Build the query text, parameters and database of a query function the same way DatabaseConnection.exec_query
+    does, so the query can be executed on a session of the connection's driver
+    @return: query text, parameters and database name
+    """
+    result = function(**kwargs)
+    query = result.query_string
+    parameters = dict(result.kwargs) if result.kwargs is not None else {}
+    if "$batch_size" in query:
+        parameters["batch_size"] = connection.batch_size
+    if "$limit" in query:
+        parameters["limit"] = connection.batch_size
+    database = result.database if result.database is not None else connection.db_name
+    return query, parameters, database
+
+
+def stream_query(connection, function, fetch_size: int = 1000, **kwargs):
+    """
+    Execute a read query and yield its records while the driver fetches them in batches of fetch_size, instead of
+    materializing the complete result like DatabaseConnection.exec_query
+    """
+    if hasattr(connection, "stream_records"):
+        # in-process connections (LocalGraphConnection) have no driver to stream from, profiling connections
+        # (ProfilingDatabaseConnection) stream the records of a profiled query
+        yield from connection.stream_records(function, fetch_size=fetch_size, **kwargs)
+        return
+    query, parameters, database = build_query(connection, function, **kwargs)
+    with connection.driver.session(database=database, fetch_size=fetch_size) as session:
+        for record in session.run(query, parameters):
+            yield record
+
+
+def stream_query_chunks(connection, function, chunk_size: int = 10000, **kwargs):
+    """
+    Execute a read query and yield its records in lists of at most chunk_size record dictionaries, such that at
+    most one chunk is held in memory at a time
+    """
+    chunk = []
+    for record in stream_query(connection, function, fetch_size=chunk_size, **kwargs):
+        chunk.append(record.data())
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_write_query(connection, function, **kwargs):
+    """
+    Execute a write query in a managed transaction on a session of its own, which the driver retries on transient
+    errors such as deadlocks between concurrent transactions; unlike DatabaseConnection.exec_query, errors are raised
+    @return: the records of the query as dictionaries
+    """
+    if connection.driver is None:
+        return connection.exec_query(function, **kwargs) or []
+    if hasattr(connection, "run_write_query"):
+        # profiling connections (ProfilingDatabaseConnection) run the query with PROFILE
+        return connection.run_write_query(function, **kwargs)
+    query, parameters, database = build_query(connection, function, **kwargs)
+    with connection.driver.session(database=database) as session:
+        return session.execute_write(lambda tx: tx.run(query, parameters).data())
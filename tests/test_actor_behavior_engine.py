@@ -0,0 +1,198 @@
+import pandas as pd
+import pytest
+
+from modules.decomposition_actor_behavior.actor_behavior_engine import ACTOR_BEHAVIORS, HANDOVER_BACKENDS, \
+    ColumnarActorBehaviorEngine
+
+RESOURCE_1 = 1000
+RESOURCE_2 = 1001
+
+
+class HandBuiltGraph:
+    """
+    Small event graph of case df-edges, resource df-edges, event-resource correlations and task instances, in the
+    tables that ColumnarActorBehaviorEngine is constructed from
+    """
+
+    def __init__(self):
+        self.last_id = 0
+        self.case_df = []
+        self.resource_df = []
+        self.event_resources = []
+        self.task_instance_events = []
+        self.task_instance_intervals = []
+        self.df_ti = []
+        self.expected = {}
+
+    def new_id(self):
+        self.last_id += 1
+        return self.last_id
+
+    def add_event(self, *resources):
+        event = self.new_id()
+        self.event_resources.extend((event, resource) for resource in resources)
+        return event
+
+    def add_task_instance(self, events, start_time, end_time):
+        task_instance = self.new_id()
+        self.task_instance_events.extend((task_instance, event) for event in events)
+        self.task_instance_intervals.append((task_instance, start_time, end_time))
+        return task_instance
+
+    def add_case_df(self, e1, e2, expected):
+        df_id = self.new_id()
+        self.case_df.append((df_id, e1, e2))
+        self.expected[df_id] = expected
+        return df_id
+
+    def add_handover(self, tic_end, tir_intervals, expected, shared_resource=False, continuation=False):
+        """
+        Add a case df-edge between events of different resources, where e1 is in a task instance ending at tic_end
+        and the task instance of e2 is preceded by task instances with tir_intervals; e2 has a resource predecessor,
+        such that handover_idle only applies through the intervals
+        """
+        e1 = self.add_event(RESOURCE_1)
+        e2 = self.add_event(RESOURCE_2, RESOURCE_1) if shared_resource else self.add_event(RESOURCE_2)
+        if continuation:
+            self.resource_df.append((e1, e2))
+        else:
+            self.resource_df.append((self.add_event(RESOURCE_2), e2))
+        self.add_task_instance([e1], 0, tic_end)
+        task_instance = self.add_task_instance([e2], 100, 110)
+        for start_time, end_time in tir_intervals:
+            self.df_ti.append((self.add_task_instance([], start_time, end_time), task_instance))
+        return self.add_case_df(e1, e2, expected)
+
+    def get_engine(self, handover_backend):
+        return ColumnarActorBehaviorEngine(
+            case_df=pd.DataFrame(self.case_df, columns=["df_id", "e1", "e2"]).assign(actor_behavior=None),
+            resource_df=pd.DataFrame(self.resource_df, columns=["e1", "e2"]),
+            event_resources=pd.DataFrame(self.event_resources, columns=["event", "resource"]),
+            task_instance_events=pd.DataFrame(self.task_instance_events, columns=["task_instance", "event"]),
+            task_instance_intervals=pd.DataFrame({
+                "task_instance": [row[0] for row in self.task_instance_intervals],
+                "start_time": pd.array([row[1] for row in self.task_instance_intervals], dtype="Int64"),
+                "end_time": pd.array([row[2] for row in self.task_instance_intervals], dtype="Int64")}),
+            df_ti=pd.DataFrame(self.df_ti, columns=["task_instance1", "task_instance2"]),
+            handover_backend=handover_backend)
+
+    def get_sequential_labels(self):
+        """
+        Evaluate the WHERE clause of each of the five sequential Cypher queries on every case df-edge and apply the
+        queries in the order in which they run, a later query overwriting the label of an earlier one
+        @return: dictionary from df id to actor behavior (None if no query matches)
+        """
+        resources = {}
+        for event, resource in self.event_resources:
+            resources.setdefault(event, set()).add(resource)
+        intervals = {task_instance: (start_time, end_time)
+                     for task_instance, start_time, end_time in self.task_instance_intervals}
+
+        def task_instances_of(event):
+            return [task_instance for task_instance, contained in self.task_instance_events if contained == event]
+
+        def less(*times):
+            # a comparison with null is null in Cypher, hence does not match
+            return all(time is not None for time in times) and all(a < b for a, b in zip(times, times[1:]))
+
+        labels = {}
+        for df_id, e1, e2 in self.case_df:
+            # (tic)-[:CONTAINS]->(e1)-[df]->(e2)<-[:CONTAINS]-(ti)<-[:DF_TI]-(tir)
+            interval_pairs = [(intervals[tic], intervals[tir])
+                              for tic in task_instances_of(e1) for ti in task_instances_of(e2)
+                              for tir, successor in self.df_ti if successor == ti]
+            shares_resource = bool(resources.get(e1, set()) & resources.get(e2, set()))
+            is_continuation = (e1, e2) in self.resource_df
+            has_resource_predecessor = any(target == e2 for _, target in self.resource_df)
+            matches = {
+                "continuation": is_continuation,
+                "interruption": shares_resource and not is_continuation,
+                "handover_idle": (not shares_resource and any(less(tir[1], tic[1]) for tic, tir in interval_pairs))
+                or not has_resource_predecessor,
+                "handover_prioritized": not shares_resource and any(less(tir[0], tic[1], tir[1])
+                                                                    for tic, tir in interval_pairs),
+                "handover_deprioritized": not shares_resource and any(less(tic[1], tir[0])
+                                                                      for tic, tir in interval_pairs)
+            }
+            labels[df_id] = None
+            for actor_behavior in ACTOR_BEHAVIORS:
+                if matches[actor_behavior]:
+                    labels[df_id] = actor_behavior
+        return labels
+
+
+@pytest.fixture
+def graph():
+    graph = HandBuiltGraph()
+
+    # continuation: e1 directly precedes e2 in the resource df
+    e1, e2 = graph.add_event(RESOURCE_1), graph.add_event(RESOURCE_1)
+    graph.resource_df.append((e1, e2))
+    graph.add_case_df(e1, e2, "continuation")
+
+    # interruption: e1 and e2 share the resource, but another event of the resource is in between
+    e1, e, e2 = graph.add_event(RESOURCE_1), graph.add_event(RESOURCE_1), graph.add_event(RESOURCE_1)
+    graph.resource_df.extend([(e1, e), (e, e2)])
+    graph.add_case_df(e1, e2, "interruption")
+
+    # handover_idle: e2 has no resource predecessor
+    graph.add_case_df(graph.add_event(RESOURCE_1), graph.add_event(RESOURCE_2), "handover_idle")
+
+    # the single handover behaviors, from the end of the task instance of e1 (50) and the interval of the task
+    # instance preceding the task instance of e2
+    graph.add_handover(50, [(10, 20)], "handover_idle")
+    graph.add_handover(50, [(40, 60)], "handover_prioritized")
+    graph.add_handover(50, [(60, 70)], "handover_deprioritized")
+
+    # precedence ties: several preceding task instances match different handover behaviors
+    graph.add_handover(50, [(40, 60), (60, 70)], "handover_deprioritized")
+    graph.add_handover(50, [(10, 20), (60, 70)], "handover_deprioritized")
+    graph.add_handover(50, [(10, 20), (40, 60)], "handover_prioritized")
+    graph.add_handover(50, [(10, 20), (40, 60), (60, 70)], "handover_deprioritized")
+
+    # handover_idle over interruption: e1 and e2 share the resource, but e2 has no resource predecessor
+    e1, e2 = graph.add_event(RESOURCE_1), graph.add_event(RESOURCE_1)
+    graph.resource_df.append((e2, e1))
+    graph.add_case_df(e1, e2, "handover_idle")
+
+    # handover over continuation: a resource df-edge between events that do not share a resource
+    graph.add_handover(50, [(60, 70)], "handover_deprioritized", continuation=True)
+    graph.add_handover(50, [(10, 20)], "handover_idle", continuation=True)
+
+    # sharing the resource rules out the interval handovers
+    graph.add_handover(50, [(60, 70)], "interruption", shared_resource=True)
+
+    # no behavior: the intervals touch the end of the task instance of e1 or the times are missing
+    graph.add_handover(50, [(50, 50)], None)
+    graph.add_handover(None, [(60, 70)], None)
+    graph.add_handover(50, [(None, 20)], "handover_idle")
+    graph.add_handover(50, [(40, None)], None)
+    graph.add_handover(50, [], None)
+    return graph
+
+
+def test_expected_labels_follow_sequential_overwrite_order(graph):
+    assert graph.get_sequential_labels() == graph.expected
+
+
+@pytest.mark.parametrize("handover_backend", HANDOVER_BACKENDS)
+def test_classify_matches_sequential_queries(graph, handover_backend):
+    classification = graph.get_engine(handover_backend).classify()
+
+    labels = dict(zip(classification["df_id"], classification["actor_behavior"].astype(object)
+                      .where(classification["actor_behavior"].notna(), None)))
+    assert labels == graph.get_sequential_labels()
+    assert set(ACTOR_BEHAVIORS) <= set(labels.values())
+
+
+@pytest.mark.parametrize("handover_backend", HANDOVER_BACKENDS)
+def test_compare_with_graph_reports_changed_labels(graph, handover_backend):
+    engine = graph.get_engine(handover_backend)
+    classification = engine.classify()
+    engine.case_df["actor_behavior"] = classification["actor_behavior"]
+    assert engine.compare_with_graph(classification).empty
+
+    engine.case_df.loc[0, "actor_behavior"] = "interruption"
+    mismatches = engine.compare_with_graph(classification)
+    assert mismatches["df_id"].tolist() == [classification["df_id"].iloc[0]]
+    assert mismatches["stored_actor_behavior"].tolist() == ["interruption"]
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.decomposition_actor_behavior.decomposition_actor_behavior import aggregate_actor_behavior, \
+    aggregate_actor_behavior_all_edges
+
+AGG_FUNCS = ["mean", "median", "min", "max", "std", "count"]
+TIME_UNIT = "hours"
+DURATION_COL = f"duration_{TIME_UNIT}"
+
+
+def get_df_instances(actor_behaviors, seed, categorical=False):
+    generator = np.random.default_rng(seed)
+    durations = generator.exponential(5, len(actor_behaviors)).round(3)
+    # zero and missing durations, which are excluded from the aggregation
+    durations[::7] = 0
+    durations[3::11] = np.nan
+    start_times = pd.Timestamp("2020-01-01") + pd.to_timedelta(np.arange(len(actor_behaviors)), unit="h")
+    df_instances = pd.DataFrame({"startTime": start_times,
+                                 "completeTime": start_times + pd.to_timedelta(np.nan_to_num(durations), unit="h"),
+                                 DURATION_COL: durations,
+                                 "actor_behavior": pd.Series(actor_behaviors, dtype=object)})
+    if categorical:
+        df_instances["actor_behavior"] = df_instances["actor_behavior"].astype("category")
+    return df_instances
+
+
+def get_edges():
+    mixed = ["continuation", "interruption", None, "handover_idle", "handover_prioritized",
+             "handover_deprioritized", "continuation"] * 5
+    return [
+        (("A", "B"), get_df_instances([None] * 9, seed=0)),
+        (("B", "C"), get_df_instances(["continuation"] * 12, seed=1)),
+        (("C", "D"), get_df_instances(mixed, seed=2)),
+        (("D", "E"), get_df_instances(mixed[:17], seed=3, categorical=True)),
+        (("E", "F"), get_df_instances(["interruption"], seed=4)),
+        (("F", "G"), get_df_instances([], seed=5)),
+        (("G", "H"), get_df_instances([None, "handover_idle", None], seed=6)),
+    ]
+
+
+def aggregate_duplicated_instances(df_to_aggregate, groupby, agg_func, time_unit, exclude_zero_duration=True):
+    """
+    Aggregation of the instances before the "all" rollup was computed during the aggregation: the instances of an
+    edge are duplicated with actor behavior "all" at extraction, hence every instance is counted twice
+    """
+    duration_col = f"duration_{time_unit}"
+    df_filtered = df_to_aggregate.copy()
+    agg_funcs = list(agg_func)
+
+    if exclude_zero_duration and duration_col in df_filtered.columns:
+        df_filtered = df_filtered[df_filtered[duration_col].fillna(0) > 0]
+
+    if df_filtered.empty:
+        column_tuples = [("actor_behavior", "count"), ("actor_behavior", "percentage")]
+        column_tuples.extend((duration_col, str(func)) for func in agg_funcs)
+        return pd.DataFrame(columns=pd.MultiIndex.from_tuples(column_tuples))
+
+    total_count = len(df_filtered) / 2
+    total_count = total_count if total_count else 1
+
+    counts = df_filtered.groupby(groupby)["actor_behavior"].count()
+    percentage = counts / total_count if total_count else counts * 0
+    duration_agg = df_filtered.groupby(groupby)[duration_col].agg(agg_funcs)
+
+    counts_df = counts.to_frame()
+    counts_df.columns = pd.MultiIndex.from_tuples([("actor_behavior", "count")])
+    percentage_df = percentage.to_frame()
+    percentage_df.columns = pd.MultiIndex.from_tuples([("actor_behavior", "percentage")])
+    duration_agg.columns = pd.MultiIndex.from_tuples([(duration_col, str(col)) for col in duration_agg.columns])
+    return pd.concat([counts_df, percentage_df, duration_agg], axis=1)
+
+
+def get_baseline_csv(edges, path):
+    actor_behavior_agg_all = []
+    for (source_activity, target_activity), df_instances in edges:
+        # the extraction added an "all" copy of the instances of every edge
+        df_instances_all = df_instances.copy()
+        df_instances_all["actor_behavior"] = "all"
+        df_duplicated = pd.concat([df_instances.astype({"actor_behavior": object}), df_instances_all],
+                                  ignore_index=True, sort=False)
+        df_actor_behavior_agg = aggregate_duplicated_instances(df_duplicated, ["actor_behavior"], AGG_FUNCS,
+                                                               TIME_UNIT)
+        df_actor_behavior_agg = pd.concat([df_actor_behavior_agg], keys=[target_activity], names=["sink"])
+        df_actor_behavior_agg = pd.concat([df_actor_behavior_agg], keys=[source_activity], names=["source"])
+        actor_behavior_agg_all.append(df_actor_behavior_agg)
+    pd.concat(actor_behavior_agg_all, axis=0, ignore_index=False).to_csv(path)
+    return path.read_bytes()
+
+
+def get_per_edge_csv(edges, path):
+    actor_behavior_agg_all = []
+    for (source_activity, target_activity), df_instances in edges:
+        df_actor_behavior_agg = aggregate_actor_behavior(df_instances, ["actor_behavior"], AGG_FUNCS, TIME_UNIT)
+        df_actor_behavior_agg = pd.concat([df_actor_behavior_agg], keys=[target_activity], names=["sink"])
+        df_actor_behavior_agg = pd.concat([df_actor_behavior_agg], keys=[source_activity], names=["source"])
+        actor_behavior_agg_all.append(df_actor_behavior_agg)
+    pd.concat(actor_behavior_agg_all, axis=0, ignore_index=False).to_csv(path)
+    return path.read_bytes()
+
+
+def get_grouped_csv(edges, path):
+    aggregate_actor_behavior_all_edges([df_instances for _, df_instances in edges], [edge for edge, _ in edges],
+                                       AGG_FUNCS, TIME_UNIT).to_csv(path)
+    return path.read_bytes()
+
+
+@pytest.mark.parametrize("get_csv", [get_per_edge_csv, get_grouped_csv])
+def test_rollup_csv_equals_duplicated_instances_csv(tmp_path, get_csv):
+    edges = get_edges()
+    baseline = get_baseline_csv(edges, tmp_path / "baseline.csv")
+
+    assert get_csv(edges, tmp_path / "rollup.csv") == baseline
+
+
+def test_rollup_percentages(tmp_path):
+    edges = get_edges()
+    get_per_edge_csv(edges, tmp_path / "rollup.csv")
+    df_agg = pd.read_csv(tmp_path / "rollup.csv", header=[0, 1], index_col=[0, 1, 2])
+
+    percentages = df_agg[("actor_behavior", "percentage")]
+    # the "all" rollup covers every instance with a positive duration, also those without actor behavior
+    assert (percentages.xs("all", level=2) == 1).all()
+    assert percentages.loc[("B", "C", "continuation")] == 1
+    assert ("A", "B", "all") in percentages.index and len(percentages.loc[("A", "B")]) == 1
+    # instances without actor behavior count towards the rollup only
+    assert percentages.loc[("G", "H", "handover_idle")] == 0.5
@@ -0,0 +1,266 @@
+import pandas as pd
+import pytest
+from promg import Performance
+
+from LocalGraphConnection import LocalGraphConnection
+from modules.compact_event_graph.compact_event_graph import CompactEventGraph, get_delay_edges
+from modules.custom_modules.df_interactions import InferDFInteractions
+from modules.custom_modules.discover_dfg import DiscoverDFG
+from modules.decomposition_actor_behavior.actor_behavior_engine import HANDOVER_BACKENDS, \
+    ColumnarActorBehaviorEngine
+from modules.local_graph.local_graph import LocalGraph
+from modules.local_graph.local_queries import get_delay_edges as get_local_delay_edges
+
+
+class Entity:
+    """
+    Entity type with the labels of a promg ConstructedNodes, as used by the queries on the local graph
+    """
+
+    def __init__(self, entity_type, df_label=None, corr_type="CORR"):
+        self.type = entity_type
+        self.df_label = df_label or f"DF_{entity_type.upper()}"
+        self.corr_type = corr_type
+
+    def get_df_label(self):
+        return self.df_label
+
+    def get_df_a_label(self):
+        return f"DF_A_{self.type.upper()}"
+
+    def get_df_ti_label(self):
+        return f"DF_TI_{self.type}"
+
+    def get_corr_type_strings(self):
+        return self.corr_type
+
+
+class SemanticHeader:
+    def __init__(self, entities):
+        self.entities = {entity.type: entity for entity in entities}
+
+    def get_entity(self, entity_type):
+        return self.entities[entity_type]
+
+
+CASE = Entity("Application")
+RESOURCE = Entity("Resource")
+ORDER = Entity("Order")
+CASE_AWO = Entity("CaseAWO")
+# an entity that shares the df label of ORDER with another correlation type
+ITEM = Entity("Item", df_label=ORDER.get_df_label(), corr_type="CORR_ITEM")
+
+
+def get_events():
+    rows = [("case 1", "resource 1", "register", "2020-01-01 09:00"),
+            ("case 1", "resource 2", "check", "2020-01-01 10:00"),
+            ("case 1", "resource 1", "decide", "2020-01-01 12:00"),
+            ("case 1", "resource 2", "notify", "2020-01-01 13:00"),
+            ("case 2", "resource 2", "register", "2020-01-01 09:30"),
+            ("case 2", "resource 1", "check", "2020-01-01 11:00"),
+            ("case 2", "resource 1", "decide", "2020-01-01 11:30"),
+            ("case 2", "resource 2", "notify", "2020-01-02 08:00"),
+            ("case 3", "resource 3", "register", "2020-01-01 10:30"),
+            ("case 3", "resource 2", "check", "2020-01-01 12:30")]
+    events = pd.DataFrame(rows, columns=["caseId", "resourceId", "activity", "timestamp"])
+    events["timestamp"] = pd.to_datetime(events["timestamp"])
+    return events
+
+
+@pytest.fixture
+def connection():
+    graph = LocalGraph.from_event_table(get_events(), "BPIC15")
+    # events worked on by two resources: the first correlation of an event is its resource of the event table
+    events = graph.get_nodes("Event").index.to_numpy()
+    resources = graph.get_nodes("Resource")
+    second_resources = pd.Series(resources.index, index=resources["sysId"])[["resource 2", "resource 1"]]
+    graph.add_relationships("CORR", events[[0, 4]], second_resources.to_numpy())
+    return LocalGraphConnection(graph)
+
+
+def get_labels(engine):
+    classification = engine.classify()
+    return dict(zip(classification["df_id"], classification["actor_behavior"].astype(object)
+                    .where(classification["actor_behavior"].notna(), None)))
+
+
+@pytest.mark.parametrize("handover_backend", HANDOVER_BACKENDS)
+def test_engine_from_event_graph_equals_engine_from_tables(tmp_path, connection, handover_backend):
+    CompactEventGraph.from_connection(connection, entities=[CASE, RESOURCE], resource=RESOURCE).save(tmp_path)
+    event_graph = CompactEventGraph.load(tmp_path)
+
+    labels = get_labels(ColumnarActorBehaviorEngine.from_connection(connection, CASE, RESOURCE,
+                                                                    handover_backend=handover_backend))
+    assert get_labels(ColumnarActorBehaviorEngine.from_event_graph(event_graph, CASE, RESOURCE,
+                                                                   handover_backend=handover_backend)) == labels
+    # the case df-edges from the events with two resources only share the second resource with their successor
+    case_df = connection.graph.get_relationships(CASE.get_df_label())
+    events = connection.graph.get_nodes("Event").index.to_numpy()
+    for event in events[[0, 4]]:
+        assert labels[case_df.index[case_df["start"] == event][0]] == "interruption"
+
+
+def test_event_resources_keep_every_correlation(connection):
+    event_graph = CompactEventGraph.from_connection(connection, entities=[CASE, RESOURCE], resource=RESOURCE)
+    event_resources = event_graph.get_event_resources()
+    event_ids = event_graph.arrays["event_ids"][event_resources["event"].to_numpy()]
+    resource_ids = event_graph.arrays["resource_ids"][event_resources["resource"].to_numpy()]
+
+    correlations = connection.graph.get_correlations(RESOURCE.type)
+    correlations = correlations[correlations["start"].isin(connection.graph.get_nodes("Event").index)]
+    assert sorted(zip(event_ids, resource_ids)) == sorted(zip(correlations["start"], correlations["end"]))
+    assert len(event_resources) == len(event_graph.arrays["event_ids"]) + 2
+
+
+def add_no_task_instances(graph):
+    graph.add_nodes("TaskInstance", pd.DataFrame({"start_time": pd.to_datetime([]), "end_time": pd.to_datetime([])}))
+
+
+def get_dfg_connection():
+    """
+    Events of the activities A, B and C with df-relationships of ORDER, counted once per shared order: A -> B is
+    counted three times of which twice for the events sharing both orders, B -> A and C -> A are df-relationships
+    without a shared order that only count in the reverse direction
+    """
+    graph = LocalGraph()
+    activities = graph.add_nodes("Activity", pd.DataFrame({"activity": ["A", "B", "C"]}))
+    observed = [0, 1, 0, 1, 1, 0, 2, 0, 2, 1, 2]
+    events = graph.add_nodes("Event", pd.DataFrame({"timestamp": pd.date_range("2020-01-01", periods=len(observed),
+                                                                               freq="h")}))
+    graph.add_relationships("OBSERVED", activities[observed], events)
+    orders = graph.add_nodes("Order", pd.DataFrame({"sysId": ["order 1", "order 2"]}))
+    for order, order_events in zip(orders, [[0, 1, 2, 3, 5, 6, 9, 10], [0, 1, 4, 7, 8]]):
+        graph.add_relationships("CORR", events[order_events], [order] * len(order_events))
+    items = graph.add_nodes("Item", pd.DataFrame({"sysId": ["item 1"]}))
+    graph.add_relationships("CORR_ITEM", events[[0, 1, 5, 6]], [items[0]] * 4)
+    df_edges = [(0, 1), (2, 3), (4, 5), (5, 6), (7, 8), (6, 7), (9, 10)]
+    graph.add_relationships(ORDER.get_df_label(), events[[e1 for e1, _ in df_edges]],
+                            events[[e2 for _, e2 in df_edges]])
+    add_no_task_instances(graph)
+    return LocalGraphConnection(graph)
+
+
+def get_df_a_relations(connection, entity):
+    activities = connection.graph.get_nodes("Activity")["activity"]
+    df_a = connection.graph.get_relationships(entity.get_df_a_label())
+    if df_a.empty:
+        return {}
+    return {(activities[c1], activities[c2]): count for c1, c2, count in zip(df_a["start"], df_a["end"], df_a["count"])}
+
+
+@pytest.mark.parametrize("discovery", ["per_entity", "all_entities", "event_graph"])
+@pytest.mark.parametrize("df_threshold, relative_df_threshold, expected_order, expected_item", [
+    (0, 0.0, {("A", "B"): 3, ("A", "C"): 2, ("B", "C"): 1}, {("A", "B"): 1, ("A", "C"): 1}),
+    (2, 0.0, {("A", "B"): 3}, {}),
+    # df_freq2 counts the reverse df-relationships B -> A and C -> A although their events share no order
+    (0, 2.5, {("A", "B"): 3, ("B", "C"): 1}, {})])
+def test_discover_dfg_counts_df_a_relations(discovery, df_threshold, relative_df_threshold, expected_order,
+                                            expected_item):
+    Performance(write_console=False)
+    connection = get_dfg_connection()
+    semantic_header = SemanticHeader([ORDER, ITEM])
+    if discovery == "per_entity":
+        discover_dfg = DiscoverDFG(connection, semantic_header)
+        for entity in [ORDER, ITEM]:
+            discover_dfg.discover_dfg_for_entity(entity.type, df_threshold, relative_df_threshold)
+    else:
+        event_graph = CompactEventGraph.from_connection(connection, entities=[ORDER, ITEM], resource=ORDER) \
+            if discovery == "event_graph" else None
+        DiscoverDFG(connection, semantic_header, event_graph=event_graph) \
+            .discover_dfg([ORDER.type, ITEM.type], df_threshold, relative_df_threshold)
+
+    assert get_df_a_relations(connection, ORDER) == expected_order
+    assert get_df_a_relations(connection, ITEM) == expected_item
+
+
+def get_delay_connection():
+    """
+    Events with df-relationships of several entity types, where the latest predecessor of an event is decided by a
+    tie, a missing timestamp of a predecessor or of the event itself, or an excluded CaseAWO df-relationship
+    """
+    graph = LocalGraph()
+    timestamps = pd.to_datetime(["2020-01-01 01:00", "2020-01-01 01:00", "2020-01-01 03:00", None,
+                                 "2020-01-01 05:00", "2020-01-01 06:00", "2020-01-01 00:00", None])
+    events = graph.add_nodes("Event", pd.DataFrame({"timestamp": timestamps}))
+    df_edges = {CASE: [(0, 2), (2, 4), (6, 5), (5, 7)],
+                RESOURCE: [(1, 2), (2, 4), (3, 4), (3, 5), (0, 7)],
+                CASE_AWO: [(4, 5)]}
+    for entity, edges in df_edges.items():
+        graph.add_relationships(entity.get_df_label(), events[[e1 for e1, _ in edges]],
+                                events[[e2 for _, e2 in edges]],
+                                {"entityType": entity.type, "type": "DF", "count": 1})
+    add_no_task_instances(graph)
+    return LocalGraphConnection(graph)
+
+
+def test_delay_edges_of_event_graph_equal_delay_edges_of_local_graph():
+    connection = get_delay_connection()
+    events = connection.graph.get_nodes("Event").index.to_numpy()
+    expected = {(events[e1], events[e2], by, count) for e1, e2, by, count in [
+        # e0 and e1 precede e2 at the same time: the lowest id
+        (0, 2, "Application", 1),
+        # e2 precedes e4 over two entity types, e3 has no timestamp: by the first entity type
+        (2, 4, "Application", 2),
+        # the later CaseAWO predecessor e4 is excluded, e3 has no timestamp
+        (6, 5, "Application", 1),
+        # e7 has no timestamp, hence the durations of all predecessors are missing: the lowest id
+        (0, 7, "Resource", 1)]}
+
+    local_delays = get_local_delay_edges(connection.graph)
+    local_delays = local_delays.groupby(["e1", "e2"], sort=False)["entityType"].agg(["first", "size"])
+    assert {(e1, e2, by, count) for (e1, e2), (by, count) in local_delays.iterrows()} == expected
+
+    event_graph = CompactEventGraph.from_connection(connection, entities=[CASE, RESOURCE, CASE_AWO],
+                                                    resource=RESOURCE)
+    delays = get_delay_edges(event_graph)
+    assert set(zip(delays["e1"], delays["e2"], delays["by"], delays["count"])) == expected
+
+
+# pairs of (entity, original entity) in the order of deletion: Offer df-relationships parallel to Workflow are deleted
+# before the Resource df-relationships parallel to the remaining Offer df-relationships, the self-pair of Application
+# deletes every Application df-relationship before the Application df-relationships parallel to Resource
+ENTITY_PAIRS = [("Offer", "Workflow"), ("Resource", "Offer"), ("Application", "Application"),
+                ("Application", "Resource")]
+PARALLEL_DF_EDGES = {"Workflow": [(0, 1), (2, 3)], "Offer": [(0, 1), (1, 2)], "Resource": [(0, 1), (1, 2), (3, 4)],
+                     "Application": [(0, 1), (4, 5)]}
+
+
+def get_parallel_df_connection():
+    graph = LocalGraph()
+    events = graph.add_nodes("Event", pd.DataFrame({"timestamp": pd.date_range("2020-01-01", periods=6, freq="h")}))
+    for entity_type, edges in PARALLEL_DF_EDGES.items():
+        graph.add_relationships(Entity(entity_type).get_df_label(), events[[e1 for e1, _ in edges]],
+                                events[[e2 for _, e2 in edges]], {"entityType": entity_type, "type": "DF"})
+    add_no_task_instances(graph)
+    # batches of two start events
+    return LocalGraphConnection(graph, batch_size=2)
+
+
+def get_remaining_df_edges(connection):
+    events = connection.graph.get_nodes("Event").index.to_numpy()
+    remaining = {}
+    for entity_type in PARALLEL_DF_EDGES:
+        df = connection.graph.get_relationships(Entity(entity_type).get_df_label())
+        remaining[entity_type] = sorted((events.tolist().index(e1), events.tolist().index(e2))
+                                        for e1, e2 in zip(df["start"], df["end"]))
+    return remaining
+
+
+@pytest.mark.parametrize("deletion", ["per_pair", "pairs"])
+@pytest.mark.parametrize("use_event_graph", [False, True])
+def test_deleting_pairs_in_order_equals_deleting_per_pair(deletion, use_event_graph):
+    Performance(write_console=False)
+    connection = get_parallel_df_connection()
+    entities = [Entity(entity_type) for entity_type in PARALLEL_DF_EDGES]
+    event_graph = CompactEventGraph.from_connection(connection, entities=entities, resource=entities[2]) \
+        if use_event_graph else None
+    infer_df_interactions = InferDFInteractions(connection, SemanticHeader(entities), event_graph=event_graph)
+    if deletion == "per_pair":
+        for entity_str, original_entity_str in ENTITY_PAIRS:
+            infer_df_interactions.delete_parallel_directly_follows_derived(entity_str, original_entity_str)
+    else:
+        deleted = infer_df_interactions.delete_parallel_directly_follows_derived_pairs(ENTITY_PAIRS, workers=4)
+        assert deleted["deleted"].tolist() == [1, 1, 2, 0]
+
+    assert get_remaining_df_edges(connection) == {"Workflow": [(0, 1), (2, 3)], "Offer": [(1, 2)],
+                                                  "Resource": [(0, 1), (3, 4)], "Application": []}
@@ -0,0 +1,96 @@
+import datetime
+import random
+import threading
+import time
+
+import pytest
+
+from modules.decomposition_actor_behavior.decomposition_actor_behavior import \
+    get_df_instances_by_actor_behavior_bpic15, map_ordered_bounded
+from modules.decomposition_actor_behavior.intermediate_store import PickleIntermediateStore
+from queries.decomposition_actor_behavior import DecompositionActorBehaviorQueryLibrary as ql
+
+CASE_EDGES = [[f"activity {i}", f"activity {i + 1}"] for i in range(12)]
+
+
+class SlowFakeConnection:
+    """
+    Connection that answers the per-edge extraction query from memory after a random delay, simulating the latency
+    of a database, and keeps track of the number of queries running at the same time
+    """
+
+    def __init__(self, seed=0, max_delay=0.02):
+        self.random = random.Random(seed)
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def exec_query(self, function, **kwargs):
+        assert function == ql.q_get_all_actor_behavior_per_df
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            delay = self.random.uniform(0, self.max_delay)
+        time.sleep(delay)
+        with self.lock:
+            self.running -= 1
+        return get_records(kwargs["edge_tuple"])
+
+
+def get_records(case_edge):
+    # a distinct number of instances per edge, such that swapped results are detected
+    index = CASE_EDGES.index(list(case_edge))
+    start = datetime.datetime(2020, 1, 1) + datetime.timedelta(days=index)
+    return [{"startTime": start + datetime.timedelta(hours=i),
+             "completeTime": start + datetime.timedelta(hours=2 * i + 1),
+             "duration": (0, 0, 3600 * (i + 1), 0),
+             "actor_behavior": ["continuation", "interruption", "handover_idle"][i % 3]}
+            for i in range(index + 1)]
+
+
+def extract(tmp_path, connection, extraction_mode, extraction_workers=1):
+    intermediate_store = PickleIntermediateStore(f"{tmp_path / extraction_mode}/")
+    (tmp_path / extraction_mode).mkdir()
+    return get_df_instances_by_actor_behavior_bpic15(intermediate_store, connection, case=None, resource=None,
+                                                     time_unit="hours", case_edges=CASE_EDGES,
+                                                     extraction_mode=extraction_mode,
+                                                     extraction_workers=extraction_workers)
+
+
+def test_parallel_extraction_equals_per_edge_extraction(tmp_path):
+    per_edge = extract(tmp_path, SlowFakeConnection(), "per_edge")
+    connection = SlowFakeConnection(seed=1)
+    parallel = extract(tmp_path, connection, "parallel", extraction_workers=4)
+
+    assert len(parallel) == len(per_edge) == len(CASE_EDGES)
+    for df_per_edge, df_parallel in zip(per_edge, parallel):
+        assert df_parallel.equals(df_per_edge)
+    assert 1 < connection.max_running <= 4
+
+
+@pytest.mark.parametrize("max_workers, max_in_flight", [(1, 1), (2, 3), (4, None)])
+def test_map_ordered_bounded_keeps_order_and_bounds_in_flight_work(max_workers, max_in_flight):
+    lock = threading.Lock()
+    delays = random.Random(max_workers)
+    state = {"submitted": 0, "consumed": 0, "max_outstanding": 0}
+
+    def function(item):
+        with lock:
+            # started and not yet consumed
+            state["max_outstanding"] = max(state["max_outstanding"], state["submitted"] - state["consumed"] + 1)
+            state["submitted"] += 1
+            delay = delays.uniform(0, 0.01)
+        time.sleep(delay)
+        return item * item
+
+    results = []
+    for result in map_ordered_bounded(function, range(30), max_workers=max_workers, max_in_flight=max_in_flight):
+        with lock:
+            state["consumed"] += 1
+        results.append(result)
+        # a slow consumer, such that the workers would run ahead without the bound
+        time.sleep(0.002)
+
+    assert results == [item * item for item in range(30)]
+    assert state["max_outstanding"] <= (max_in_flight if max_in_flight is not None else 2 * max_workers)
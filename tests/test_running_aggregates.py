@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.decomposition_actor_behavior.decomposition_actor_behavior import aggregate_actor_behavior, \
+    aggregate_streamed_df_instances
+from modules.decomposition_actor_behavior.running_aggregates import ActorBehaviorAggregates, KLLSketch, \
+    RunningStatistics
+from queries.decomposition_actor_behavior import DecompositionActorBehaviorQueryLibrary as ql
+
+AGG_FUNCS = ["mean", "median", "min", "max", "std", "count"]
+TIME_UNIT = "hours"
+DURATION_COL = f"duration_{TIME_UNIT}"
+ACTOR_BEHAVIORS = ["continuation", "interruption", None, "handover_idle", "handover_prioritized",
+                   "handover_deprioritized"]
+
+
+class Record(dict):
+    def data(self):
+        return dict(self)
+
+
+class StreamingFakeConnection:
+    """
+    Connection that streams the records of the per-edge extraction query from memory
+    """
+
+    def __init__(self, records):
+        self.records = records
+
+    def stream_records(self, function, fetch_size=1000, **kwargs):
+        assert function == ql.q_get_all_actor_behavior_per_df
+        for record in self.records:
+            yield Record(record)
+
+
+def get_records(nr_instances, seed=0):
+    generator = np.random.default_rng(seed)
+    seconds = generator.exponential(5 * 3600, nr_instances).round()
+    # zero and missing durations, which are excluded from the aggregation
+    seconds[::7] = 0
+    start = pd.Timestamp("2020-01-01")
+    return [{"startTime": (start + pd.Timedelta(hours=i)).to_pydatetime(),
+             "completeTime": (start + pd.Timedelta(hours=i, seconds=value)).to_pydatetime(),
+             "duration": (0, 0, int(value), 0) if i % 11 != 3 else None,
+             "actor_behavior": ACTOR_BEHAVIORS[i % len(ACTOR_BEHAVIORS)]}
+            for i, value in enumerate(seconds)]
+
+
+def get_records_frame(records):
+    durations = [record["duration"][2] / 3600 if record["duration"] is not None else np.nan for record in records]
+    return pd.DataFrame({DURATION_COL: durations,
+                         "actor_behavior": pd.Series([record["actor_behavior"] for record in records],
+                                                     dtype=object)})
+
+
+def test_running_statistics_merge_equals_pandas():
+    values = pd.Series(np.random.default_rng(0).lognormal(1, 1, 1000))
+    values[::13] = np.nan
+    merged = RunningStatistics()
+    for chunk in np.array_split(values.to_numpy(), [1, 2, 50, 400, 401, 999]):
+        # every chunk is summarized on its own and merged, like the chunks of several workers
+        statistics = RunningStatistics()
+        statistics.update(chunk)
+        merged.merge(statistics)
+    updated = RunningStatistics()
+    for chunk in np.array_split(values.to_numpy(), 17):
+        updated.update(chunk)
+
+    for statistics in [merged, updated]:
+        assert statistics.get("count") == values.count()
+        for agg_func in ["mean", "sum", "min", "max", "var", "std"]:
+            assert statistics.get(agg_func) == pytest.approx(values.agg(agg_func), rel=1e-12)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_streamed_aggregation_equals_pandas_aggregation(chunk_size):
+    records = get_records(200)
+    streamed = aggregate_streamed_df_instances(
+        StreamingFakeConnection(records), ql.q_get_all_actor_behavior_per_df, {},
+        timedelta_cols={"duration": TIME_UNIT}, timestamp_cols=["startTime", "completeTime"],
+        columns=["startTime", "completeTime", "duration", "actor_behavior"], agg_func=AGG_FUNCS,
+        time_unit=TIME_UNIT, chunk_size=chunk_size)
+    expected = aggregate_actor_behavior(get_records_frame(records), ["actor_behavior"], AGG_FUNCS, TIME_UNIT)
+
+    # the "all" rollup over all chunks, with every instance with a positive duration
+    assert streamed.loc["all", ("actor_behavior", "percentage")] == 1
+    # fewer instances per actor behavior than the size of the sketch, hence the median is exact
+    pd.testing.assert_frame_equal(streamed, expected, check_dtype=False, check_index_type=False,
+                                  check_names=False, rtol=1e-9)
+
+
+def test_merged_aggregates_equal_aggregates_of_all_chunks():
+    frame = get_records_frame(get_records(300))
+    frame = frame[frame[DURATION_COL].fillna(0) > 0]
+    merged = ActorBehaviorAggregates()
+    for start in range(0, len(frame), 80):
+        chunk = frame.iloc[start:start + 80]
+        aggregates = ActorBehaviorAggregates()
+        aggregates.update(chunk["actor_behavior"].to_numpy(dtype=object), chunk[DURATION_COL].to_numpy())
+        merged.merge(aggregates)
+    updated = ActorBehaviorAggregates()
+    updated.update(frame["actor_behavior"].to_numpy(dtype=object), frame[DURATION_COL].to_numpy())
+
+    pd.testing.assert_frame_equal(merged.to_frame(AGG_FUNCS, DURATION_COL),
+                                  updated.to_frame(AGG_FUNCS, DURATION_COL), rtol=1e-9)
+
+
+@pytest.mark.parametrize("k", [100, 200])
+def test_sketch_quantiles_within_rank_error(k):
+    values = np.random.default_rng(k).lognormal(1, 1, 200000)
+    sketch = KLLSketch(k=k)
+    for chunk in np.array_split(values, 37):
+        chunk_sketch = KLLSketch(k=k, seed=len(chunk))
+        chunk_sketch.update(chunk)
+        sketch.merge(chunk_sketch)
+
+    assert sketch.count == len(values)
+    sorted_values = np.sort(values)
+    for q in [0.01, 0.25, 0.5, 0.9, 0.99]:
+        rank = np.searchsorted(sorted_values, sketch.quantile(q)) / len(values)
+        # the rank error of the sketch is roughly 1.7 / k
+        assert abs(rank - q) <= 2 * 1.7 / k
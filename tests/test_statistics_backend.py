@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.decomposition_actor_behavior.decomposition_actor_behavior import aggregate_actor_behavior
+from modules.decomposition_actor_behavior.statistics_backend import aggregate_durations
+
+AGG_FUNCS = ["mean", "median", "min", "max", "std", "var", "sum", "count"]
+TIME_UNIT = "hours"
+DURATION_COL = f"duration_{TIME_UNIT}"
+
+
+def get_df_instances(nr_instances, seed=0):
+    generator = np.random.default_rng(seed)
+    durations = generator.exponential(5, nr_instances).round(3)
+    # zero and missing durations, which are excluded from the aggregation
+    durations[::7] = 0
+    durations[3::11] = np.nan
+    actor_behaviors = pd.Series(generator.choice(["continuation", "interruption", "handover_idle", "none"],
+                                                 nr_instances), dtype=object)
+    # a single instance, for which the variance is missing
+    actor_behaviors[actor_behaviors == "handover_idle"] = "interruption"
+    actor_behaviors[1] = "handover_idle"
+    return pd.DataFrame({DURATION_COL: durations,
+                         "actor_behavior": actor_behaviors.where(actor_behaviors != "none", None)})
+
+
+@pytest.mark.parametrize("statistics_backend", ["exact", "approximate"])
+def test_backend_equals_pandas_aggregation(statistics_backend):
+    df_instances = get_df_instances(150)
+    expected = aggregate_actor_behavior(df_instances, ["actor_behavior"], AGG_FUNCS, TIME_UNIT)
+    aggregated = aggregate_actor_behavior(df_instances, ["actor_behavior"], AGG_FUNCS, TIME_UNIT,
+                                          statistics_backend=statistics_backend)
+
+    assert aggregated.loc["handover_idle", (DURATION_COL, "count")] == 1
+    # fewer instances per group than the size of the sketch, hence the approximate quantiles are exact
+    pd.testing.assert_frame_equal(aggregated, expected, check_dtype=False, rtol=1e-9)
+
+
+def test_exact_quantiles_equal_pandas_quantiles():
+    df_instances = get_df_instances(1000, seed=1)
+    aggregated = aggregate_durations(df_instances, "actor_behavior", DURATION_COL, ["p10", "p50", "p90", "p99.5"],
+                                     statistics_backend="exact")
+
+    grouped = df_instances.groupby("actor_behavior")[DURATION_COL]
+    for agg_func, q in [("p10", 0.1), ("p50", 0.5), ("p90", 0.9), ("p99.5", 0.995)]:
+        pd.testing.assert_series_equal(aggregated[agg_func], grouped.quantile(q), check_names=False, rtol=1e-12)
+
+
+def test_approximate_quantiles_of_large_groups_within_rank_error():
+    generator = np.random.default_rng(2)
+    nr_instances = 300000
+    df_instances = pd.DataFrame({DURATION_COL: generator.lognormal(1, 1, nr_instances),
+                                 "actor_behavior": generator.choice(["continuation", "interruption"], nr_instances)})
+    quantiles = {"p1": 0.01, "median": 0.5, "p90": 0.9, "p99": 0.99}
+    sketch_size = 200
+    aggregated = aggregate_durations(df_instances, "actor_behavior", DURATION_COL, list(quantiles),
+                                     statistics_backend="approximate", sketch_size=sketch_size)
+
+    for actor_behavior, durations in df_instances.groupby("actor_behavior")[DURATION_COL]:
+        sorted_durations = np.sort(durations.to_numpy())
+        for agg_func, q in quantiles.items():
+            rank = np.searchsorted(sorted_durations, aggregated.loc[actor_behavior, agg_func]) / len(durations)
+            # the rank error of the sketch is roughly 1.7 / sketch_size
+            assert abs(rank - q) <= 2 * 1.7 / sketch_size
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        aggregate_durations(get_df_instances(10), "actor_behavior", DURATION_COL, ["mean"],
+                            statistics_backend="sorted")